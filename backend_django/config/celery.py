@@ -1,8 +1,32 @@
 import os
 from celery import Celery
+from celery.signals import worker_init, worker_process_init
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
 app = Celery("config")
 app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
+
+
+def _preload_models(**kwargs):
+    # Import diferido: Django ya está configurado cuando llegan las señales
+    from rag.embeddings.warmup import start_preload
+
+    start_preload(background=False)
+
+
+@worker_init.connect
+def _preload_on_worker_init(sender=None, **kwargs):
+    # --pool=solo / threads: las tareas corren en este mismo proceso
+    # En worker_init pool_cls aún es el nombre ("solo") o ya la clase del pool
+    pool = getattr(sender, "pool_cls", "")
+    pool_name = pool if isinstance(pool, str) else getattr(pool, "__module__", "")
+    if "solo" in pool_name or "thread" in pool_name:
+        _preload_models()
+
+
+@worker_process_init.connect
+def _preload_on_worker_process_init(**kwargs):
+    # prefork: cada proceso hijo carga sus modelos tras el fork
+    _preload_models()
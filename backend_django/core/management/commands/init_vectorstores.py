@@ -1,13 +1,22 @@
-from django.core.management.base import BaseCommand
-from integrations.qdrant_client import (
-    ensure_text_collection,
-    ensure_image_collection,
-)
+from django.core.management.base import BaseCommand, CommandError
+from integrations.collection_profiles import PROFILES
+from integrations.embedding_registry import bootstrap
 
 class Command(BaseCommand):
-    help = "Initialize Qdrant collections used by the RAG pipeline"
+    help = "Initialize Qdrant collections used by the RAG pipeline (never drops existing data)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--profile", choices=list(PROFILES),
+            help="Perfil de las colecciones (cuantización, on_disk, HNSW); se aplica también a las existentes",
+        )
 
     def handle(self, *args, **options):
-        ensure_text_collection()
-        ensure_image_collection()
+        # Registro de modelos: crea o adopta las colecciones y sus alias sin borrar nada
+        try:
+            messages = bootstrap(profile=options["profile"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        for message in messages:
+            self.stdout.write(message)
         self.stdout.write(self.style.SUCCESS("Qdrant collections ensured."))
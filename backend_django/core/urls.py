@@ -1,11 +1,13 @@
 # backend_django/core/urls.py
 
 from django.urls import path, include
-from .views import HealthView
-from documents.download_views import TableDownloadView, ImageDownloadView
+from .views import HealthView, ReadyView
+from documents.download_views import TableDownloadView, TableReadView, ImageDownloadView
 urlpatterns = [
     path("health/", HealthView.as_view(), name="health"),
+    path("ready/", ReadyView.as_view(), name="ready"),
     path("tables/download/", TableDownloadView.as_view(), name="tables-download"),
+    path("tables/read/", TableReadView.as_view(), name="tables-read"),
     path("images/download/", ImageDownloadView.as_view(), name="images-download"),
     path("", include("conversations.urls")),
     path("", include("documents.urls")),
@@ -1,9 +1,24 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 
+from rag.embeddings.warmup import warmup_status
+
 class HealthView(APIView):
     authentication_classes = []
     permission_classes = []
 
     def get(self, request):
         return Response({"status": "ok"})
+
+
+class ReadyView(APIView):
+    """
+    Readiness: 200 cuando los modelos precargados de este proceso están listos
+    (con tiempos de carga y calentamiento), 503 mientras cargan o si fallaron.
+    """
+    authentication_classes = []
+    permission_classes = []
+
+    def get(self, request):
+        status = warmup_status()
+        return Response(status, status=200 if status["ready"] else 503)
@@ -11,6 +11,9 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from integrations.minio_client import download_bytes
+from rag.table_store import read_table
+
+TABLE_READ_MAX_ROWS = int(os.getenv("TABLE_READ_MAX_ROWS", "1000"))
 
 
 def _bad(msg: str) -> Response:
@@ -53,6 +56,54 @@ class TableDownloadView(APIView):
         return resp
 
 
+class TableReadView(APIView):
+    """
+    GET /api/tables/read/?path=<minio_key>&columns=a,b&offset=0&limit=100
+    Lectura parcial de una tabla (JSON): proyecta columnas y corta filas sin
+    descargar el fichero entero (Parquet). Acepta la ruta del CSV o del Parquet.
+    """
+
+    def get(self, request):
+        path = request.query_params.get("path")
+        if not path:
+            return _bad("Query param 'path' is required")
+
+        path = unquote(str(path))
+        if not _validate_no_traversal(path):
+            return _bad("Invalid path")
+
+        if "/tables/" not in path or not path.lower().endswith((".csv", ".parquet")):
+            return _bad("Invalid table path")
+
+        try:
+            offset = max(0, int(request.query_params.get("offset", 0)))
+            limit = int(request.query_params.get("limit", 100))
+        except (TypeError, ValueError):
+            return _bad("'offset' and 'limit' must be integers")
+        limit = max(0, min(limit, TABLE_READ_MAX_ROWS))
+
+        raw_columns = request.query_params.get("columns")
+        columns = [c.strip() for c in raw_columns.split(",") if c.strip()] if raw_columns else None
+
+        try:
+            df = read_table(path, columns=columns, offset=offset, limit=limit)
+        except Exception as e:
+            return Response({"detail": str(e)}, status=status.HTTP_404_NOT_FOUND)
+
+        rows = [["" if v is None else v for v in r] for r in df.values.tolist()]
+        return Response(
+            {
+                "path": path,
+                "columns": [str(c) for c in df.columns],
+                "offset": offset,
+                "limit": limit,
+                "total_rows": df.attrs.get("total_rows"),
+                "rows": rows,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
 class ImageDownloadView(APIView):
     """
     GET /api/images/download/?path=<minio_key>
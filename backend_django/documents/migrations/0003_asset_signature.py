@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-17 03:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0002_document_content_sha256'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asset',
+            name='signature',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+    ]
@@ -14,6 +14,7 @@ class Document(models.Model):
     original_filename = models.CharField(max_length=512, blank=True, null=True)
     storage_key_original = models.CharField(max_length=1024)  # ej: "{doc_id}/original.pdf"
     status = models.CharField(max_length=32, choices=STATUS_CHOICES, default="pending")
+    content_sha256 = models.CharField(max_length=64, blank=True, null=True, db_index=True)  # dedupe de subidas
     meta = models.JSONField(default=dict, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
@@ -29,5 +30,7 @@ class Asset(models.Model):
     page = models.IntegerField(null=True, blank=True)
     storage_key = models.CharField(max_length=1024)  # ej: "{doc_id}/tables/..csv" o "{doc_id}/images/..png"
     meta = models.JSONField(default=dict, blank=True)
+    # Firma de contenido de tablas (independiente del orden de filas) para deduplicar
+    signature = models.CharField(max_length=64, null=True, blank=True, db_index=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
@@ -17,11 +17,12 @@ class DocumentSerializer(serializers.ModelSerializer):
             "original_filename",
             "storage_key_original",
             "status",
+            "content_sha256",
             "meta",
             "created_at",
             "updated_at",
         ]
-        read_only_fields = ["id", "created_at", "updated_at"]
+        read_only_fields = ["id", "content_sha256", "created_at", "updated_at"]
 
 
 class DocumentDetailSerializer(serializers.ModelSerializer):
@@ -34,12 +35,13 @@ class DocumentDetailSerializer(serializers.ModelSerializer):
             "original_filename",
             "storage_key_original",
             "status",
+            "content_sha256",
             "meta",
             "created_at",
             "updated_at",
             "assets",
         ]
-        read_only_fields = ["id", "created_at", "updated_at", "assets"]
+        read_only_fields = ["id", "content_sha256", "created_at", "updated_at", "assets"]
 
 class DocumentIngestRequestSerializer(serializers.Serializer):
     file = serializers.FileField()
\ No newline at end of file
@@ -34,13 +34,22 @@ def process_document(self, document_id: str) -> dict:
             original_filename=doc.original_filename,
             doc_id=str(doc.id),
             upload_original=False,
+            previous_fingerprints=(doc.meta or {}).get("page_fingerprints"),
         )
 
+        fingerprints = result.pop("page_fingerprints", None)
         assets = result.get("assets") or []
+        reprocessed = result.get("reprocessed")
 
         with transaction.atomic():
-            # (Opcional pero recomendado) limpiar assets previos en reindex
-            Asset.objects.filter(document=doc).delete()
+            # Limpiar assets previos en reindex: todos, o solo los de páginas reprocesadas
+            if reprocessed is None:
+                Asset.objects.filter(document=doc).delete()
+            else:
+                for a_type in ("table", "image"):
+                    pages = reprocessed.get(a_type) or []
+                    if pages:
+                        Asset.objects.filter(document=doc, type=a_type, meta__page_idx__in=pages).delete()
 
             objs = []
             for a in assets:
@@ -55,6 +64,7 @@ def process_document(self, document_id: str) -> dict:
                         page=a.get("page"),
                         storage_key=sk,
                         meta=a.get("meta") or {},
+                        signature=(a.get("meta") or {}).get("signature"),
                     )
                 )
             if objs:
@@ -62,6 +72,18 @@ def process_document(self, document_id: str) -> dict:
 
             meta = doc.meta or {}
             meta["ingest_result"] = result
+            if fingerprints is not None:
+                meta["page_fingerprints"] = fingerprints
+
+            # Páginas saltadas por presupuesto: se conservan las de páginas no reprocesadas
+            skipped = result.get("skipped_pages") or []
+            if reprocessed is not None:
+                kept = [
+                    s for s in meta.get("skipped_pages") or []
+                    if s.get("page_idx") not in set(reprocessed.get(s.get("stage")) or [])
+                ]
+                skipped = kept + skipped
+            meta["skipped_pages"] = skipped
             doc.meta = meta
             doc.status = "ready"
             doc.updated_at = timezone.now()
@@ -78,3 +100,92 @@ def process_document(self, document_id: str) -> dict:
         doc.updated_at = timezone.now()
         doc.save(update_fields=["meta", "status", "updated_at"])
         raise
+
+
+@shared_task(bind=True, autoretry_for=(Exception,), retry_backoff=True, retry_jitter=True, retry_kwargs={"max_retries": 3})
+def clone_document(self, source_id: str, document_id: str) -> dict:
+    """
+    Duplicado exacto de un PDF ya ingerido: copia vectores y assets del documento
+    origen bajo el nuevo id, sin extraer ni vectorizar de nuevo.
+
+    Los objetos derivados (imágenes y tablas) se copian en MinIO bajo "{dst}/":
+    sus claves dependen de la posición en el PDF y reindexar el origen las
+    sobrescribe o las borra. Las imágenes que el origen reutiliza de otros
+    documentos siguen compartidas (las protege image_paths_in_use).
+    """
+    from documents.models import Document, Asset
+    from integrations.embedding_registry import write_targets
+    from integrations.minio_client import copy_object, list_objects
+    from integrations.qdrant_client import copy_doc_points, rewrite_prefix
+
+    doc = Document.objects.get(id=document_id)
+    src = Document.objects.get(id=source_id)
+
+    if doc.status == "ready":
+        return {"status": "skipped", "reason": "already ready", "doc_id": str(doc.id)}
+
+    doc.status = "processing"
+    doc.updated_at = timezone.now()
+    doc.save(update_fields=["status", "updated_at"])
+
+    try:
+        src_prefix, dst_prefix = f"{src.id}/", f"{doc.id}/"
+        for root in ("images/", "tables/"):
+            for name in list_objects(prefix=src_prefix + root):
+                copy_object(name, dst_prefix + name[len(src_prefix):])
+
+        # Colecciones activas y, durante una migración de modelo, también las nuevas
+        targets = write_targets("text") + write_targets("image")
+        num_points = copy_doc_points(
+            str(src.id), str(doc.id), rewrite_paths=True,
+            collections=[t.collection for t in targets if t.status == "active"],
+        )
+        building = [t.collection for t in targets if t.status == "building"]
+        if building:
+            copy_doc_points(str(src.id), str(doc.id), collections=building, rewrite_paths=True)
+
+        src_meta = src.meta or {}
+        result = {
+            **rewrite_prefix(src_meta.get("ingest_result") or {}, src_prefix, dst_prefix),
+            "doc_id": str(doc.id),
+            "original_filename": doc.original_filename,
+            "cloned_from": str(src.id),
+            "num_points": num_points,
+            "created_at": timezone.now().isoformat(),
+        }
+
+        with transaction.atomic():
+            Asset.objects.filter(document=doc).delete()
+            Asset.objects.bulk_create([
+                Asset(
+                    document=doc,
+                    type=a.type,
+                    page=a.page,
+                    storage_key=rewrite_prefix(a.storage_key, src_prefix, dst_prefix),
+                    meta={**rewrite_prefix(a.meta or {}, src_prefix, dst_prefix), "cloned_from": str(src.id)},
+                    signature=a.signature,
+                )
+                for a in src.assets.all()
+            ])
+
+            meta = doc.meta or {}
+            meta["ingest_result"] = result
+            meta["cloned_from"] = str(src.id)
+            if src_meta.get("page_fingerprints"):
+                meta["page_fingerprints"] = src_meta["page_fingerprints"]
+            doc.meta = meta
+            doc.status = "ready"
+            doc.updated_at = timezone.now()
+            doc.save(update_fields=["meta", "status", "updated_at"])
+
+        return result
+
+    except Exception as e:
+        logger.exception("Clone failed for document_id=%s (source=%s)", document_id, source_id)
+        meta = doc.meta or {}
+        meta["error"] = str(e)
+        doc.meta = meta
+        doc.status = "failed"
+        doc.updated_at = timezone.now()
+        doc.save(update_fields=["meta", "status", "updated_at"])
+        raise
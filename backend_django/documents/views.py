@@ -3,6 +3,8 @@ from rest_framework import status, viewsets, mixins
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
+import hashlib
+import os
 import uuid
 from django.utils import timezone
 
@@ -14,6 +16,12 @@ from documents.serializers import (
 )
 from integrations.minio_client import upload_bytes
 
+# Subida de un PDF ya ingerido (mismo SHA-256):
+#   reuse -> devolver el documento existente
+#   clone -> nuevo documento con copia de vectores y assets (sin reprocesar)
+#   off   -> ingesta completa como siempre
+INGEST_DEDUPE_MODE = os.getenv("INGEST_DEDUPE_MODE", "reuse").strip().lower()
+
 class DocumentViewSet(
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
@@ -55,12 +63,44 @@ class DocumentViewSet(
         storage_key = f"{doc_id}/original.pdf"
 
         pdf_bytes = f.read()
+        sha256 = hashlib.sha256(pdf_bytes).hexdigest()
+
+        dedupe = str(request.query_params.get("dedupe") or INGEST_DEDUPE_MODE).lower()
+        if dedupe in ("reuse", "clone"):
+            existing = (
+                Document.objects.filter(content_sha256=sha256, status="ready")
+                .order_by("created_at")
+                .first()
+            )
+            if existing:
+                if dedupe == "reuse":
+                    data = DocumentSerializer(existing).data
+                    data["deduplicated"] = True
+                    return Response(data, status=status.HTTP_200_OK)
+
+                doc = Document.objects.create(
+                    id=doc_id,
+                    original_filename=f.name,
+                    storage_key_original=existing.storage_key_original,
+                    content_sha256=sha256,
+                    status="pending",
+                    meta={"cloned_from": str(existing.id)},
+                )
+
+                from documents.tasks import clone_document
+                clone_document.delay(str(existing.id), str(doc.id))
+
+                data = DocumentSerializer(doc).data
+                data["deduplicated"] = True
+                return Response(data, status=status.HTTP_202_ACCEPTED)
+
         upload_bytes(storage_key, pdf_bytes, "application/pdf")
 
         doc = Document.objects.create(
             id=doc_id,
             original_filename=f.name,
             storage_key_original=storage_key,
+            content_sha256=sha256,
             status="pending",
         )
 
@@ -76,6 +116,9 @@ class DocumentViewSet(
         meta = doc.meta or {}
         meta.pop("error", None)
         meta.pop("ingest_result", None)
+        # ?full=true ignora las huellas de página y reprocesa el documento entero
+        if str(request.query_params.get("full", "")).lower() in ("1", "true"):
+            meta.pop("page_fingerprints", None)
         doc.meta = meta
         doc.updated_at = timezone.now()
         doc.save(update_fields=["status", "meta", "updated_at"])
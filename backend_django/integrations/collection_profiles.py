@@ -0,0 +1,139 @@
+# backend_django/integrations/collection_profiles.py
+"""
+Perfiles de colección de Qdrant: cuantización, almacenamiento y HNSW.
+
+  default      como antes: float32 en RAM, sin cuantización, HNSW por defecto
+               (m=16, ef_construct=100). Payload en disco (defecto de Qdrant).
+  low-latency  todo en RAM + cuantización escalar int8 (4x menos memoria por
+               vector en el índice) con reescoring sobre los float32; grafo
+               más denso (m=32) para más recall con un hnsw_ef moderado.
+  balanced     int8 en RAM para recorrer el grafo, vectores originales en
+               disco (mmap) solo para el reescoring y payload en disco.
+  low-memory   cuantización binaria (32x menos) en RAM, vectores, payload y
+               grafo en disco; más oversampling para compensar el recall.
+
+El perfil se elige con `python manage.py init_vectorstores --profile <nombre>`
+(o QDRANT_COLLECTION_PROFILE) y queda en el registro de colecciones: las
+migraciones de modelo lo heredan y las consultas usan sus parámetros de
+búsqueda (hnsw_ef, reescoring, oversampling). Se comparan con
+`python manage.py bench_qdrant_profiles`.
+"""
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from qdrant_client.http import models as qm
+
+QDRANT_COLLECTION_PROFILE = os.getenv("QDRANT_COLLECTION_PROFILE", "default")
+
+
+@dataclass(frozen=True)
+class CollectionProfile:
+    name: str
+    quantization: str = "none"  # none | scalar | binary
+    vectors_on_disk: bool = False
+    payload_on_disk: bool = True
+    hnsw_on_disk: bool = False
+    m: int = 16
+    ef_construct: int = 100
+    # búsqueda
+    hnsw_ef: Optional[int] = None  # None: el de Qdrant (ef_construct)
+    rescore: bool = True
+    oversampling: float = 1.0
+
+
+PROFILES: Dict[str, CollectionProfile] = {
+    p.name: p
+    for p in (
+        CollectionProfile("default"),
+        CollectionProfile(
+            "low-latency", quantization="scalar", payload_on_disk=False,
+            m=32, ef_construct=256, hnsw_ef=128, oversampling=2.0,
+        ),
+        CollectionProfile(
+            "balanced", quantization="scalar", vectors_on_disk=True,
+            m=16, ef_construct=128, hnsw_ef=64, oversampling=1.5,
+        ),
+        CollectionProfile(
+            "low-memory", quantization="binary", vectors_on_disk=True, hnsw_on_disk=True,
+            m=16, ef_construct=100, hnsw_ef=64, oversampling=3.0,
+        ),
+    )
+}
+
+
+def get_profile(name: Optional[str] = None) -> CollectionProfile:
+    name = name or QDRANT_COLLECTION_PROFILE
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Perfil de colección desconocido: {name} (disponibles: {', '.join(PROFILES)})")
+
+
+def _quantization_config(profile: CollectionProfile):
+    if profile.quantization == "scalar":
+        return qm.ScalarQuantization(
+            scalar=qm.ScalarQuantizationConfig(type=qm.ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    if profile.quantization == "binary":
+        return qm.BinaryQuantization(binary=qm.BinaryQuantizationConfig(always_ram=True))
+    return None
+
+
+def _hnsw_config(profile: CollectionProfile) -> qm.HnswConfigDiff:
+    return qm.HnswConfigDiff(m=profile.m, ef_construct=profile.ef_construct, on_disk=profile.hnsw_on_disk)
+
+
+def create_kwargs(dim: int, profile: CollectionProfile) -> dict:
+    """
+    Argumentos de `client.create_collection` para una colección nueva con `profile`.
+    """
+    return {
+        "vectors_config": qm.VectorParams(size=dim, distance=qm.Distance.COSINE, on_disk=profile.vectors_on_disk),
+        "hnsw_config": _hnsw_config(profile),
+        "quantization_config": _quantization_config(profile),
+        "on_disk_payload": profile.payload_on_disk,
+    }
+
+
+def update_kwargs(profile: CollectionProfile) -> dict:
+    """
+    Argumentos de `client.update_collection` para pasar una colección existente
+    a `profile` sin recrearla (Qdrant reconstruye índices y cuantización en segundo plano).
+    """
+    return {
+        "vectors_config": {"": qm.VectorParamsDiff(on_disk=profile.vectors_on_disk)},
+        "hnsw_config": _hnsw_config(profile),
+        "quantization_config": _quantization_config(profile) or qm.Disabled.DISABLED,
+        "collection_params": qm.CollectionParamsDiff(on_disk_payload=profile.payload_on_disk),
+    }
+
+
+def search_params(profile: Optional[CollectionProfile] = None) -> Optional[qm.SearchParams]:
+    """
+    Parámetros de búsqueda del perfil (None con el perfil por defecto).
+    """
+    profile = profile or get_profile()
+    if profile.quantization == "none" and profile.hnsw_ef is None:
+        return None
+    quantization = None
+    if profile.quantization != "none":
+        quantization = qm.QuantizationSearchParams(rescore=profile.rescore, oversampling=profile.oversampling)
+    return qm.SearchParams(hnsw_ef=profile.hnsw_ef, quantization=quantization)
+
+
+def estimated_ram_bytes(profile: CollectionProfile, points: int, dim: int) -> int:
+    """
+    RAM aproximada de los vectores y el grafo HNSW (sin payload ni overhead de segmentos).
+    """
+    ram = 0 if profile.vectors_on_disk else points * dim * 4
+    if profile.quantization == "scalar":
+        ram += points * dim
+    elif profile.quantization == "binary":
+        ram += points * ((dim + 7) // 8)
+    if not profile.hnsw_on_disk:
+        # Nivel 0 con 2·m vecinos (ids de 4 bytes) más los niveles superiores (~1/m)
+        ram += int(points * profile.m * 2 * 4 * 1.1)
+    return ram
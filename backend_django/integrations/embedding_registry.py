@@ -0,0 +1,521 @@
+# backend_django/integrations/embedding_registry.py
+"""
+Registro de modelos de embeddings por colección (modelo EmbeddingCollection).
+
+Cada nombre lógico (TEXT_COLLECTION, IMAGE_COLLECTION) es un alias de Qdrant
+que apunta a una colección física con un modelo y una dimensión concretos.
+Cada punto lleva el modelo con el que se vectorizó en `metadata.embed_model`.
+
+Cambio de modelo sin parada (`python manage.py migrate_embeddings`):
+  1. start_migration: nueva colección física "building" con la dimensión del
+     modelo nuevo. Desde ese momento la ingesta escribe en las dos (doble
+     escritura, `write_targets`).
+  2. backfill: recorre la colección activa y revectoriza cada punto con el
+     modelo nuevo (texto desde `content`, imágenes desde MinIO), con los
+     mismos IDs y payloads. Después sincroniza las diferencias: puntos
+     borrados, escritos o reescritos con otro contenido durante el recorrido.
+  3. cutover: última sincronización, cambio atómico del alias y del registro.
+     La colección anterior queda "retired" (sin borrar) hasta `drop_retired`.
+
+Las lecturas usan `active_target`: colección física + modelo de la entrada
+activa, cacheados EMBED_REGISTRY_TTL segundos. Un proceso que aún no ha visto
+el cambio consulta la colección anterior con el modelo anterior, así que
+pregunta y colección nunca se mezclan.
+
+Sin registro (base de datos sin migrar, scripts) se usa el alias con el modelo
+y la dimensión por defecto, como antes.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from django.db import transaction
+from django.utils import timezone
+from qdrant_client.models import PointIdsList, PointStruct
+
+from integrations.collection_profiles import QDRANT_COLLECTION_PROFILE, get_profile, search_params
+from integrations.qdrant_client import (
+    IMAGE_COLLECTION,
+    IMAGE_DIM,
+    TEXT_COLLECTION,
+    TEXT_DIM,
+    EmbeddingDimensionMismatch,
+    _ensure_collection,
+    alias_target,
+    apply_profile,
+    client,
+    collection_dim,
+    collection_exists,
+    ensure_filter_indexes,
+    ensure_image_indexes,
+    switch_alias,
+)
+
+logger = logging.getLogger(__name__)
+
+EMBED_REGISTRY_TTL = float(os.getenv("EMBED_REGISTRY_TTL", "30"))
+EMBED_MIGRATION_BATCH = int(os.getenv("EMBED_MIGRATION_BATCH", "256"))
+
+KINDS = {"text": TEXT_COLLECTION, "image": IMAGE_COLLECTION}
+DEFAULT_DIMS = {"text": TEXT_DIM, "image": IMAGE_DIM}
+
+
+@dataclass(frozen=True)
+class CollectionTarget:
+    kind: str
+    alias: str
+    collection: str
+    model_id: str
+    dim: int
+    status: str = "active"
+    profile: str = "default"
+
+    def search_params(self):
+        # hnsw_ef / reescoring del perfil de la colección (collection_profiles)
+        return search_params(get_profile(self.profile))
+
+
+def default_model(kind: str) -> str:
+    if kind == "text":
+        from rag.embeddings.text_embeddings import TEXT_EMBEDDING_MODEL
+
+        return TEXT_EMBEDDING_MODEL
+    from rag.embeddings.image_embeddings import CLIP_MODEL_NAME
+
+    return CLIP_MODEL_NAME
+
+
+def default_target(kind: str) -> CollectionTarget:
+    return CollectionTarget(
+        kind, KINDS[kind], KINDS[kind], default_model(kind), DEFAULT_DIMS[kind], profile=QDRANT_COLLECTION_PROFILE,
+    )
+
+
+def _target(entry) -> CollectionTarget:
+    return CollectionTarget(
+        entry.kind, entry.alias, entry.collection, entry.model_id, entry.dim, entry.status, entry.profile,
+    )
+
+
+def physical_name(alias: str, model_id: str, dim: int) -> str:
+    slug = re.sub(r"[^a-z0-9]+", "-", model_id.split("/")[-1].lower()).strip("-")[:40]
+    return f"{alias}__{slug}_{dim}_{timezone.now():%Y%m%d%H%M%S}"
+
+
+# ---------- lectura (con caché por proceso) ----------
+
+_cache: Dict[str, tuple] = {}
+_cache_lock = threading.Lock()
+
+
+def invalidate() -> None:
+    with _cache_lock:
+        _cache.clear()
+
+
+def _entries(kind: str, statuses: Iterable[str]):
+    from integrations.models import EmbeddingCollection
+
+    return list(EmbeddingCollection.objects.filter(kind=kind, status__in=list(statuses)).order_by("created_at"))
+
+
+def active_target(kind: str) -> CollectionTarget:
+    """
+    Colección física y modelo para consultar `kind` ("text" | "image").
+    """
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _cache.get(kind)
+        if cached and cached[0] > now:
+            return cached[1]
+
+    try:
+        entries = _entries(kind, ["active"])
+        target = _target(entries[0]) if entries else default_target(kind)
+    except Exception:
+        logger.debug("[EMBED_REGISTRY] Registro no disponible; se usa el alias %s.", KINDS[kind], exc_info=True)
+        target = default_target(kind)
+
+    with _cache_lock:
+        _cache[kind] = (now + EMBED_REGISTRY_TTL, target)
+    return target
+
+
+def write_targets(kind: str) -> List[CollectionTarget]:
+    """
+    Colecciones donde escribir `kind`: la activa primero y, durante una
+    migración, también la que se está construyendo. Sin caché: se consulta
+    al empezar cada ingesta para no perder la doble escritura.
+    """
+    try:
+        entries = _entries(kind, ["active", "building"])
+    except Exception:
+        logger.debug("[EMBED_REGISTRY] Registro no disponible; se usa el alias %s.", KINDS[kind], exc_info=True)
+        entries = []
+    targets = sorted((_target(e) for e in entries), key=lambda t: t.status != "active")
+    if not targets or targets[0].status != "active":
+        targets.insert(0, default_target(kind))
+    return targets
+
+
+# ---------- arranque (init_vectorstores) ----------
+
+def bootstrap(profile: Optional[str] = None) -> List[str]:
+    """
+    Deja Qdrant y el registro coherentes sin borrar nada: crea lo que falta,
+    adopta colecciones existentes (incluida la colección con el nombre del
+    alias, de antes del registro) y apunta los alias a las activas.
+
+    Con `profile` las colecciones nuevas se crean con ese perfil y a las
+    existentes (activa y en construcción) se les aplica sin recrearlas; sin
+    él, las nuevas usan QDRANT_COLLECTION_PROFILE y las existentes no cambian.
+    """
+    if profile is not None:
+        get_profile(profile)  # valida el nombre antes de tocar nada
+    return [msg for kind in KINDS for msg in _bootstrap_kind(kind, profile)]
+
+
+def _bootstrap_kind(kind: str, profile: Optional[str] = None) -> List[str]:
+    from integrations.models import EmbeddingCollection
+
+    alias = KINDS[kind]
+    model_id, dim = default_model(kind), DEFAULT_DIMS[kind]
+    new_profile = profile or QDRANT_COLLECTION_PROFILE
+    messages = []
+
+    active = EmbeddingCollection.objects.filter(kind=kind, status="active").first()
+    if active is None:
+        existing = alias_target(alias) or (alias if collection_exists(alias) else None)
+        if existing:
+            # Colección anterior al registro: se adopta con su dimensión real
+            current_dim = collection_dim(existing) or dim
+            if current_dim != dim:
+                messages.append(
+                    f"{kind}: {existing} tiene dimensión {current_dim} y {model_id} usa {dim}; "
+                    f"no se borra. Migrar con: python manage.py migrate_embeddings {kind} --model <modelo>"
+                )
+            # Se creó con la configuración por defecto; --profile se le aplica abajo
+            active = EmbeddingCollection.objects.create(
+                kind=kind, alias=alias, collection=existing, model_id=model_id, dim=current_dim,
+                profile="default", status="active", activated_at=timezone.now(),
+            )
+            messages.append(f"{kind}: colección existente {existing} registrada ({model_id}, {current_dim}d)")
+        else:
+            name = physical_name(alias, model_id, dim)
+            _ensure_collection(name, dim, get_profile(new_profile))
+            switch_alias(alias, name)
+            active = EmbeddingCollection.objects.create(
+                kind=kind, alias=alias, collection=name, model_id=model_id, dim=dim, profile=new_profile,
+                status="active", activated_at=timezone.now(),
+            )
+            messages.append(f"{kind}: {name} creada ({model_id}, {dim}d, perfil {new_profile}) con alias {alias}")
+    elif active.model_id != model_id:
+        messages.append(
+            f"{kind}: el modelo configurado ({model_id}) no es el activo ({active.model_id}); "
+            f"para cambiarlo: python manage.py migrate_embeddings {kind} --model {model_id}"
+        )
+
+    for entry in EmbeddingCollection.objects.filter(kind=kind, status__in=["active", "building"]):
+        try:
+            _ensure_collection(entry.collection, entry.dim, get_profile(entry.profile))
+        except EmbeddingDimensionMismatch as e:
+            messages.append(f"{kind}: {e}")
+            continue
+        if profile is not None and entry.profile != profile:
+            apply_profile(entry.collection, get_profile(profile))
+            EmbeddingCollection.objects.filter(pk=entry.pk).update(profile=profile)
+            messages.append(f"{kind}: perfil {entry.profile} -> {profile} en {entry.collection} (se reindexa en segundo plano)")
+        ensure_filter_indexes(entry.collection)
+        if kind == "image":
+            ensure_image_indexes(entry.collection)
+
+    if active.collection != alias and alias_target(alias) != active.collection and not collection_exists(alias):
+        switch_alias(alias, active.collection)
+        messages.append(f"{kind}: alias {alias} -> {active.collection}")
+
+    invalidate()
+    return messages or [f"{kind}: {active.collection} ({active.model_id}, {active.dim}d, perfil {active.profile})"]
+
+
+# ---------- migración ----------
+
+def embed_fn_for(kind: str, model_id: str) -> Callable[[list], list]:
+    if kind == "text":
+        from rag.embeddings.text_embeddings import embed_texts
+
+        return lambda items: embed_texts(items, model_name=model_id)
+    from rag.embeddings.image_embeddings import embed_images
+
+    return lambda items: embed_images(items, model_name=model_id)
+
+
+def probe_dim(kind: str, model_id: str) -> int:
+    """
+    Dimensión del modelo: se vectoriza una entrada de prueba.
+    """
+    if kind == "text":
+        item: Any = "dimension probe"
+    else:
+        from io import BytesIO
+
+        from PIL import Image
+
+        buf = BytesIO()
+        Image.new("RGB", (32, 32), (128, 128, 128)).save(buf, format="PNG")
+        item = buf.getvalue()
+    vec = embed_fn_for(kind, model_id)([item])[0]
+    if not vec:
+        raise ValueError(f"{model_id} no ha devuelto un vector para la prueba")
+    return len(vec)
+
+
+def start_migration(kind: str, model_id: str, dim: Optional[int] = None):
+    """
+    Registra y crea la colección "building" del modelo nuevo. Si ya hay una
+    para el mismo modelo se reanuda; si es de otro modelo, error.
+    """
+    from integrations.models import EmbeddingCollection
+
+    building = EmbeddingCollection.objects.filter(kind=kind, status="building").first()
+    if building is not None:
+        if building.model_id != model_id:
+            raise ValueError(
+                f"Ya hay una migración de {kind} a {building.model_id}; cancelarla antes (--abort)."
+            )
+        return building
+
+    active = EmbeddingCollection.objects.filter(kind=kind, status="active").first()
+    if active is None:
+        raise ValueError("No hay colección activa: ejecutar antes python manage.py init_vectorstores")
+    dim = dim or probe_dim(kind, model_id)
+    if active.model_id == model_id and active.dim == dim:
+        raise ValueError(f"{model_id} ya es el modelo activo de {kind}.")
+
+    # La colección nueva hereda el perfil de la activa
+    name = physical_name(KINDS[kind], model_id, dim)
+    _ensure_collection(name, dim, get_profile(active.profile))
+    ensure_filter_indexes(name)
+    if kind == "image":
+        ensure_image_indexes(name)
+    building = EmbeddingCollection.objects.create(
+        kind=kind, alias=KINDS[kind], collection=name, model_id=model_id, dim=dim,
+        profile=active.profile, status="building",
+    )
+    invalidate()
+    logger.info("[EMBED_REGISTRY] %s: migración a %s (%dd) en %s", kind, model_id, dim, name)
+    return building
+
+
+def _stamp(payload: Optional[dict], model_id: str) -> dict:
+    payload = dict(payload or {})
+    payload["metadata"] = {**(payload.get("metadata") or {}), "embed_model": model_id}
+    return payload
+
+
+def _input_for(kind: str, payload: dict) -> Any:
+    if kind == "text":
+        return payload.get("content") or None
+    from integrations.minio_client import download_bytes
+
+    path = (payload.get("metadata") or {}).get("image_path")
+    if not path:
+        return None
+    try:
+        return download_bytes(path)
+    except Exception:
+        logger.warning("[EMBED_REGISTRY] No se pudo descargar %s para revectorizarla.", path)
+        return None
+
+
+def _copy_points(kind: str, points: list, dst: str, model_id: str, embed_fn) -> tuple:
+    inputs = [(p, _input_for(kind, p.payload or {})) for p in points]
+    valid = [(p, item) for p, item in inputs if item is not None]
+    vectors = embed_fn([item for _, item in valid]) if valid else []
+    batch = [
+        PointStruct(id=p.id, vector=vec, payload=_stamp(p.payload, model_id))
+        for (p, _), vec in zip(valid, vectors)
+        if vec is not None
+    ]
+    if batch:
+        client.upsert(collection_name=dst, points=batch)
+    return len(batch), len(points) - len(batch)
+
+
+def _payload_hash(payload: Optional[dict]) -> str:
+    # Contenido del punto sin el sello del modelo, que difiere entre colecciones
+    payload = dict(payload or {})
+    metadata = dict(payload.get("metadata") or {})
+    metadata.pop("embed_model", None)
+    payload["metadata"] = metadata
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _point_hashes(collection_name: str) -> Dict[str, tuple]:
+    # str(id) -> (id original (UUID o entero), hash del payload)
+    points_by_id: Dict[str, tuple] = {}
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name, limit=1024, offset=offset, with_payload=True, with_vectors=False,
+        )
+        points_by_id.update((str(p.id), (p.id, _payload_hash(p.payload))) for p in points)
+        if offset is None:
+            return points_by_id
+
+
+def sync(kind: str, src: str, dst: str, model_id: str, embed_fn, batch_size: int = EMBED_MIGRATION_BATCH) -> Dict[str, int]:
+    """
+    Iguala `dst` con `src`: borra de `dst` los puntos que ya no están en `src`
+    y revectoriza los que faltan o cuyo payload ha cambiado (escritos, borrados
+    o reescritos con los mismos IDs durante el backfill).
+    """
+    src_points, dst_points = _point_hashes(src), _point_hashes(dst)
+    stale = [dst_points[k][0] for k in sorted(dst_points.keys() - src_points.keys())]
+    missing = [src_points[k][0] for k in sorted(src_points.keys() - dst_points.keys())]
+    changed = [
+        src_points[k][0] for k in sorted(src_points.keys() & dst_points.keys())
+        if src_points[k][1] != dst_points[k][1]
+    ]
+
+    for start in range(0, len(stale), batch_size):
+        client.delete(collection_name=dst, points_selector=PointIdsList(points=stale[start:start + batch_size]))
+
+    copied = skipped = 0
+    pending = missing + changed
+    for start in range(0, len(pending), batch_size):
+        points = client.retrieve(
+            collection_name=src, ids=pending[start:start + batch_size], with_payload=True, with_vectors=False,
+        )
+        c, s = _copy_points(kind, points, dst, model_id, embed_fn)
+        copied, skipped = copied + c, skipped + s
+    return {"deleted": len(stale), "copied": copied, "changed": len(changed), "skipped": skipped}
+
+
+def backfill(kind: str, batch_size: int = EMBED_MIGRATION_BATCH, progress: Optional[Callable[[int], None]] = None) -> Dict[str, int]:
+    """
+    Revectoriza toda la colección activa en la colección "building" y sincroniza.
+    """
+    from integrations.models import EmbeddingCollection
+
+    building = EmbeddingCollection.objects.get(kind=kind, status="building")
+    active = EmbeddingCollection.objects.get(kind=kind, status="active")
+    embed_fn = embed_fn_for(kind, building.model_id)
+
+    copied = skipped = 0
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=active.collection, limit=batch_size, offset=offset,
+            with_payload=True, with_vectors=False,
+        )
+        c, s = _copy_points(kind, points, building.collection, building.model_id, embed_fn)
+        copied, skipped = copied + c, skipped + s
+        EmbeddingCollection.objects.filter(pk=building.pk).update(backfilled=copied)
+        if progress:
+            progress(copied)
+        if offset is None:
+            break
+
+    delta = sync(kind, active.collection, building.collection, building.model_id, embed_fn, batch_size)
+    EmbeddingCollection.objects.filter(pk=building.pk).update(backfilled=copied + delta["copied"] - delta["changed"])
+    logger.info(
+        "[EMBED_REGISTRY] %s: backfill de %s -> %s: %d puntos, %d sin entrada, sincronización %s",
+        kind, active.collection, building.collection, copied, skipped, delta,
+    )
+    return {"copied": copied, "skipped": skipped, **{f"sync_{k}": v for k, v in delta.items()}}
+
+
+def cutover(kind: str):
+    """
+    Última sincronización y cambio de la colección activa: alias de Qdrant
+    (operación atómica) y registro. La anterior queda "retired".
+    """
+    from integrations.models import EmbeddingCollection
+
+    building = EmbeddingCollection.objects.get(kind=kind, status="building")
+    active = EmbeddingCollection.objects.get(kind=kind, status="active")
+    sync(kind, active.collection, building.collection, building.model_id, embed_fn_for(kind, building.model_id))
+
+    with transaction.atomic():
+        now = timezone.now()
+        EmbeddingCollection.objects.filter(pk=active.pk).update(status="retired", retired_at=now)
+        EmbeddingCollection.objects.filter(pk=building.pk).update(status="active", activated_at=now)
+
+    if collection_exists(building.alias):
+        # Colección anterior al registro con el nombre del alias: el alias se crea
+        # cuando se borre (drop_retired); la app ya lee y escribe por el registro
+        logger.warning(
+            "[EMBED_REGISTRY] %s: %s sigue ocupando el nombre del alias; se apuntará al borrarla.",
+            kind, building.alias,
+        )
+    else:
+        switch_alias(building.alias, building.collection)
+
+    invalidate()
+    building.refresh_from_db()
+    logger.info("[EMBED_REGISTRY] %s: activa %s (%s)", kind, building.collection, building.model_id)
+    return building
+
+
+def abort(kind: str) -> Optional[str]:
+    from integrations.models import EmbeddingCollection
+
+    building = EmbeddingCollection.objects.filter(kind=kind, status="building").first()
+    if building is None:
+        return None
+    client.delete_collection(building.collection)
+    building.delete()
+    invalidate()
+    return building.collection
+
+
+def drop_retired(kind: str, min_age_s: Optional[float] = None) -> List[str]:
+    """
+    Borra las colecciones retiradas hace más de `min_age_s` (por defecto 2×TTL,
+    para que ningún proceso siga leyéndolas) y, si el nombre queda libre, crea
+    el alias hacia la activa.
+    """
+    from integrations.models import EmbeddingCollection
+
+    min_age_s = 2 * EMBED_REGISTRY_TTL if min_age_s is None else min_age_s
+    cutoff = timezone.now() - timedelta(seconds=min_age_s)
+    dropped = []
+    for entry in EmbeddingCollection.objects.filter(kind=kind, status="retired", retired_at__lte=cutoff):
+        if collection_exists(entry.collection):
+            client.delete_collection(entry.collection)
+        entry.delete()
+        dropped.append(entry.collection)
+
+    active = EmbeddingCollection.objects.filter(kind=kind, status="active").first()
+    if active and active.collection != active.alias and not collection_exists(active.alias):
+        if alias_target(active.alias) != active.collection:
+            switch_alias(active.alias, active.collection)
+    return dropped
+
+
+def run_migration(kind: str, model_id: str, dim: Optional[int] = None, do_cutover: bool = True) -> Dict[str, Any]:
+    """
+    Migración completa: colección nueva, backfill y (opcionalmente) cambio de alias.
+    """
+    building = start_migration(kind, model_id, dim)
+    stats = backfill(kind)
+    if do_cutover:
+        building = cutover(kind)
+    return {
+        "kind": kind,
+        "model_id": building.model_id,
+        "dim": building.dim,
+        "collection": building.collection,
+        "status": building.status,
+        **stats,
+    }
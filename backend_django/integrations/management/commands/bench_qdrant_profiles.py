@@ -0,0 +1,186 @@
+import re
+import urllib.request
+from time import monotonic, perf_counter, sleep
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from qdrant_client.http import models as qm
+
+from integrations.collection_profiles import PROFILES, create_kwargs, estimated_ram_bytes, get_profile, search_params
+from integrations.qdrant_client import QDRANT_HOST, QDRANT_PORT, QDRANT_URL, client
+
+UPLOAD_BATCH = 512
+
+
+def _mb(n) -> str:
+    return "n/d" if n is None else f"{n / 2**20:7.1f} MB"
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara los perfiles de colección de Qdrant: recall@k frente a búsqueda exacta, latencia "
+        "(p50/p95) y RAM. Crea una colección temporal por perfil en el Qdrant configurado."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profiles", default=",".join(PROFILES), help="Perfiles a comparar (coma)")
+        parser.add_argument(
+            "--from-collection",
+            help="Usa vectores reales de esta colección o alias (p. ej. text_chunks); por defecto, sintéticos",
+        )
+        parser.add_argument("--points", type=int, default=20000, help="Puntos indexados por perfil")
+        parser.add_argument("--queries", type=int, default=200, help="Consultas (puntos que no se indexan)")
+        parser.add_argument("--dim", type=int, default=384, help="Dimensión de los vectores sintéticos")
+        parser.add_argument("--k", type=int, default=10, help="k de recall@k")
+        parser.add_argument("--timeout", type=float, default=600, help="Espera máxima a que termine el índice (s)")
+        parser.add_argument("--keep", action="store_true", help="No borrar las colecciones del benchmark")
+
+    def handle(self, *args, **options):
+        try:
+            profiles = [get_profile(p.strip()) for p in options["profiles"].split(",") if p.strip()]
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        n, nq, k = options["points"], options["queries"], options["k"]
+        if options["from_collection"]:
+            vectors = self._real_vectors(options["from_collection"], n + nq)
+        else:
+            vectors = self._synthetic_vectors(n + nq, options["dim"])
+        if len(vectors) <= nq:
+            raise CommandError(f"Solo hay {len(vectors)} vectores; hacen falta más de {nq}.")
+        base, queries = vectors[:-nq], vectors[-nq:]
+        n, dim = base.shape
+
+        # Referencia: búsqueda exacta (fuerza bruta por coseno sobre float32)
+        unit = base / np.linalg.norm(base, axis=1, keepdims=True).clip(1e-12)
+        qunit = queries / np.linalg.norm(queries, axis=1, keepdims=True).clip(1e-12)
+        truth = np.argsort(-(qunit @ unit.T), axis=1)[:, :k]
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{n} puntos, {dim}d, {nq} consultas, k={k} "
+            f"({'colección ' + options['from_collection'] if options['from_collection'] else 'sintéticos'})"
+        ))
+        self.stdout.write(
+            f"  {'perfil':<12} {'recall@' + str(k):>9} {'p50':>8} {'p95':>8} {'consultas/s':>11} "
+            f"{'RAM estimada':>13} {'RSS Qdrant Δ':>13} {'índice':>8}"
+        )
+        for profile in profiles:
+            row = self._bench_profile(profile, base, queries, truth, k, options)
+            self.stdout.write(
+                f"  {profile.name:<12} {row['recall']:9.3f} {row['p50']:6.2f}ms {row['p95']:6.2f}ms "
+                f"{row['qps']:11.1f} {_mb(row['ram_est']):>13} {_mb(row['rss_delta']):>13} {row['index_s']:7.1f}s"
+            )
+        self.stdout.write(
+            "RAM estimada: vectores, cuantización y grafo HNSW que quedan en memoria. RSS Qdrant Δ: "
+            "memoria residente del proceso de Qdrant (/metrics) antes y después; orientativa (incluye caché)."
+        )
+
+    def _bench_profile(self, profile, base, queries, truth, k, options):
+        n, dim = base.shape
+        name = f"bench_profile_{profile.name.replace('-', '_')}"
+        if any(c.name == name for c in client.get_collections().collections):
+            client.delete_collection(name)
+
+        rss_before = self._qdrant_rss()
+        # indexing_threshold bajo: el HNSW se construye también con pocos puntos
+        client.create_collection(
+            collection_name=name,
+            optimizers_config=qm.OptimizersConfigDiff(indexing_threshold=1000),
+            **create_kwargs(dim, profile),
+        )
+        try:
+            t0 = perf_counter()
+            self._upload(name, base)
+            self._wait_indexed(name, n, options["timeout"])
+            index_s = perf_counter() - t0
+
+            params = search_params(profile)
+            for q in queries[:10]:  # calentamiento
+                client.query_points(collection_name=name, query=q.tolist(), limit=k, search_params=params)
+
+            latencies, hits = [], 0
+            for q, expected in zip(queries, truth):
+                t0 = perf_counter()
+                res = client.query_points(
+                    collection_name=name, query=q.tolist(), limit=k, with_payload=True, search_params=params,
+                )
+                latencies.append((perf_counter() - t0) * 1000)
+                hits += len({int(p.id) for p in res.points} & set(expected.tolist()))
+
+            rss_after = self._qdrant_rss()
+            return {
+                "recall": hits / (len(queries) * k),
+                "p50": float(np.percentile(latencies, 50)),
+                "p95": float(np.percentile(latencies, 95)),
+                "qps": len(latencies) / (sum(latencies) / 1000),
+                "ram_est": estimated_ram_bytes(profile, n, dim),
+                "rss_delta": rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+                "index_s": index_s,
+            }
+        finally:
+            if not options["keep"]:
+                client.delete_collection(name)
+
+    @staticmethod
+    def _upload(name, base):
+        rng = np.random.default_rng(1)
+        for start in range(0, len(base), UPLOAD_BATCH):
+            points = [
+                qm.PointStruct(
+                    id=i,
+                    vector=base[i].tolist(),
+                    # Payload del tamaño de un chunk, para que on_disk_payload cuente
+                    payload={
+                        "content": "x" * int(rng.integers(200, 1200)),
+                        "metadata": {"doc_id": f"bench-{i % 50}", "modality": "text"},
+                    },
+                )
+                for i in range(start, min(start + UPLOAD_BATCH, len(base)))
+            ]
+            client.upsert(collection_name=name, points=points, wait=True)
+
+    @staticmethod
+    def _wait_indexed(name, n, timeout):
+        deadline = monotonic() + timeout
+        while True:
+            info = client.get_collection(name)
+            if info.status == qm.CollectionStatus.GREEN and (info.indexed_vectors_count or 0) >= n * 0.95:
+                return
+            if monotonic() > deadline:
+                raise CommandError(f"{name}: el índice no ha terminado en {timeout:.0f}s ({info.status}).")
+            sleep(0.5)
+
+    @staticmethod
+    def _synthetic_vectors(count, dim):
+        # Mezcla de gaussianas: parecido a embeddings de chunks (temas agrupados), reproducible
+        rng = np.random.default_rng(0)
+        centers = rng.normal(size=(max(1, count // 200), dim)).astype("float32")
+        labels = rng.integers(0, len(centers), count)
+        return centers[labels] + rng.normal(scale=0.6, size=(count, dim)).astype("float32")
+
+    @staticmethod
+    def _real_vectors(collection_name, count):
+        vectors, offset = [], None
+        while len(vectors) < count:
+            points, offset = client.scroll(
+                collection_name=collection_name, limit=1024, offset=offset, with_payload=False, with_vectors=True,
+            )
+            vectors.extend(p.vector for p in points if p.vector)
+            if offset is None:
+                break
+        if not vectors:
+            raise CommandError(f"{collection_name} no tiene vectores.")
+        arr = np.asarray(vectors[:count], dtype="float32")
+        np.random.default_rng(0).shuffle(arr)
+        return arr
+
+    @staticmethod
+    def _qdrant_rss():
+        base_url = QDRANT_URL or f"http://{QDRANT_HOST}:{QDRANT_PORT}"
+        try:
+            with urllib.request.urlopen(f"{base_url.rstrip('/')}/metrics", timeout=5) as resp:
+                text = resp.read().decode()
+        except Exception:
+            return None
+        m = re.search(r"^memory_resident_bytes(?:\{[^}]*\})?\s+([0-9.e+]+)", text, re.M)
+        return int(float(m.group(1))) if m else None
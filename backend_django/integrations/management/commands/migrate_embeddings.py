@@ -0,0 +1,81 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from integrations import embedding_registry as registry
+from integrations.models import EmbeddingCollection
+
+
+class Command(BaseCommand):
+    help = (
+        "Cambia el modelo de embeddings de una colección sin parada: colección nueva, doble escritura, "
+        "backfill y cambio de alias. Sin --model muestra el registro."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", nargs="?", choices=sorted(registry.KINDS), help="text o image")
+        parser.add_argument("--model", help="Modelo nuevo (id de sentence-transformers)")
+        parser.add_argument("--dim", type=int, help="Dimensión (por defecto se mide con el modelo)")
+        parser.add_argument("--background", action="store_true", help="Encolar la migración en Celery")
+        parser.add_argument("--no-cutover", action="store_true", help="Solo backfill; el alias no cambia")
+        parser.add_argument("--cutover", action="store_true", help="Cambiar ya a la colección en construcción")
+        parser.add_argument("--abort", action="store_true", help="Cancelar la migración en curso")
+        parser.add_argument("--drop-retired", action="store_true", help="Borrar las colecciones retiradas")
+
+    def handle(self, *args, **options):
+        kind = options["kind"]
+        if kind is None or not any(options[k] for k in ("model", "cutover", "abort", "drop_retired")):
+            return self._status(kind)
+
+        if options["abort"]:
+            name = registry.abort(kind)
+            self.stdout.write(f"Migración cancelada; {name} borrada." if name else "No hay migración en curso.")
+            return
+        if options["drop_retired"]:
+            dropped = registry.drop_retired(kind)
+            self.stdout.write(f"Colecciones borradas: {', '.join(dropped) or '(ninguna)'}")
+            return
+        if options["cutover"] and not options["model"]:
+            entry = registry.cutover(kind)
+            self.stdout.write(self.style.SUCCESS(f"{kind}: activa {entry.collection} ({entry.model_id})"))
+            return
+
+        if options["background"]:
+            from integrations.tasks import migrate_embedding_collection
+
+            task = migrate_embedding_collection.delay(
+                kind, options["model"], dim=options["dim"], cutover=not options["no_cutover"],
+            )
+            self.stdout.write(self.style.SUCCESS(f"Migración encolada (task {task.id})."))
+            return
+
+        try:
+            building = registry.start_migration(kind, options["model"], options["dim"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(
+            f"{kind}: {building.collection} ({building.model_id}, {building.dim}d) en construcción; "
+            "la ingesta ya escribe en las dos colecciones."
+        )
+
+        stats = registry.backfill(kind, progress=lambda n: self.stdout.write(f"  {n} puntos...", ending="\r"))
+        self.stdout.write(f"Backfill: {stats}")
+
+        if options["no_cutover"]:
+            self.stdout.write(f"Cambio pendiente: python manage.py migrate_embeddings {kind} --cutover")
+            return
+        entry = registry.cutover(kind)
+        self.stdout.write(self.style.SUCCESS(
+            f"{kind}: activa {entry.collection} ({entry.model_id}, {entry.dim}d). "
+            f"La anterior queda retirada (--drop-retired para borrarla)."
+        ))
+
+    def _status(self, kind):
+        entries = EmbeddingCollection.objects.order_by("kind", "created_at")
+        if kind:
+            entries = entries.filter(kind=kind)
+        if not entries:
+            self.stdout.write("Registro vacío: ejecutar python manage.py init_vectorstores")
+        for e in entries:
+            self.stdout.write(
+                f"{e.kind:<6} {e.status:<9} {e.model_id} ({e.dim}d, {e.profile}) -> {e.collection}"
+                + (f"  backfill={e.backfilled}" if e.status == "building" else "")
+            )
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.9 on 2026-10-17 03:27
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmbeddingCollection',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('text', 'text'), ('image', 'image')], max_length=16)),
+                ('alias', models.CharField(max_length=255)),
+                ('collection', models.CharField(max_length=255, unique=True)),
+                ('model_id', models.CharField(max_length=255)),
+                ('dim', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('building', 'building'), ('active', 'active'), ('retired', 'retired')], db_index=True, default='building', max_length=16)),
+                ('backfilled', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('activated_at', models.DateTimeField(blank=True, null=True)),
+                ('retired_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'active')), fields=('kind',), name='one_active_embedding_collection'), models.UniqueConstraint(condition=models.Q(('status', 'building')), fields=('kind',), name='one_building_embedding_collection')],
+            },
+        ),
+    ]
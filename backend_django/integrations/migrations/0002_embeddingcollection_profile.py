@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-17 03:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('integrations', '0001_embeddingcollection'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='embeddingcollection',
+            name='profile',
+            field=models.CharField(default='default', max_length=32),
+        ),
+    ]
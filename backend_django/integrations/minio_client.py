@@ -6,6 +6,8 @@ import os
 from functools import lru_cache
 from typing import Optional
 from minio import Minio
+from minio.commonconfig import CopySource
+from minio.deleteobjects import DeleteObject
 
 
 def _env(name: str, default: str | None = None) -> str | None:
@@ -65,14 +67,52 @@ def download_bytes(object_name: str, bucket: Optional[str] = None) -> bytes:
         resp.release_conn()
 
 
+def download_range(object_name: str, offset: int, length: int, bucket: Optional[str] = None) -> bytes:
+    """
+    Lee solo `length` bytes desde `offset` (petición HTTP Range).
+    """
+    client = get_minio_client()
+    b = bucket or get_bucket()
+    resp = client.get_object(b, object_name, offset=offset, length=length)
+    try:
+        return resp.read()
+    finally:
+        resp.close()
+        resp.release_conn()
+
+
+def object_size(object_name: str, bucket: Optional[str] = None) -> int:
+    client = get_minio_client()
+    b = bucket or get_bucket()
+    return client.stat_object(b, object_name).size
+
+
 def download_file(object_name: str, dest_path: str, bucket: Optional[str] = None) -> None:
     client = get_minio_client()
     b = bucket or get_bucket()
     client.get_object(b, object_name, dest_path)
 
+def copy_object(src_name: str, dst_name: str, bucket: Optional[str] = None) -> None:
+    # Copia en el servidor (sin descargar el objeto)
+    client = get_minio_client()
+    b = bucket or get_bucket()
+    client.copy_object(b, dst_name, CopySource(b, src_name))
+
+
 def list_objects(prefix: str = "", bucket: Optional[str] = None, recursive: bool = True) -> list[str]:
     client = get_minio_client()
     b = bucket or get_bucket()
     ensure_bucket(b)
     objs = client.list_objects(b, prefix=prefix, recursive=recursive)
     return [o.object_name for o in objs]
+
+
+def delete_objects(object_names: list[str], bucket: Optional[str] = None) -> None:
+    if not object_names:
+        return
+    client = get_minio_client()
+    b = bucket or get_bucket()
+    # remove_objects es perezoso: hay que consumir el iterador de errores
+    errors = client.remove_objects(b, (DeleteObject(name) for name in object_names))
+    for err in errors:
+        raise RuntimeError(f"MinIO delete failed for {err.name}: {err.message}")
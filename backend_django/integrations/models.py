@@ -1,3 +1,47 @@
+import uuid
 from django.db import models
+from django.db.models import Q
 
-# Create your models here.
+
+class EmbeddingCollection(models.Model):
+    """
+    Registro de modelos de embeddings: qué modelo (y dimensión) hay detrás de
+    cada colección física de Qdrant. `alias` es el nombre lógico que usa la app
+    (TEXT_COLLECTION / IMAGE_COLLECTION) y apunta a la colección activa.
+
+    Cambiar de modelo crea una colección "building" (doble escritura + backfill)
+    que pasa a "active" al cambiar el alias; la anterior queda "retired".
+    """
+    KIND_CHOICES = [("text", "text"), ("image", "image")]
+    STATUS_CHOICES = [
+        ("building", "building"),
+        ("active", "active"),
+        ("retired", "retired"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    alias = models.CharField(max_length=255)
+    collection = models.CharField(max_length=255, unique=True)  # colección física en Qdrant
+    model_id = models.CharField(max_length=255)
+    dim = models.PositiveIntegerField()
+    profile = models.CharField(max_length=32, default="default")  # integrations.collection_profiles
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default="building", db_index=True)
+    backfilled = models.PositiveIntegerField(default=0)  # puntos revectorizados en la migración
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    activated_at = models.DateTimeField(null=True, blank=True)
+    retired_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["kind"], condition=Q(status="active"), name="one_active_embedding_collection",
+            ),
+            models.UniqueConstraint(
+                fields=["kind"], condition=Q(status="building"), name="one_building_embedding_collection",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.kind}: {self.model_id} ({self.dim}d) -> {self.collection} [{self.status}]"
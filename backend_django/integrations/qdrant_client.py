@@ -1,20 +1,26 @@
 # backend_django\integrations\qdrant_client.py
 
-from typing import List, Optional, Any, Dict
+from typing import List, Optional, Any, Dict, Iterable, Union
+import hashlib
 import os
 from qdrant_client import QdrantClient
 from qdrant_client.models import (
-    VectorParams,
-    Distance,
     PointStruct,
     Filter,
     FieldCondition,
     MatchAny,
     FilterSelector,
+    PointIdsList,
+    PayloadSchemaType,
 )
-from uuid import uuid4
+from uuid import UUID, uuid4, uuid5
 from qdrant_client.http import models as qm
 
+from integrations.collection_profiles import CollectionProfile, create_kwargs, get_profile, update_kwargs
+
+# Nombres lógicos (alias de Qdrant); la colección física, el modelo y la
+# dimensión de cada uno están en el registro (integrations.embedding_registry).
+# Las dimensiones son las de los modelos por defecto (MiniLM y CLIP ViT-B/16).
 TEXT_COLLECTION = os.getenv("TEXT_COLLECTION", "text_chunks")
 TEXT_DIM = 384
 
@@ -31,11 +37,16 @@ else:
     client = QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
 
 
+# Namespace fijo: los IDs de punto se derivan del contenido y no cambian entre reintentos
+POINT_ID_NAMESPACE = UUID("5b0c8a3e-7f4d-4c55-9a0e-2d6f1c9b7e41")
+
+
 # ---------- helpers internos ----------
 
 def _build_filter(
     doc_ids: Optional[List[str]] = None,
     modalities: Optional[List[str]] = None,
+    page_idxs: Optional[List[int]] = None,
 ) -> Optional[Filter]:
     must_conditions = []
 
@@ -55,45 +66,136 @@ def _build_filter(
             )
         )
 
+    if page_idxs:
+        must_conditions.append(
+            FieldCondition(
+                key="metadata.page_idx",
+                match=MatchAny(any=page_idxs),
+            )
+        )
+
     if not must_conditions:
         return None
 
     return Filter(must=must_conditions)
 
 
-def _ensure_collection(name: str, dim: int) -> None:
+class EmbeddingDimensionMismatch(RuntimeError):
+    """
+    La colección existe con otra dimensión: no se borra nunca (ver
+    `python manage.py migrate_embeddings` para cambiar de modelo).
+    """
+
+
+def collection_dim(name: str) -> Optional[int]:
+    """
+    Dimensión de los vectores de `name` (colección o alias); None si no existe.
+    """
     try:
         info = client.get_collection(name)
-        params = info.config.params
-        vectors = getattr(params, "vectors", None)
-
-        current_dim = None
-        if vectors is not None:
-            if isinstance(vectors, dict):
-                current_dim = list(vectors.values())[0].size
-            else:
-                current_dim = vectors.size
-
-        if current_dim == dim:
-            return
-
-        client.recreate_collection(
-            collection_name=name,
-            vectors_config=VectorParams(size=dim, distance=Distance.COSINE),
-        )
     except Exception:
-        client.recreate_collection(
-            collection_name=name,
-            vectors_config=VectorParams(size=dim, distance=Distance.COSINE),
+        return None
+    vectors = getattr(info.config.params, "vectors", None)
+    if isinstance(vectors, dict):
+        return list(vectors.values())[0].size
+    return getattr(vectors, "size", None)
+
+
+def collection_exists(name: str) -> bool:
+    # Solo colecciones reales (los alias no cuentan)
+    return any(c.name == name for c in client.get_collections().collections)
+
+
+def _ensure_collection(name: str, dim: int, profile: Optional[CollectionProfile] = None) -> None:
+    """
+    Crea la colección si no existe, con la configuración de `profile` (cuantización,
+    on_disk, HNSW; por defecto QDRANT_COLLECTION_PROFILE). Si existe con otra dimensión
+    se avisa con EmbeddingDimensionMismatch en lugar de recrearla (lo que borraba todos los datos).
+    """
+    current_dim = collection_dim(name)
+    if current_dim is None:
+        client.create_collection(collection_name=name, **create_kwargs(dim, profile or get_profile()))
+        return
+    if current_dim != dim:
+        raise EmbeddingDimensionMismatch(
+            f"La colección {name} tiene dimensión {current_dim} y se esperaba {dim}."
         )
 
+
+def apply_profile(name: str, profile: CollectionProfile) -> None:
+    """
+    Aplica `profile` a una colección existente sin recrearla; Qdrant reconstruye
+    la cuantización y el índice HNSW en segundo plano (las búsquedas siguen sirviendo).
+    """
+    client.update_collection(collection_name=name, **update_kwargs(profile))
+
+
+def alias_target(alias: str) -> Optional[str]:
+    """
+    Colección a la que apunta el alias `alias` (None si no es un alias).
+    """
+    for a in client.get_aliases().aliases:
+        if a.alias_name == alias:
+            return a.collection_name
+    return None
+
+
+def switch_alias(alias: str, collection_name: str) -> None:
+    """
+    Apunta `alias` a `collection_name` en una sola operación atómica de Qdrant:
+    las lecturas por alias pasan de una colección a otra sin ventana vacía.
+    """
+    ops = []
+    if alias_target(alias) is not None:
+        ops.append(qm.DeleteAliasOperation(delete_alias=qm.DeleteAlias(alias_name=alias)))
+    ops.append(qm.CreateAliasOperation(
+        create_alias=qm.CreateAlias(collection_name=collection_name, alias_name=alias)
+    ))
+    client.update_collection_aliases(change_aliases_operations=ops)
+
+
+def make_point_id(doc_id: str, modality: str, page: Any, ordinal: Any, content: Union[str, bytes]) -> str:
+    """
+    ID determinista de punto a partir de (doc_id, modalidad, página, ordinal, hash del contenido).
+    Reprocesar el mismo documento sobrescribe sus propios puntos en lugar de duplicarlos.
+    """
+    data = content.encode("utf-8") if isinstance(content, str) else bytes(content or b"")
+    content_hash = hashlib.sha256(data).hexdigest()
+    return str(uuid5(POINT_ID_NAMESPACE, f"{doc_id}|{modality}|{page}|{ordinal}|{content_hash}"))
+
+def make_table_id(doc_id: str, page: Any, idx: Any) -> str:
+    """
+    ID estable de una tabla (doc_id, página, índice): lo comparten todas sus filas
+    como referencia a la tabla completa, que se guarda una sola vez (CSV en MinIO).
+    """
+    return str(uuid5(POINT_ID_NAMESPACE, f"{doc_id}|table|{page}|{idx}"))
+
 # ---------- gestión de la colección ----------
 
 def ensure_text_collection() -> None:
     _ensure_collection(TEXT_COLLECTION, TEXT_DIM)
 
+def _ensure_keyword_index(name: str, field: str) -> None:
+    # Idempotente: Qdrant ignora la creación si el índice ya existe
+    client.create_payload_index(
+        collection_name=name,
+        field_name=field,
+        field_schema=PayloadSchemaType.KEYWORD,
+    )
+
 def ensure_image_collection() -> None:
     _ensure_collection(IMAGE_COLLECTION, IMAGE_DIM)
+    ensure_image_indexes(IMAGE_COLLECTION)
+
+def ensure_image_indexes(name: str) -> None:
+    _ensure_keyword_index(name, "metadata.phash")
+    _ensure_keyword_index(name, "metadata.image_path")
+
+def ensure_filter_indexes(name: str) -> None:
+    # Filtros de /rag/ask/ (doc_id, modalidad): con el payload en disco, sin
+    # índice Qdrant tendría que leerlo de disco para cada candidato
+    _ensure_keyword_index(name, "metadata.doc_id")
+    _ensure_keyword_index(name, "metadata.modality")
 
 # ---------- upsert de chunks de texto ----------
 
@@ -105,7 +207,7 @@ def add_text_chunks(chunks: list[dict], collection_name: str = TEXT_COLLECTION,
             continue
         points.append(
             PointStruct(
-                id=str(uuid4()),
+                id=c.get("id") or str(uuid4()),
                 vector=vec,
                 payload={
                     "content": c["content"],
@@ -127,7 +229,7 @@ def add_table_rows(rows: list[dict], collection_name: str = TEXT_COLLECTION, emb
             continue
         points.append(
             PointStruct(
-                id=str(uuid4()),
+                id=r.get("id") or str(uuid4()),
                 vector=vec,
                 payload={
                     "content": r["content"],
@@ -141,37 +243,221 @@ def add_table_rows(rows: list[dict], collection_name: str = TEXT_COLLECTION, emb
 
 # ---------- búsqueda texto + tablas (CLIP) ----------
 
-def _query_points(collection_name: str, query_vector, top_k: int, qfilter):
+def _query_points(collection_name: str, query_vector, top_k: int, qfilter, search_params=None):
+    # search_params: los del perfil de la colección (hnsw_ef, reescoring; ver collection_profiles)
     res = client.query_points(
         collection_name=collection_name,
         query=query_vector,
         limit=top_k,
         with_payload=True,
         query_filter=qfilter,
+        search_params=search_params,
     )
     return res.points
 
-def search_text(query_vector, top_k=5, doc_ids=None):
+def search_text(query_vector, top_k=5, doc_ids=None, collection_name=TEXT_COLLECTION, search_params=None):
     qfilter = _build_filter(doc_ids=doc_ids, modalities=["text", "table"])
-    return _query_points(TEXT_COLLECTION, query_vector, top_k, qfilter)
+    return _query_points(collection_name, query_vector, top_k, qfilter, search_params)
 
-def search_text_and_tables(query_vector, top_k=5, doc_ids=None):
-    return search_text(query_vector, top_k=top_k, doc_ids=doc_ids)
+def search_text_and_tables(query_vector, top_k=5, doc_ids=None, collection_name=TEXT_COLLECTION, search_params=None):
+    return search_text(
+        query_vector, top_k=top_k, doc_ids=doc_ids, collection_name=collection_name, search_params=search_params,
+    )
 
-def search_images(query_vector, top_k=5, doc_ids=None):
+def search_images(query_vector, top_k=5, doc_ids=None, collection_name=IMAGE_COLLECTION, search_params=None):
     qfilter = _build_filter(doc_ids=doc_ids, modalities=["image"])
-    return _query_points(IMAGE_COLLECTION, query_vector, top_k, qfilter)
+    return _query_points(collection_name, query_vector, top_k, qfilter, search_params)
+
+
+
+# ---------- deduplicado de imágenes entre documentos ----------
+
+def find_images_by_phash(phashes: Iterable[str], collection_name: str = IMAGE_COLLECTION) -> Dict[str, List[Any]]:
+    """
+    {phash: [puntos (con vector y payload)]} para los hashes perceptuales ya indexados.
+    Un único scroll por lote de imágenes. Un dHash de 64 bits colisiona (imágenes
+    casi lisas, logos a otra resolución): quien reutilice un punto debe confirmarlo
+    con `same_image`.
+    """
+    wanted = sorted({h for h in phashes if h})
+    if not wanted:
+        return {}
+
+    flt = Filter(must=[FieldCondition(key="metadata.phash", match=MatchAny(any=wanted))])
+    found: Dict[str, List[Any]] = {}
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            scroll_filter=flt,
+            limit=256,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        for p in points:
+            h = ((p.payload or {}).get("metadata") or {}).get("phash")
+            if h:
+                found.setdefault(h, []).append(p)
+        if offset is None:
+            break
+    return found
+
+
+def same_image(meta: Dict[str, Any], sha256: Optional[str], width: Any, height: Any) -> bool:
+    """
+    ¿Los metadatos de un punto de imagen corresponden a estos bytes y tamaño?
+    Los puntos anteriores sin sha256 nunca se reutilizan.
+    """
+    return (
+        bool(sha256)
+        and meta.get("sha256") == sha256
+        and meta.get("width") == width
+        and meta.get("height") == height
+    )
+
 
+def image_paths_in_use(paths: Iterable[str], exclude_doc_id: str, collection_name: str = IMAGE_COLLECTION) -> set:
+    """
+    Rutas de imagen de `paths` que siguen referenciadas por puntos de otros documentos.
+    """
+    paths = sorted(set(paths))
+    if not paths:
+        return set()
+
+    flt = Filter(
+        must=[FieldCondition(key="metadata.image_path", match=MatchAny(any=paths))],
+        must_not=[FieldCondition(key="metadata.doc_id", match=MatchAny(any=[exclude_doc_id]))],
+    )
+    used = set()
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            scroll_filter=flt,
+            limit=1024,
+            offset=offset,
+            with_payload=["metadata.image_path"],
+            with_vectors=False,
+        )
+        used.update(((p.payload or {}).get("metadata") or {}).get("image_path") for p in points)
+        if offset is None:
+            break
+    return used
 
 
 # ---------- borrado por doc_id ----------
 
-def delete_by_doc_id(doc_id: str) -> None:
+def delete_by_doc_id(doc_id: str, collections: Iterable[str] = (TEXT_COLLECTION, IMAGE_COLLECTION)) -> None:
     flt = _build_filter(doc_ids=[doc_id])
 
-    for col in (TEXT_COLLECTION, IMAGE_COLLECTION):
+    for col in collections:
         client.delete(
             collection_name=col,
             points_selector=FilterSelector(filter=flt),
         )
 
+
+def delete_stale_points(
+    doc_id: str,
+    keep_ids: Iterable[str],
+    collection_name: str = TEXT_COLLECTION,
+    page_idxs: Optional[List[int]] = None,
+    modalities: Optional[List[str]] = None,
+) -> int:
+    """
+    Borra en un único lote los puntos de `doc_id` cuyo ID no esté en `keep_ids`
+    (restos de una ingesta anterior que ya no existen tras reindexar).
+    Con `page_idxs`/`modalities` solo se consideran los puntos de esas páginas
+    (0-based) y modalidades, para reindexados incrementales.
+    """
+    keep = {str(i) for i in keep_ids}
+    flt = _build_filter(doc_ids=[doc_id], modalities=modalities, page_idxs=page_idxs)
+
+    stale = []
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            scroll_filter=flt,
+            limit=1024,
+            offset=offset,
+            with_payload=False,
+            with_vectors=False,
+        )
+        stale.extend(p.id for p in points if str(p.id) not in keep)
+        if offset is None:
+            break
+
+    if stale:
+        client.delete(
+            collection_name=collection_name,
+            points_selector=PointIdsList(points=stale),
+        )
+    return len(stale)
+
+
+# ---------- clonado de puntos entre documentos ----------
+
+def rewrite_prefix(value: Any, old: str, new: str) -> Any:
+    """
+    Cambia el prefijo `old` por `new` en todas las cadenas de `value` (dicts y listas anidados).
+    """
+    if isinstance(value, str):
+        return new + value[len(old):] if value.startswith(old) else value
+    if isinstance(value, dict):
+        return {k: rewrite_prefix(v, old, new) for k, v in value.items()}
+    if isinstance(value, list):
+        return [rewrite_prefix(v, old, new) for v in value]
+    return value
+
+
+def copy_doc_points(
+    src_doc_id: str,
+    dst_doc_id: str,
+    batch_size: int = 256,
+    collections: Iterable[str] = (TEXT_COLLECTION, IMAGE_COLLECTION),
+    rewrite_paths: bool = False,
+) -> int:
+    """
+    Copia vectores y payloads de `src_doc_id` a `dst_doc_id` sin volver a vectorizar,
+    dentro de cada colección de `collections`.
+    Los IDs nuevos se derivan del ID de origen, así que repetir la copia es idempotente.
+    Con `rewrite_paths` las rutas MinIO "{src}/..." de los metadatos pasan a "{dst}/..."
+    (el clon tiene su propia copia de los objetos).
+    """
+    flt = _build_filter(doc_ids=[src_doc_id])
+    copied = 0
+
+    for col in collections:
+        offset = None
+        while True:
+            points, offset = client.scroll(
+                collection_name=col,
+                scroll_filter=flt,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True,
+            )
+            batch = []
+            for p in points:
+                payload = dict(p.payload or {})
+                meta = payload.get("metadata") or {}
+                if rewrite_paths:
+                    meta = rewrite_prefix(meta, f"{src_doc_id}/", f"{dst_doc_id}/")
+                payload["metadata"] = {**meta, "doc_id": dst_doc_id}
+                batch.append(
+                    PointStruct(
+                        id=str(uuid5(POINT_ID_NAMESPACE, f"{dst_doc_id}|clone|{p.id}")),
+                        vector=p.vector,
+                        payload=payload,
+                    )
+                )
+            if batch:
+                client.upsert(collection_name=col, points=batch)
+                copied += len(batch)
+            if offset is None:
+                break
+
+    return copied
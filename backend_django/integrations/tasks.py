@@ -0,0 +1,20 @@
+# backend_django/integrations/tasks.py
+import logging
+from typing import Optional
+
+from celery import shared_task
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True)
+def migrate_embedding_collection(self, kind: str, model_id: str, dim: Optional[int] = None, cutover: bool = True) -> dict:
+    """
+    Cambio de modelo de embeddings en segundo plano: colección nueva, doble
+    escritura, backfill y cambio de alias (ver integrations.embedding_registry).
+    """
+    from integrations.embedding_registry import run_migration
+
+    result = run_migration(kind, model_id, dim=dim, do_cutover=cutover)
+    logger.info("[EMBED_REGISTRY] Migración terminada: %s", result)
+    return result
@@ -1,3 +1,37 @@
-from django.test import TestCase
+from uuid import UUID
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from integrations.qdrant_client import make_point_id, make_table_id
+
+
+class PointIdTests(SimpleTestCase):
+    def test_point_id_is_deterministic(self):
+        a = make_point_id("doc-1", "text", 0, 0, "hola mundo")
+        b = make_point_id("doc-1", "text", 0, 0, "hola mundo")
+        self.assertEqual(a, b)
+        UUID(a)  # Qdrant solo acepta UUID o enteros
+
+    def test_point_id_depends_on_every_part(self):
+        base = make_point_id("doc-1", "text", 0, 0, "hola mundo")
+        variants = [
+            make_point_id("doc-2", "text", 0, 0, "hola mundo"),
+            make_point_id("doc-1", "table", 0, 0, "hola mundo"),
+            make_point_id("doc-1", "text", 1, 0, "hola mundo"),
+            make_point_id("doc-1", "text", 0, 1, "hola mundo"),
+            make_point_id("doc-1", "text", 0, 0, "hola mundo!"),
+        ]
+        self.assertNotIn(base, variants)
+        self.assertEqual(len(set(variants)), len(variants))
+
+    def test_point_id_same_for_str_and_utf8_bytes(self):
+        self.assertEqual(
+            make_point_id("doc-1", "image", 2, 0, "año"),
+            make_point_id("doc-1", "image", 2, 0, "año".encode("utf-8")),
+        )
+
+    def test_table_id_is_stable_and_per_table(self):
+        self.assertEqual(make_table_id("doc-1", 3, 0), make_table_id("doc-1", 3, 0))
+        self.assertNotEqual(make_table_id("doc-1", 3, 0), make_table_id("doc-1", 3, 1))
+        self.assertNotEqual(make_table_id("doc-1", 3, 0), make_table_id("doc-1", 4, 0))
+        self.assertNotEqual(make_table_id("doc-1", 3, 0), make_point_id("doc-1", "table", 3, 0, ""))
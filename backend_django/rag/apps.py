@@ -7,4 +7,10 @@ class RagConfig(AppConfig):
     def ready(self):
         # No inicializar vectorstores aquí.
         # Se hace vía `python manage.py init_vectorstores`
-        return
\ No newline at end of file
+
+        # Precarga de modelos solo en procesos que sirven HTTP (no en migrate,
+        # shell...). Celery la hace en config/celery.py.
+        from rag.embeddings.warmup import is_server_process, start_preload
+
+        if is_server_process():
+            start_preload()
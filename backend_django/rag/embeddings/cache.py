@@ -0,0 +1,322 @@
+# rag/embeddings/cache.py
+"""
+Caché persistente de embeddings direccionada por contenido.
+
+Clave: sha256(modelo + sha256(contenido normalizado)). El mismo texto o la
+misma imagen no se vuelve a vectorizar en un reindex, un PDF duplicado o un
+texto repetido (cabeceras, pies, avisos legales), ni en preguntas repetidas.
+
+Backends (EMBED_CACHE_BACKEND):
+  - "disk":  SQLite en EMBED_CACHE_DIR (por defecto, junto a la caché de modelos)
+  - "redis": EMBED_CACHE_REDIS_URL (Redis ya está en docker-compose)
+  - "none":  desactivada
+
+Ambos desalojan por tamaño (EMBED_CACHE_MAX_MB), empezando por las entradas
+usadas hace más tiempo, y llevan contadores de aciertos/fallos. Un fallo de la
+caché nunca rompe la vectorización: se registra y se calcula el vector.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBED_CACHE_BACKEND = os.getenv("EMBED_CACHE_BACKEND", "disk").lower()
+EMBED_CACHE_DIR = os.getenv(
+    "EMBED_CACHE_DIR",
+    os.path.join(os.getenv("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "ragflow-embeddings"),
+)
+EMBED_CACHE_REDIS_URL = os.getenv("EMBED_CACHE_REDIS_URL", "redis://redis:6379/2")
+EMBED_CACHE_MAX_MB = int(os.getenv("EMBED_CACHE_MAX_MB", "512"))
+
+# Al desalojar se baja hasta este porcentaje del máximo (evita desalojar en cada escritura)
+_EVICT_TARGET = 0.9
+
+
+def content_key(model_id: str, content: str | bytes) -> str:
+    data = content.encode("utf-8") if isinstance(content, str) else bytes(content)
+    digest = hashlib.sha256(data).hexdigest()
+    return hashlib.sha256(f"{model_id}\0{digest}".encode("utf-8")).hexdigest()
+
+
+def _pack(vec: Sequence[float]) -> bytes:
+    return np.asarray(vec, dtype="<f4").tobytes()
+
+
+def _unpack(data: bytes) -> List[float]:
+    return np.frombuffer(data, dtype="<f4").tolist()
+
+
+class EmbeddingCache:
+    """
+    Interfaz común: `get_many(keys)` y `set_many({key: vector})`.
+    Los contadores son de este proceso; `stats()` añade el tamaño del backend.
+    """
+
+    backend = "none"
+
+    def __init__(self, max_bytes: int = EMBED_CACHE_MAX_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        if not keys:
+            return []
+        try:
+            found = self._get(keys)
+        except Exception:
+            logger.warning("[EMBED_CACHE] %s: lectura fallida, se calcula sin caché.", self.backend, exc_info=True)
+            self.errors += 1
+            found = {}
+        out = [_unpack(found[k]) if k in found else None for k in keys]
+        hits = sum(1 for v in out if v is not None)
+        self.hits += hits
+        self.misses += len(keys) - hits
+        return out
+
+    def set_many(self, items: Dict[str, Sequence[float]]) -> None:
+        if not items:
+            return
+        try:
+            self.evictions += self._set({k: _pack(v) for k, v in items.items()})
+            self.writes += len(items)
+        except Exception:
+            logger.warning("[EMBED_CACHE] %s: escritura fallida.", self.backend, exc_info=True)
+            self.errors += 1
+
+    def counters(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits, "misses": self.misses, "writes": self.writes,
+            "evictions": self.evictions, "errors": self.errors,
+        }
+
+    def since(self, snap: Dict[str, int]) -> Dict[str, object]:
+        """
+        Contadores desde `snap` (p. ej. los de una ingesta).
+        """
+        delta = {k: v - snap.get(k, 0) for k, v in self.counters().items()}
+        lookups = delta["hits"] + delta["misses"]
+        return {"backend": self.backend, **delta, "hit_rate": round(delta["hits"] / lookups, 3) if lookups else 0.0}
+
+    def stats(self) -> Dict[str, object]:
+        lookups = self.hits + self.misses
+        out: Dict[str, object] = {
+            "backend": self.backend,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "errors": self.errors,
+        }
+        try:
+            out.update(self._size())
+        except Exception:
+            pass
+        return out
+
+    # ---------- backend ----------
+
+    def _get(self, keys: List[str]) -> Dict[str, bytes]:
+        return {}
+
+    def _set(self, items: Dict[str, bytes]) -> int:
+        return 0
+
+    def _size(self) -> Dict[str, int]:
+        return {}
+
+
+class DiskEmbeddingCache(EmbeddingCache):
+    """
+    Un fichero SQLite (WAL): seguro entre procesos (workers del pool, Celery, web).
+    """
+
+    backend = "disk"
+
+    def __init__(self, path: Optional[str] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path or os.path.join(EMBED_CACHE_DIR, "embeddings.sqlite3")
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._local = threading.local()
+        self._approx_bytes: Optional[int] = None
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY, vec BLOB NOT NULL, size INTEGER NOT NULL, atime REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_atime ON embeddings (atime)")
+
+    def _conn(self) -> sqlite3.Connection:
+        # Una conexión por hilo y por proceso (las conexiones no sobreviven a un fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _get(self, keys: List[str]) -> Dict[str, bytes]:
+        conn = self._conn()
+        found: Dict[str, bytes] = {}
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            marks = ",".join("?" * len(chunk))
+            found.update(conn.execute(f"SELECT key, vec FROM embeddings WHERE key IN ({marks})", chunk).fetchall())
+        if found:
+            with conn:
+                conn.executemany(
+                    "UPDATE embeddings SET atime = ? WHERE key = ?",
+                    [(time.time(), k) for k in found],
+                )
+        return found
+
+    def _set(self, items: Dict[str, bytes]) -> int:
+        conn = self._conn()
+        now = time.time()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vec, size, atime) VALUES (?, ?, ?, ?)",
+                [(k, v, len(v), now) for k, v in items.items()],
+            )
+        # Estimación local del tamaño (solo se insertan fallos, así que apenas hay
+        # reemplazos); al pasar del máximo se recalcula el real antes de desalojar
+        if self._approx_bytes is None:
+            self._approx_bytes = self._size()["bytes"]
+        else:
+            self._approx_bytes += sum(len(v) for v in items.values())
+        if self._approx_bytes <= self.max_bytes:
+            return 0
+
+        evicted = 0
+        with conn:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+            excess = total - int(self.max_bytes * _EVICT_TARGET) if total > self.max_bytes else 0
+            # Desalojo LRU por tandas hasta quedar por debajo del objetivo
+            while excess > 0:
+                oldest = conn.execute("SELECT key, size FROM embeddings ORDER BY atime LIMIT 1000").fetchall()
+                if not oldest:
+                    break
+                batch = []
+                for key, size in oldest:
+                    if excess <= 0:
+                        break
+                    batch.append((key,))
+                    excess -= size
+                conn.executemany("DELETE FROM embeddings WHERE key = ?", batch)
+                evicted += len(batch)
+            self._approx_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+        return evicted
+
+    def _size(self) -> Dict[str, int]:
+        entries, size = self._conn().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM embeddings").fetchone()
+        return {"entries": int(entries), "bytes": int(size)}
+
+
+class RedisEmbeddingCache(EmbeddingCache):
+    """
+    Vectores en `emb:<key>`; un ZSET con la última lectura de cada clave y un
+    contador de bytes permiten desalojar por tamaño (LRU) entre procesos.
+    """
+
+    backend = "redis"
+    PREFIX = "emb:"
+    LRU = "emb:_lru"
+    BYTES = "emb:_bytes"
+
+    def __init__(self, url: Optional[str] = None, **kwargs):
+        super().__init__(**kwargs)
+        import redis
+
+        self.client = redis.Redis.from_url(url or EMBED_CACHE_REDIS_URL)
+
+    def _get(self, keys: List[str]) -> Dict[str, bytes]:
+        values = self.client.mget([self.PREFIX + k for k in keys])
+        found = {k: v for k, v in zip(keys, values) if v is not None}
+        if found:
+            now = time.time()
+            self.client.zadd(self.LRU, {k: now for k in found})
+        return found
+
+    def _set(self, items: Dict[str, bytes]) -> int:
+        now = time.time()
+        pipe = self.client.pipeline()
+        for k, v in items.items():
+            pipe.set(self.PREFIX + k, v)
+        pipe.zadd(self.LRU, {k: now for k in items})
+        # Aproximado si se reescribe una clave existente; el desalojo lo corrige a la larga
+        pipe.incrby(self.BYTES, sum(len(v) for v in items.values()))
+        total = pipe.execute()[-1]
+        if total <= self.max_bytes:
+            return 0
+
+        evicted = 0
+        excess = total - int(self.max_bytes * _EVICT_TARGET)
+        while excess > 0:
+            oldest = self.client.zpopmin(self.LRU, 256)
+            if not oldest:
+                break
+            names = [self.PREFIX + k.decode() for k, _ in oldest]
+            sizes = self.client.pipeline()
+            for name in names:
+                sizes.strlen(name)
+            freed = sum(sizes.execute())
+            self.client.delete(*names)
+            self.client.decrby(self.BYTES, freed)
+            excess -= freed
+            evicted += len(names)
+        return evicted
+
+    def _size(self) -> Dict[str, int]:
+        return {"entries": int(self.client.zcard(self.LRU)), "bytes": int(self.client.get(self.BYTES) or 0)}
+
+
+@lru_cache(maxsize=1)
+def get_embedding_cache() -> EmbeddingCache:
+    try:
+        if EMBED_CACHE_BACKEND == "disk":
+            return DiskEmbeddingCache()
+        if EMBED_CACHE_BACKEND == "redis":
+            return RedisEmbeddingCache()
+    except Exception:
+        logger.warning("[EMBED_CACHE] No se pudo abrir el backend %s; caché desactivada.", EMBED_CACHE_BACKEND, exc_info=True)
+    return EmbeddingCache()
+
+
+def cached_embed(model_id: str, items: list, contents: list, embed_fn) -> list:
+    """
+    Vectoriza `items` con `embed_fn`, pero solo los que no están en caché.
+    `contents[i]` es el contenido normalizado de `items[i]` (define la clave).
+    Los resultados None (entrada no válida) no se guardan.
+    """
+    if not items:
+        return []
+    cache = get_embedding_cache()
+    keys = [content_key(model_id, c) for c in contents]
+    out = cache.get_many(keys)
+
+    # Misma clave repetida en el lote: se calcula una vez
+    missing: Dict[str, int] = {}
+    for i, (key, vec) in enumerate(zip(keys, out)):
+        if vec is None and key not in missing:
+            missing[key] = i
+    if missing:
+        vecs = embed_fn([items[i] for i in missing.values()])
+        fresh = {key: vec for key, vec in zip(missing, vecs)}
+        cache.set_many({k: v for k, v in fresh.items() if v is not None})
+        out = [fresh.get(k) if v is None else v for k, v in zip(keys, out)]
+    return out
@@ -0,0 +1,202 @@
+# rag/embeddings/client.py
+"""
+Cliente del servidor de embeddings (`python manage.py embed_server`).
+
+EMBED_MODE:
+  - "local" (por defecto): cada proceso carga sus modelos, como siempre.
+  - "server": los vectores se piden al servidor compartido en
+    EMBED_SERVER_ADDRESS ("host:puerto" o ruta de socket Unix). Si no responde
+    y EMBED_SERVER_FALLBACK=true, se calcula en local.
+
+`embed_text`, `embed_texts`, `embed_image` y `embed_images` no cambian: solo
+el paso final (los fallos de la caché) se resuelve aquí o en el proceso.
+
+Protocolo: multiprocessing.connection solo para el transporte y la
+autenticación HMAC con EMBED_SERVER_AUTHKEY (obligatoria, sin valor por
+defecto). Los mensajes son JSON (send_bytes/recv_bytes, nunca pickle):
+  petición:  {"kind": "text" | "image" | "ping", "items": [...]}
+             (imágenes en base64)
+  respuesta: {"ok": true, "dim": d, "vectors": base64(float32), "missing": [i, ...]}
+             | {"ok": false, "error": str}
+"""
+from __future__ import annotations
+
+import base64
+import json
+import logging
+import os
+import threading
+from multiprocessing.connection import Client, Connection
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBED_MODE = os.getenv("EMBED_MODE", "local").lower()
+EMBED_SERVER_ADDRESS = os.getenv("EMBED_SERVER_ADDRESS", "localhost:6010")
+EMBED_SERVER_AUTHKEY = os.getenv("EMBED_SERVER_AUTHKEY", "").encode("utf-8")
+EMBED_SERVER_FALLBACK = os.getenv("EMBED_SERVER_FALLBACK", "true").lower() == "true"
+# Tamaño máximo de un mensaje (lotes de imágenes en base64)
+EMBED_SERVER_MAX_MESSAGE = int(os.getenv("EMBED_SERVER_MAX_MESSAGE", str(256 * 1024 * 1024)))
+
+MIN_AUTHKEY_BYTES = 16
+
+
+def parse_address(address: str) -> Union[str, Tuple[str, int]]:
+    """
+    "host:puerto" -> (host, puerto) TCP; cualquier otra cosa es un socket Unix.
+    """
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and "/" not in address:
+        return host or "localhost", int(port)
+    return address
+
+
+class EmbeddingServerError(RuntimeError):
+    pass
+
+
+def check_authkey(authkey: bytes) -> bytes:
+    """
+    La clave autentica cada conexión (HMAC); sin ella cualquiera que alcance el
+    puerto podría usar el servidor. No hay clave por defecto.
+    """
+    if len(authkey or b"") < MIN_AUTHKEY_BYTES:
+        raise EmbeddingServerError(
+            f"EMBED_SERVER_AUTHKEY no definida o demasiado corta (mínimo {MIN_AUTHKEY_BYTES} caracteres); "
+            "generar una con: python -c 'import secrets; print(secrets.token_urlsafe(32))'"
+        )
+    return authkey
+
+
+# ---------- formato de los mensajes (JSON) ----------
+
+def send_message(conn: Connection, message: Dict[str, Any]) -> None:
+    conn.send_bytes(json.dumps(message, separators=(",", ":")).encode("utf-8"))
+
+
+def recv_message(conn: Connection) -> Dict[str, Any]:
+    message = json.loads(conn.recv_bytes(maxlength=EMBED_SERVER_MAX_MESSAGE))
+    if not isinstance(message, dict):
+        raise EmbeddingServerError("mensaje con formato inválido")
+    return message
+
+
+def encode_items(kind: str, items: List[Any]) -> List[str]:
+    if kind == "image":
+        return [base64.b64encode(bytes(it)).decode("ascii") for it in items]
+    return [str(it) for it in items]
+
+
+def decode_items(kind: str, items: Any) -> List[Any]:
+    if not isinstance(items, list) or not all(isinstance(it, str) for it in items):
+        raise EmbeddingServerError("items debe ser una lista de cadenas")
+    if kind == "image":
+        return [base64.b64decode(it, validate=True) for it in items]
+    return items
+
+
+def encode_vectors(vectors: List[Optional[List[float]]]) -> Dict[str, Any]:
+    # float32 contiguo en base64: ~4x más compacto que una lista JSON de floats
+    present = [v for v in vectors if v is not None]
+    dim = len(present[0]) if present else 0
+    arr = np.asarray(present, dtype="<f4").reshape(len(present), dim)
+    return {
+        "dim": dim,
+        "vectors": base64.b64encode(arr.tobytes()).decode("ascii"),
+        "missing": [i for i, v in enumerate(vectors) if v is None],
+    }
+
+
+def decode_vectors(response: Dict[str, Any], count: int) -> List[Optional[List[float]]]:
+    dim = int(response.get("dim") or 0)
+    missing = set(response.get("missing") or [])
+    arr = np.frombuffer(base64.b64decode(response.get("vectors") or ""), dtype="<f4")
+    rows = arr.reshape(-1, dim).tolist() if dim else []
+    if len(rows) + len(missing) != count:
+        raise EmbeddingServerError(f"respuesta con {len(rows)} vectores para {count} entradas")
+    it = iter(rows)
+    return [None if i in missing else next(it) for i in range(count)]
+
+
+class EmbeddingClient:
+    """
+    Una conexión por hilo (runserver/gunicorn con hilos) y por proceso.
+    """
+
+    def __init__(self, address: str = EMBED_SERVER_ADDRESS, authkey: bytes = EMBED_SERVER_AUTHKEY):
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self._local = threading.local()
+
+    def _conn(self) -> Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = Client(self.address, authkey=check_authkey(self.authkey))
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _drop(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def embed(self, kind: str, items: List[Any]) -> List[Optional[List[float]]]:
+        request = {"kind": kind, "items": encode_items(kind, items)}
+        # Un reintento con conexión nueva (el servidor puede haberse reiniciado)
+        for attempt in (1, 2):
+            try:
+                conn = self._conn()
+                send_message(conn, request)
+                response = recv_message(conn)
+                break
+            except (OSError, EOFError):
+                self._drop()
+                if attempt == 2:
+                    raise
+        if not response.get("ok"):
+            raise EmbeddingServerError(response.get("error") or "error desconocido")
+        return decode_vectors(response, len(items))
+
+    def ping(self) -> dict:
+        conn = self._conn()
+        send_message(conn, {"kind": "ping"})
+        return recv_message(conn)
+
+
+_client: Optional[EmbeddingClient] = None
+_client_lock = threading.Lock()
+
+
+def get_embedding_client() -> EmbeddingClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = EmbeddingClient()
+        return _client
+
+
+def use_server() -> bool:
+    return EMBED_MODE == "server"
+
+
+def remote_or_local(kind: str, items: List[Any], local_fn) -> List[Optional[List[float]]]:
+    """
+    En modo servidor pide los vectores al servidor; si falla y hay fallback,
+    o en modo local, usa `local_fn(items)`.
+    """
+    if not items:
+        return []
+    if use_server():
+        try:
+            return get_embedding_client().embed(kind, items)
+        except Exception:
+            if not EMBED_SERVER_FALLBACK:
+                raise
+            logger.warning("[EMBED_SERVER] %s no disponible; se vectoriza en local.", EMBED_SERVER_ADDRESS, exc_info=True)
+    return local_fn(items)
@@ -1,25 +1,112 @@
 # rag/embeddings/image_embeddings.py
 from __future__ import annotations
 
+import logging
+import os
 from functools import lru_cache
 from io import BytesIO
 from PIL import Image
 from sentence_transformers import SentenceTransformer
 
+from rag.embeddings.cache import cached_embed
+from rag.embeddings.client import remote_or_local
+from rag.embeddings import onnx_backend
+from rag.embeddings.pool import pool_or_local
 
-@lru_cache(maxsize=1)
-def get_clip_model() -> SentenceTransformer:
-    m = SentenceTransformer("clip-ViT-B-16")
+# Modelo por defecto (el de cada colección está en integrations.embedding_registry)
+CLIP_MODEL_NAME = os.getenv("CLIP_MODEL_NAME", "clip-ViT-B-16")
+
+# Imágenes por forward pass de CLIP (decodificación incluida)
+IMAGE_EMBED_BATCH = int(os.getenv("IMAGE_EMBED_BATCH", "16"))
+
+
+@lru_cache(maxsize=2)
+def _load_clip_model(model_name: str) -> SentenceTransformer | onnx_backend.OnnxClipImageEncoder:
+    # EMBED_BACKEND=onnx: torre de visión int8 en ONNX Runtime (misma interfaz encode)
+    if onnx_backend.use_onnx("image", model_name):
+        return onnx_backend.load_clip_model(model_name)
+    if onnx_backend.EMBED_BACKEND == "onnx":
+        logging.getLogger(__name__).warning(
+            "[ONNX] %s no exportado; se usa PyTorch (python manage.py export_onnx).", model_name
+        )
+    m = SentenceTransformer(model_name)
     # CLIP hard limit para texto; para imágenes no molesta
     m.max_seq_length = 77
     return m
 
-def embed_image(image_bytes: bytes) -> list[float] | None:
+
+def get_clip_model(model_name: str | None = None) -> SentenceTransformer | onnx_backend.OnnxClipImageEncoder:
+    # Hasta 2 modelos cargados: el actual y el nuevo durante una migración de colección
+    return _load_clip_model(model_name or CLIP_MODEL_NAME)
+
+
+def _decode(image_bytes: bytes) -> Image.Image | None:
     try:
-        img = Image.open(BytesIO(image_bytes)).convert("RGB")
+        return Image.open(BytesIO(image_bytes)).convert("RGB")
     except Exception:
         return None
 
-    model = get_clip_model()
-    vec = model.encode(img)
-    return vec.tolist()
+
+def embed_image(image_bytes: bytes, model_name: str | None = None) -> list[float] | None:
+    if not isinstance(image_bytes, (bytes, bytearray)):
+        return None
+    return embed_images([image_bytes], model_name=model_name)[0]
+
+
+def embed_images(
+    images: list[bytes],
+    batch_size: int | None = None,
+    parallel: bool = False,
+    model_name: str | None = None,
+) -> list[list[float] | None]:
+    """
+    Embeddings CLIP por lotes: decodifica y codifica `batch_size` imágenes a la vez.
+    Devuelve una lista alineada con la entrada (None si la imagen no se puede usar).
+    Las imágenes ya vistas (mismos bytes) salen de la caché de embeddings.
+    Con `parallel` (ingesta), el lote se reparte entre las réplicas del pool.
+    Con un `model_name` distinto del de por defecto (migración de colección) se
+    vectoriza en este proceso: el servidor y el pool solo sirven el de por defecto.
+    """
+    model_name = model_name or CLIP_MODEL_NAME
+
+    def local(m):
+        if parallel:
+            return pool_or_local("image", m, lambda shard: _encode_images(shard, batch_size))
+        return _encode_images(m, batch_size)
+
+    if model_name == CLIP_MODEL_NAME:
+        encode = lambda missing: remote_or_local("image", missing, local)  # noqa: E731
+    else:
+        encode = lambda missing: _encode_images(missing, batch_size, model_name)  # noqa: E731
+
+    return cached_embed(onnx_backend.cache_model_id("image", model_name), images, images, encode)
+
+
+def _encode_images(
+    images: list[bytes], batch_size: int | None = None, model_name: str | None = None,
+) -> list[list[float] | None]:
+    batch_size = max(1, batch_size or IMAGE_EMBED_BATCH)
+    model = get_clip_model(model_name)
+    out: list[list[float] | None] = [None] * len(images)
+
+    for start in range(0, len(images), batch_size):
+        decoded = [(i, _decode(raw)) for i, raw in enumerate(images[start:start + batch_size], start)]
+        valid = [(i, img) for i, img in decoded if img is not None]
+        if not valid:
+            continue
+
+        try:
+            vecs = model.encode([img for _, img in valid], batch_size=len(valid))
+        except Exception:
+            # Un lote corrupto no debe tumbar al resto: se reintenta una a una
+            vecs = []
+            for _, img in valid:
+                try:
+                    vecs.append(model.encode(img))
+                except Exception:
+                    vecs.append(None)
+
+        for (i, _), vec in zip(valid, vecs):
+            out[i] = vec.tolist() if vec is not None else None
+
+    return out
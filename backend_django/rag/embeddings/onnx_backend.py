@@ -0,0 +1,209 @@
+# rag/embeddings/onnx_backend.py
+"""
+Backend ONNX Runtime (int8) para MiniLM y CLIP en CPU.
+
+EMBED_BACKEND:
+  - "torch" (por defecto): SentenceTransformer sobre PyTorch, como siempre.
+  - "onnx": modelos exportados y cuantizados a int8 (cuantización dinámica)
+    con `python manage.py export_onnx`, ejecutados con ONNX Runtime.
+
+MiniLM usa el backend ONNX de sentence-transformers (mismo objeto, mismo
+tokenizer: el chunker no cambia). De CLIP solo se exporta la torre de visión
+con su proyección: el repo únicamente vectoriza imágenes con CLIP.
+
+Si EMBED_BACKEND=onnx pero falta la exportación, se avisa y se usa PyTorch.
+Los vectores int8 no son idénticos a los de PyTorch, así que la caché de
+embeddings los guarda con otro id de modelo (`cache_model_id`). La paridad y
+el rendimiento se miden con `python manage.py bench_onnx`.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import re
+import shutil
+from typing import Any, List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch").lower()
+ONNX_MODEL_DIR = os.getenv(
+    "ONNX_MODEL_DIR",
+    os.path.join(os.getenv("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "ragflow-onnx"),
+)
+# Kernels de la cuantización del texto: "avx2" (cualquier x86 moderno), "avx512", "avx512_vnni", "arm64"
+ONNX_QUANT_CONFIG = os.getenv("ONNX_QUANT_CONFIG", "avx2")
+# Hilos intra-op de ONNX Runtime (0 = los que decida ORT)
+ONNX_NUM_THREADS = int(os.getenv("ONNX_NUM_THREADS", "0"))
+
+ONNX_OPSET = 17
+# Coseno mínimo frente a PyTorch (bench_onnx y rag.tests.OnnxParityTests)
+PARITY_MIN_COSINE = {"text": 0.99, "image": 0.97}
+CLIP_ONNX_FILE = "vision_qint8.onnx"
+
+
+def _model_dir(kind: str, model_name: str) -> str:
+    return os.path.join(ONNX_MODEL_DIR, kind, re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name))
+
+
+def _text_file_name() -> str:
+    return f"onnx/model_qint8_{ONNX_QUANT_CONFIG}.onnx"
+
+
+def text_model_path(model_name: str) -> str:
+    return _model_dir("text", model_name)
+
+
+def clip_model_path(model_name: str) -> str:
+    return _model_dir("clip", model_name)
+
+
+def text_exported(model_name: str) -> bool:
+    return os.path.isfile(os.path.join(text_model_path(model_name), _text_file_name()))
+
+
+def clip_exported(model_name: str) -> bool:
+    return os.path.isfile(os.path.join(clip_model_path(model_name), CLIP_ONNX_FILE))
+
+
+def use_onnx(kind: str, model_name: str) -> bool:
+    """
+    True si EMBED_BACKEND=onnx y el modelo `kind` ("text" | "image") está exportado.
+    """
+    if EMBED_BACKEND != "onnx":
+        return False
+    return text_exported(model_name) if kind == "text" else clip_exported(model_name)
+
+
+def cache_model_id(kind: str, model_name: str) -> str:
+    # Vectores int8 ≈ vectores fp32, pero no iguales: claves de caché separadas
+    return f"{model_name}#onnx-int8" if use_onnx(kind, model_name) else model_name
+
+
+def _session_options():
+    import onnxruntime as ort
+
+    opts = ort.SessionOptions()
+    opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if ONNX_NUM_THREADS > 0:
+        opts.intra_op_num_threads = ONNX_NUM_THREADS
+    return opts
+
+
+# ---------- texto (MiniLM) ----------
+
+def load_text_model(model_name: str):
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(
+        text_model_path(model_name),
+        backend="onnx",
+        model_kwargs={"file_name": _text_file_name(), "provider": "CPUExecutionProvider"},
+    )
+
+
+def export_text_model(model_name: str, force: bool = False) -> str:
+    """
+    Exporta MiniLM a ONNX (fp32) y genera la variante int8 con ONNX_QUANT_CONFIG.
+    """
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    path = text_model_path(model_name)
+    if text_exported(model_name) and not force:
+        return path
+    if force:
+        shutil.rmtree(path, ignore_errors=True)
+
+    model = SentenceTransformer(model_name, backend="onnx")
+    model.save(path)
+    export_dynamic_quantized_onnx_model(
+        model, ONNX_QUANT_CONFIG, path, file_suffix=f"qint8_{ONNX_QUANT_CONFIG}",
+    )
+    logger.info("[ONNX] %s exportado en %s", model_name, path)
+    return path
+
+
+# ---------- imagen (CLIP) ----------
+
+class OnnxClipImageEncoder:
+    """
+    Sustituto de SentenceTransformer(CLIP) para imágenes: mismo preprocesado
+    (CLIPImageProcessor) y mismo vector (get_image_features, sin normalizar).
+    """
+
+    def __init__(self, model_name: str):
+        import onnxruntime as ort
+        from transformers import CLIPImageProcessor
+
+        path = clip_model_path(model_name)
+        self.processor = CLIPImageProcessor.from_pretrained(path)
+        self.session = ort.InferenceSession(
+            os.path.join(path, CLIP_ONNX_FILE), _session_options(), providers=["CPUExecutionProvider"],
+        )
+        self.max_seq_length = 77
+
+    def encode(self, images: Any, batch_size: int = 32, **kwargs) -> np.ndarray:
+        single = not isinstance(images, list)
+        batch: List[Any] = [images] if single else images
+        if not batch:
+            return np.zeros((0, 0), dtype="float32")
+
+        out = []
+        for start in range(0, len(batch), max(1, batch_size)):
+            pixels = self.processor(images=batch[start:start + batch_size], return_tensors="np")["pixel_values"]
+            out.append(self.session.run(None, {"pixel_values": pixels.astype("float32")})[0])
+        vecs = np.concatenate(out)
+        return vecs[0] if single else vecs
+
+
+def load_clip_model(model_name: str) -> OnnxClipImageEncoder:
+    return OnnxClipImageEncoder(model_name)
+
+
+def export_clip_model(model_name: str, force: bool = False) -> str:
+    """
+    Exporta la torre de visión de CLIP (+ proyección) a ONNX y la cuantiza a int8.
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    path = clip_model_path(model_name)
+    if clip_exported(model_name) and not force:
+        return path
+    os.makedirs(path, exist_ok=True)
+
+    st_clip = SentenceTransformer(model_name, device="cpu")[0]
+    clip = st_clip.model.eval()
+    st_clip.processor.image_processor.save_pretrained(path)
+
+    class _Vision(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.clip = clip
+
+        def forward(self, pixel_values):
+            return self.clip.get_image_features(pixel_values=pixel_values)
+
+    size = st_clip.processor.image_processor.crop_size
+    dummy = torch.zeros(1, 3, size["height"], size["width"])
+    fp32 = os.path.join(path, "vision.onnx")
+    export_kwargs = dict(
+        input_names=["pixel_values"],
+        output_names=["image_embeds"],
+        dynamic_axes={"pixel_values": {0: "batch"}, "image_embeds": {0: "batch"}},
+        opset_version=ONNX_OPSET,
+    )
+    with torch.no_grad():
+        try:
+            # torch >= 2.5: exportador clásico (TorchScript), el dinámico no hace falta aquí
+            torch.onnx.export(_Vision(), (dummy,), fp32, dynamo=False, **export_kwargs)
+        except TypeError:
+            torch.onnx.export(_Vision(), (dummy,), fp32, **export_kwargs)
+
+    quantize_dynamic(fp32, os.path.join(path, CLIP_ONNX_FILE), weight_type=QuantType.QInt8)
+    os.remove(fp32)
+    logger.info("[ONNX] %s exportado en %s", model_name, path)
+    return path
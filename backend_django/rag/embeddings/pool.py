@@ -0,0 +1,147 @@
+# rag/embeddings/pool.py
+"""
+Pool persistente de procesos con réplicas de los modelos, para la ingesta.
+
+`model.encode` en un solo proceso deja ociosos el resto de núcleos del worker
+con documentos grandes. Con EMBED_POOL_WORKERS > 1, los lotes de la ingesta
+(solo los fallos de la caché) se parten en shards de EMBED_POOL_SHARD
+entradas, cada proceso del pool los vectoriza con su propia réplica del
+modelo y los vectores se devuelven en el orden de entrada.
+
+El pool se crea en la primera llamada y se mantiene vivo en el proceso (un
+worker Celery lo reutiliza entre tareas): cada réplica carga el modelo una
+sola vez. Cada réplica usa cpu_count / workers hilos para no sobresuscribir
+la CPU.
+
+EMBED_POOL_MODELS indica qué modelos usan el pool ("text" por defecto; CLIP
+ocupa bastante más memoria por réplica). Las consultas (/rag/ask/) nunca lo
+usan: un lote de 1 no gana nada.
+"""
+from __future__ import annotations
+
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+EMBED_POOL_WORKERS = int(os.getenv("EMBED_POOL_WORKERS", "0"))
+EMBED_POOL_SHARD = int(os.getenv("EMBED_POOL_SHARD", "64"))
+EMBED_POOL_MODELS = [m.strip() for m in os.getenv("EMBED_POOL_MODELS", "text").lower().split(",") if m.strip()]
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_pool_broken = False
+
+
+def _threads_per_worker(workers: int) -> int:
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def _init_worker(models: List[str], threads: int) -> None:
+    # Antes de importar torch/onnxruntime: cada réplica con su parte de los núcleos
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ.setdefault("ONNX_NUM_THREADS", str(threads))
+    try:
+        import torch
+
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    if "text" in models:
+        from rag.embeddings.text_embeddings import get_text_embedding_model
+
+        get_text_embedding_model()
+    if "image" in models:
+        from rag.embeddings.image_embeddings import get_clip_model
+
+        get_clip_model()
+
+
+def _encode_shard(kind: str, items: List[Any]) -> List[Any]:
+    # Siempre en local: el pool es el dueño de sus réplicas
+    if kind == "text":
+        from rag.embeddings.text_embeddings import _encode_local
+
+        return _encode_local(items)
+    from rag.embeddings.image_embeddings import _encode_images
+
+    return _encode_images(items)
+
+
+def pool_enabled(kind: str) -> bool:
+    if EMBED_POOL_WORKERS <= 1 or kind not in EMBED_POOL_MODELS or _pool_broken:
+        return False
+    # Los hijos del pool prefork de Celery son daemon y no pueden crear procesos
+    return not multiprocessing.current_process().daemon
+
+
+def pool_batch_size(kind: str, default: int) -> int:
+    """
+    Tamaño de lote para quien alimenta el pool (la ingesta): al menos un shard por worker.
+    """
+    if not pool_enabled(kind):
+        return default
+    return max(default, EMBED_POOL_SHARD * EMBED_POOL_WORKERS)
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            threads = _threads_per_worker(EMBED_POOL_WORKERS)
+            logger.info(
+                "[EMBED_POOL] Arrancando %d réplicas (%s, %d hilos cada una)",
+                EMBED_POOL_WORKERS, ",".join(EMBED_POOL_MODELS), threads,
+            )
+            _pool = ProcessPoolExecutor(
+                max_workers=EMBED_POOL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(EMBED_POOL_MODELS, threads),
+            )
+        return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+atexit.register(shutdown_pool)
+
+
+def shard(items: List[Any], size: int) -> List[List[Any]]:
+    size = max(1, size)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def pool_or_local(kind: str, items: List[Any], local_fn: Callable[[List[Any]], List[Any]]) -> List[Any]:
+    """
+    Vectoriza `items` repartiendo shards entre las réplicas del pool (en orden
+    de entrada). Con una sola shard, o sin pool, usa `local_fn` en este proceso.
+    Si el pool se rompe (p. ej. una réplica muere por memoria), se desactiva
+    y se sigue en local.
+    """
+    global _pool_broken
+    shards = shard(items, EMBED_POOL_SHARD)
+    if len(shards) < 2 or not pool_enabled(kind):
+        return local_fn(items)
+
+    try:
+        futures = [get_pool().submit(_encode_shard, kind, s) for s in shards]
+        return [vec for f in futures for vec in f.result()]
+    except (BrokenProcessPool, OSError):
+        logger.warning("[EMBED_POOL] Pool no disponible; se vectoriza en este proceso.", exc_info=True)
+        _pool_broken = True
+        shutdown_pool()
+        return local_fn(items)
@@ -0,0 +1,72 @@
+# rag/embeddings/query_cache.py
+"""
+LRU en memoria (por proceso) para los vectores de las preguntas.
+
+Muchas preguntas se repiten (prompts sugeridos, reintentos): antes de ir al
+modelo o a la caché persistente se mira aquí. La clave es la pregunta con
+los espacios colapsados (sin pasar a minúsculas: el modelo activo puede
+distinguir mayúsculas) y lo que se vectoriza es esa misma cadena, así que
+clave y vector siempre corresponden.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Tuple
+
+QUERY_EMBED_CACHE_SIZE = int(os.getenv("QUERY_EMBED_CACHE_SIZE", "1024"))
+
+
+def normalize_question(text: str) -> str:
+    return " ".join(str(text or "").split())
+
+
+class QueryVectorCache:
+    def __init__(self, maxsize: int = QUERY_EMBED_CACHE_SIZE):
+        self.maxsize = max(0, maxsize)
+        self._data: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.miss_ms = 0.0  # tiempo total de los fallos: su media es lo que ahorra un acierto
+
+    def embed(self, model_id: str, text: str, embed_fn: Callable[[str], List[float]]) -> Tuple[List[float], Dict[str, float]]:
+        """
+        Devuelve (vector, métricas de esta llamada para `timings`).
+        """
+        text = normalize_question(text)
+        key = (model_id, text)
+        with self._lock:
+            vec = self._data.get(key)
+            if vec is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return vec, self._metrics(hit=True)
+
+        t0 = time.perf_counter()
+        vec = embed_fn(text)
+        elapsed = (time.perf_counter() - t0) * 1000
+
+        with self._lock:
+            self.misses += 1
+            self.miss_ms += elapsed
+            if self.maxsize:
+                self._data[key] = vec
+                self._data.move_to_end(key)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+            return vec, self._metrics(hit=False)
+
+    def _metrics(self, hit: bool) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        avg_miss_ms = self.miss_ms / self.misses if self.misses else 0.0
+        return {
+            "query_cache_hit": int(hit),
+            "query_cache_saved_ms": int(round(avg_miss_ms)) if hit else 0,
+            "query_cache_hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+query_vector_cache = QueryVectorCache()
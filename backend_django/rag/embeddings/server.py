@@ -0,0 +1,177 @@
+# rag/embeddings/server.py
+"""
+Servidor de embeddings compartido: un solo proceso carga MiniLM y CLIP y
+atiende a todos los workers web y Celery (EMBED_MODE=server).
+
+Micro-batching dinámico: las peticiones concurrentes de un mismo tipo se
+juntan en un lote hasta EMBED_SERVER_MAX_BATCH entradas o hasta que la más
+antigua lleva EMBED_SERVER_MAX_WAIT_MS esperando, y se resuelven con un único
+forward pass. Texto e imagen tienen colas y hilos independientes.
+
+Protocolo: mensajes JSON sobre multiprocessing.connection (ver
+rag.embeddings.client); nunca se deserializa pickle. No arranca sin una
+EMBED_SERVER_AUTHKEY propia y por defecto solo escucha en 127.0.0.1: en
+docker-compose escucha en la red interna, sin publicar el puerto.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from multiprocessing.connection import Connection, Listener
+from typing import Any, Callable, Dict, List, Optional
+
+from rag.embeddings.client import (
+    EMBED_SERVER_AUTHKEY,
+    EmbeddingServerError,
+    check_authkey,
+    decode_items,
+    encode_vectors,
+    parse_address,
+    recv_message,
+    send_message,
+)
+
+logger = logging.getLogger(__name__)
+
+EMBED_SERVER_BIND = os.getenv("EMBED_SERVER_BIND", "127.0.0.1:6010")
+EMBED_SERVER_MAX_BATCH = int(os.getenv("EMBED_SERVER_MAX_BATCH", "64"))
+EMBED_SERVER_MAX_WAIT_MS = float(os.getenv("EMBED_SERVER_MAX_WAIT_MS", "5"))
+
+
+@dataclass
+class _Pending:
+    items: List[Any]
+    done: threading.Event = field(default_factory=threading.Event)
+    vectors: Optional[List[Any]] = None
+    error: Optional[str] = None
+
+
+class MicroBatcher:
+    """
+    Cola + hilo que agrupa peticiones y llama a `encode_fn(items)` una vez por lote.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        encode_fn: Callable[[List[Any]], List[Any]],
+        max_batch: int = EMBED_SERVER_MAX_BATCH,
+        max_wait_ms: float = EMBED_SERVER_MAX_WAIT_MS,
+    ):
+        self.name = name
+        self.encode_fn = encode_fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue: "queue.Queue[_Pending]" = queue.Queue()
+        self.requests = 0
+        self.batches = 0
+        self.items = 0
+        threading.Thread(target=self._run, name=f"embed-{name}", daemon=True).start()
+
+    def submit(self, items: List[Any]) -> List[Any]:
+        pending = _Pending(items)
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise RuntimeError(pending.error)
+        return pending.vectors
+
+    def _collect(self) -> List[_Pending]:
+        batch = [self._queue.get()]
+        size = len(batch[0].items)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                nxt = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(nxt)
+            size += len(nxt.items)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            items = [it for p in batch for it in p.items]
+            try:
+                vectors = self.encode_fn(items)
+                pos = 0
+                for p in batch:
+                    p.vectors = vectors[pos:pos + len(p.items)]
+                    pos += len(p.items)
+            except Exception as e:
+                logger.exception("[EMBED_SERVER] Lote %s fallido (%d entradas).", self.name, len(items))
+                for p in batch:
+                    p.error = f"{type(e).__name__}: {e}"
+            self.requests += len(batch)
+            self.batches += 1
+            self.items += len(items)
+            for p in batch:
+                p.done.set()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch": round(self.items / self.batches, 1) if self.batches else 0.0,
+        }
+
+
+class EmbeddingServer:
+    def __init__(self, bind: str = EMBED_SERVER_BIND, authkey: bytes = EMBED_SERVER_AUTHKEY):
+        # Siempre en local: este proceso es el dueño de los modelos
+        from rag.embeddings.image_embeddings import _encode_images
+        from rag.embeddings.text_embeddings import _encode_local
+
+        self.address = parse_address(bind)
+        self.authkey = check_authkey(authkey)
+        self.batchers = {
+            "text": MicroBatcher("text", _encode_local),
+            "image": MicroBatcher("image", _encode_images),
+        }
+
+    def serve_forever(self) -> None:
+        with Listener(self.address, authkey=self.authkey) as listener:
+            logger.info("[EMBED_SERVER] Escuchando en %s", self.address)
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception:
+                    # Cliente con authkey incorrecta o que corta el handshake
+                    logger.warning("[EMBED_SERVER] Conexión rechazada.", exc_info=True)
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn: Connection) -> None:
+        with conn:
+            while True:
+                try:
+                    request = recv_message(conn)
+                except (EOFError, OSError):
+                    return
+                except (ValueError, EmbeddingServerError) as e:
+                    # JSON inválido o mensaje demasiado grande: se corta la conexión
+                    logger.warning("[EMBED_SERVER] Mensaje rechazado: %s", e)
+                    return
+                send_message(conn, self._dispatch(request))
+
+    def _dispatch(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        kind = request.get("kind")
+        if kind == "ping":
+            return {"ok": True, "stats": {k: b.stats() for k, b in self.batchers.items()}}
+        batcher = self.batchers.get(kind)
+        if batcher is None:
+            return {"ok": False, "error": f"tipo desconocido: {kind}"}
+        try:
+            items = decode_items(kind, request.get("items") or [])
+            return {"ok": True, **encode_vectors(batcher.submit(items))}
+        except Exception as e:
+            return {"ok": False, "error": str(e)}
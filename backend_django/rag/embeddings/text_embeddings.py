@@ -1,26 +1,100 @@
 # backend_django\rag\embeddings\text_embeddings.py
 
+import json
+import logging
+import os
 from functools import lru_cache
 from sentence_transformers import SentenceTransformer
 
+from rag.embeddings.cache import cached_embed
+from rag.embeddings.client import remote_or_local
+from rag.embeddings import onnx_backend
+from rag.embeddings.pool import pool_or_local
 
-@lru_cache(maxsize=1)
-def get_text_embedding_model():
-    # Ligero, rápido, 384 dims
-    return SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+# Ligero, rápido, 384 dims. Es el modelo por defecto (y el que sirven el
+# servidor de embeddings y el pool); el de cada colección está en el registro
+# (integrations.embedding_registry)
+TEXT_EMBEDDING_MODEL = os.getenv("TEXT_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+
+
+@lru_cache(maxsize=2)
+def _load_text_model(model_name: str):
+    # EMBED_BACKEND=onnx: MiniLM int8 en ONNX Runtime (misma interfaz)
+    if onnx_backend.use_onnx("text", model_name):
+        return onnx_backend.load_text_model(model_name)
+    if onnx_backend.EMBED_BACKEND == "onnx":
+        logging.getLogger(__name__).warning(
+            "[ONNX] %s no exportado; se usa PyTorch (python manage.py export_onnx).", model_name
+        )
+    return SentenceTransformer(model_name)
+
+def get_text_embedding_model(model_name: str | None = None):
+    # Hasta 2 modelos cargados: el actual y el nuevo durante una migración de colección
+    return _load_text_model(model_name or TEXT_EMBEDDING_MODEL)
+
+def _hub_repo(model_name: str) -> str:
+    # sentence-transformers acepta nombres cortos ("all-MiniLM-L6-v2")
+    if "/" in model_name or os.path.isdir(model_name):
+        return model_name
+    return f"sentence-transformers/{model_name}"
+
+def _max_seq_length(repo: str, tokenizer) -> int | None:
+    # max_seq_length de sentence-transformers (sentence_bert_config.json), sin cargar el modelo
+    try:
+        if os.path.isdir(repo):
+            path = os.path.join(repo, "sentence_bert_config.json")
+        else:
+            from huggingface_hub import hf_hub_download
+
+            path = hf_hub_download(repo, "sentence_bert_config.json")
+        with open(path, encoding="utf-8") as f:
+            return int(json.load(f)["max_seq_length"])
+    except Exception:
+        limit = getattr(tokenizer, "model_max_length", None)
+        # model_max_length vale 1e30 cuando el tokenizer no lo declara
+        return int(limit) if limit and limit < 100_000 else None
+
+@lru_cache(maxsize=2)
+def get_text_tokenizer(model_name: str | None = None):
+    """
+    (tokenizer, max_seq_length) del modelo de texto, sin construir el modelo:
+    el chunking de un worker con EMBED_MODE=server no debe cargar MiniLM.
+    """
+    from transformers import AutoTokenizer
+
+    repo = _hub_repo(model_name or TEXT_EMBEDDING_MODEL)
+    tokenizer = AutoTokenizer.from_pretrained(repo)
+    return tokenizer, _max_seq_length(repo, tokenizer)
 
 def _clean(t: str) -> str:
     t = str(t).replace("\n", " ").strip()
-    # evita inputs absurdos
-    return t[:4000]
+    # evita inputs absurdos; el tokenizer ignora los espacios repetidos, así que
+    # colapsarlos no cambia el vector y sí unifica la clave de caché
+    return " ".join(t[:4000].split())
+
+def _encode_local(clean: list[str], model_name: str | None = None) -> list[list[float]]:
+    model = get_text_embedding_model(model_name)
+    return model.encode(clean).tolist()
+
+def _encode(clean: list[str]) -> list[list[float]]:
+    # EMBED_MODE=server: el servidor de embeddings compartido hace el forward pass
+    return remote_or_local("text", clean, _encode_local)
+
+def _encode_parallel(clean: list[str]) -> list[list[float]]:
+    # Ingesta: en local, shards repartidos entre las réplicas del pool (EMBED_POOL_WORKERS)
+    return remote_or_local("text", clean, lambda m: pool_or_local("text", m, _encode_local))
 
-def embed_text(text: str) -> list[float]:
-    model = get_text_embedding_model()
-    vec = model.encode(_clean(text))
-    return vec.tolist()
+def embed_text(text: str, model_name: str | None = None) -> list[float]:
+    return embed_texts([text], model_name=model_name)[0]
 
-def embed_texts(texts: list[str]) -> list[list[float]]:
-    model = get_text_embedding_model()
+def embed_texts(texts: list[str], parallel: bool = False, model_name: str | None = None) -> list[list[float]]:
+    # Textos ya vectorizados (reindex, duplicados, boilerplate) salen de la caché
+    model_name = model_name or TEXT_EMBEDDING_MODEL
     clean = [_clean(t) for t in texts]
-    vecs = model.encode(clean)
-    return vecs.tolist()
+    if model_name == TEXT_EMBEDDING_MODEL:
+        encode = _encode_parallel if parallel else _encode
+    else:
+        # Otro modelo (migración de colección): el servidor y el pool solo
+        # sirven el modelo por defecto, así que se vectoriza en este proceso
+        encode = lambda missing: _encode_local(missing, model_name)  # noqa: E731
+    return cached_embed(onnx_backend.cache_model_id("text", model_name), clean, clean, encode)
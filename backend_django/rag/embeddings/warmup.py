@@ -0,0 +1,145 @@
+# rag/embeddings/warmup.py
+"""
+Precarga y calentamiento de los modelos de embeddings al arrancar el proceso.
+
+Sin esto, la primera pregunta tras un deploy o un reinicio del worker paga la
+descarga e inicialización de MiniLM (y la primera pregunta con imagen, la de
+CLIP). `preload_models()` carga los modelos de EMBED_PRELOAD y hace un forward
+pass con un lote ficticio (sin pasar por la caché), y deja el estado y los
+tiempos en `warmup_status()` para el endpoint de readiness.
+
+Con EMBED_MODE=server los modelos viven en el servidor de embeddings: aquí
+solo se comprueba que responde.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import sys
+import threading
+import time
+from io import BytesIO
+from typing import Dict, List
+
+from rag.embeddings.client import get_embedding_client, use_server
+
+logger = logging.getLogger(__name__)
+
+# Modelos a precargar: "text", "image" (separados por comas); vacío = carga perezosa
+EMBED_PRELOAD = [m.strip() for m in os.getenv("EMBED_PRELOAD", "text,image").lower().split(",") if m.strip()]
+# En el servidor web la precarga va en un hilo: el proceso acepta peticiones
+# (y /ready/ responde 503) mientras carga
+EMBED_PRELOAD_BACKGROUND = os.getenv("EMBED_PRELOAD_BACKGROUND", "true").lower() == "true"
+EMBED_WARMUP_BATCH = int(os.getenv("EMBED_WARMUP_BATCH", "8"))
+
+# Procesos servidor en los que AppConfig.ready lanza la precarga (no en migrate, shell, etc.)
+_SERVER_PROGRAMS = ("gunicorn", "uvicorn", "daphne")
+
+_status: Dict[str, Dict[str, object]] = {}
+_lock = threading.Lock()
+_started = False
+
+
+def _set(model: str, **values) -> None:
+    with _lock:
+        _status.setdefault(model, {}).update(values)
+
+
+def _warm_text() -> None:
+    from rag.embeddings.text_embeddings import _encode_local, get_text_embedding_model
+
+    t0 = time.perf_counter()
+    get_text_embedding_model()
+    t1 = time.perf_counter()
+    _encode_local(["warm up"] * max(1, EMBED_WARMUP_BATCH))
+    _set("text", load_ms=int((t1 - t0) * 1000), warmup_ms=int((time.perf_counter() - t1) * 1000))
+
+
+def _warm_image() -> None:
+    from PIL import Image
+
+    from rag.embeddings.image_embeddings import _encode_images, get_clip_model
+
+    buf = BytesIO()
+    Image.new("RGB", (224, 224), (128, 128, 128)).save(buf, format="PNG")
+
+    t0 = time.perf_counter()
+    get_clip_model()
+    t1 = time.perf_counter()
+    _encode_images([buf.getvalue()] * max(1, EMBED_WARMUP_BATCH))
+    _set("image", load_ms=int((t1 - t0) * 1000), warmup_ms=int((time.perf_counter() - t1) * 1000))
+
+
+def _warm_server() -> None:
+    t0 = time.perf_counter()
+    response = get_embedding_client().ping()
+    if not response.get("ok"):
+        raise RuntimeError(response.get("error") or "ping fallido")
+    _set("server", load_ms=int((time.perf_counter() - t0) * 1000), warmup_ms=0)
+
+
+_WARMERS = {"text": _warm_text, "image": _warm_image}
+
+
+def _targets(models: List[str]) -> List[str]:
+    if use_server():
+        return ["server"] if models else []
+    return [m for m in models if m in _WARMERS]
+
+
+def preload_models(models: List[str] | None = None) -> Dict[str, Dict[str, object]]:
+    """
+    Carga y calienta `models` (por defecto EMBED_PRELOAD) en este proceso.
+    Un fallo se registra en el estado pero no impide arrancar: el modelo se
+    cargará en la primera petición, como antes.
+    """
+    for model in _targets(EMBED_PRELOAD if models is None else models):
+        _set(model, loaded=False, error=None)
+        try:
+            (_warm_server if model == "server" else _WARMERS[model])()
+            _set(model, loaded=True)
+            logger.info("[WARMUP] %s listo: %s", model, _status[model])
+        except Exception as e:
+            _set(model, error=f"{type(e).__name__}: {e}")
+            logger.warning("[WARMUP] No se pudo precargar %s.", model, exc_info=True)
+    return warmup_status()
+
+
+def start_preload(background: bool = EMBED_PRELOAD_BACKGROUND) -> None:
+    """
+    Lanza la precarga una sola vez por proceso (en un hilo si `background`).
+    """
+    global _started
+    with _lock:
+        if _started:
+            return
+        _started = True
+        for model in _targets(EMBED_PRELOAD):
+            _status[model] = {"loaded": False, "error": None}
+
+    if background:
+        threading.Thread(target=preload_models, name="embed-warmup", daemon=True).start()
+    else:
+        preload_models()
+
+
+def is_server_process(argv: List[str] | None = None) -> bool:
+    """
+    True si este proceso va a servir peticiones HTTP: `runserver` (solo el hijo
+    del autoreloader) o gunicorn/uvicorn/daphne.
+    """
+    argv = sys.argv if argv is None else argv
+    if "runserver" in argv:
+        return os.environ.get("RUN_MAIN") == "true" or "--noreload" in argv
+    program = os.path.basename(argv[0]) if argv else ""
+    return any(name in program for name in _SERVER_PROGRAMS)
+
+
+def warmup_status() -> Dict[str, object]:
+    with _lock:
+        models = {k: dict(v) for k, v in _status.items()}
+    return {
+        "ready": all(m.get("loaded") for m in models.values()),
+        "mode": "server" if use_server() else "local",
+        "models": models,
+    }
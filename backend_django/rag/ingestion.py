@@ -1,31 +1,54 @@
 # backend_django\rag\ingestion.py
 
+import hashlib
 import uuid
 import os
 import json
 from datetime import datetime
+from functools import partial
 import logging
-from io import BytesIO
-from PIL import Image
-
-from integrations.minio_client import upload_bytes
-
-from rag.pipeline.text_extractor import extract_text_from_pdf
-from rag.pipeline.table_extractor import extract_tables_from_pdf
-from rag.pipeline.image_extractor import extract_images_from_pdf
+from typing import Any, Callable
+
+from integrations.minio_client import upload_bytes, list_objects, delete_objects
+
+from rag.pipeline.parallel import INGEST_PARALLEL, iter_page_batches
+from rag.pipeline.pdf_context import PdfContext
+from rag.pipeline.table_extractor import table_config
+from rag.pipeline.table_indexing import plan_table_points, table_index_config
+from rag.table_store import (
+    PARQUET_CONTENT_TYPE,
+    TABLE_PREVIEW_CHARS,
+    TABLE_PREVIEW_ROWS,
+    parquet_path_for,
+    table_preview,
+    table_signature,
+    table_to_parquet,
+)
+from rag.pipeline.fingerprint import (
+    MODALITIES,
+    compute_page_fingerprints,
+    plan_reprocessing,
+    removed_pages,
+)
 
-from rag.pipeline.chunking import chunk_text
+from rag.pipeline.chunking import Chunker
+from rag.pipeline.image_extractor import IMAGE_EXTRACT_MODE, image_filter_config, image_occurrences
 
-from rag.embeddings.text_embeddings import embed_text, embed_texts
-from rag.embeddings.image_embeddings import embed_image
+from rag.embeddings.text_embeddings import embed_texts, TEXT_EMBEDDING_MODEL
+from rag.embeddings.image_embeddings import embed_images, CLIP_MODEL_NAME, IMAGE_EMBED_BATCH
+from rag.embeddings.cache import get_embedding_cache
+from rag.embeddings.pool import pool_batch_size
 
 from integrations.qdrant_client import (
-    add_text_chunks,
-    add_table_rows,
     client,
-    TEXT_COLLECTION,
-    IMAGE_COLLECTION
+    delete_stale_points,
+    find_images_by_phash,
+    same_image,
+    image_paths_in_use,
+    make_point_id,
+    make_table_id,
 )
+from integrations.embedding_registry import CollectionTarget, write_targets
 
 from qdrant_client.models import PointStruct
 
@@ -35,185 +58,614 @@ from qdrant_client.models import PointStruct
 logger = logging.getLogger(__name__)
 MINIO_BUCKET = os.getenv("MINIO_BUCKET", "ragflow")
 
+# Tamaños de lote del pipeline (la memoria depende de estos, no del tamaño del PDF)
+INGEST_EMBED_BATCH = int(os.getenv("INGEST_EMBED_BATCH", "64"))
+INGEST_UPSERT_BATCH = int(os.getenv("INGEST_UPSERT_BATCH", "256"))
+
+# Súbelo cuando cambie la lógica de extracción: invalida las huellas de página
+INGEST_PIPELINE_VERSION = "1"
 
-def process_pdf(pdf_bytes: bytes, original_filename: str | None = None, doc_id: str | None = None, upload_original: bool = True) -> dict:
+
+def _modality_configs(chunker: Chunker) -> dict:
+    """
+    Ajustes que afectan al resultado de cada modalidad; forman parte de la huella
+    de página, así que cambiarlos fuerza el reprocesado solo de esa modalidad.
     """
-    Ingesta multimodal:
+    return {
+        "text": {
+            "v": INGEST_PIPELINE_VERSION,
+            "chunk_max_tokens": chunker.max_tokens,
+            "chunk_overlap_tokens": chunker.overlap_tokens,
+            "chunk_cross_pages": chunker.cross_pages,
+            "model": TEXT_EMBEDDING_MODEL,
+        },
+        "table": {
+            "v": INGEST_PIPELINE_VERSION,
+            "model": TEXT_EMBEDDING_MODEL,
+            "extract": table_config(),
+            "payload": "table_ref",
+            "page": "1-based",
+            "store": "csv+parquet",
+            "preview": {"rows": TABLE_PREVIEW_ROWS, "chars": TABLE_PREVIEW_CHARS},
+            "index": table_index_config(),
+        },
+        "image": {
+            "v": INGEST_PIPELINE_VERSION,
+            "model": CLIP_MODEL_NAME,
+            "filter": image_filter_config(),
+            "dedupe": "xref+dhash+sha256",
+            "page": "1-based",
+            "extract_mode": IMAGE_EXTRACT_MODE,
+        },
+    }
+
+
+class _PointWriter:
+    """
+    Acumula entradas (ID determinista + input a vectorizar + payload), las
+    vectoriza en lotes de `embed_batch` y hace upsert en Qdrant en lotes de
+    `upsert_batch`. Guarda los IDs escritos para limpiar puntos obsoletos.
+
+    `targets` viene del registro de modelos (integrations.embedding_registry):
+    la colección activa y, durante una migración de modelo, también la nueva
+    (doble escritura). Cada colección se vectoriza con su modelo y cada punto
+    lleva ese modelo en `metadata.embed_model`.
+    """
+
+    def __init__(
+        self,
+        targets: list[CollectionTarget],
+        embed_fn: Callable[..., list],
+        embed_batch: int = INGEST_EMBED_BATCH,
+        upsert_batch: int = INGEST_UPSERT_BATCH,
+    ):
+        self.targets = list(targets)
+        self.collection_name = self.targets[0].collection
+        self.embed_fn = embed_fn  # embed_fn(items, model_name=...)
+        self.embed_batch = max(1, embed_batch)
+        self.upsert_batch = max(1, upsert_batch)
+        # (id, input, payload, vector ya calculado para la colección activa o None)
+        self._pending: list[tuple[str, Any, dict, Any]] = []
+        self._points: dict[str, list[PointStruct]] = {t.collection: [] for t in self.targets}
+        self.written_ids: set[str] = set()
+
+    @property
+    def written(self) -> int:
+        return len(self.written_ids)
+
+    def add(self, point_id: str, item: Any, payload: dict) -> None:
+        self._pending.append((point_id, item, payload, None))
+        if len(self._pending) >= self.embed_batch:
+            self._embed_pending()
+
+    def add_vector(self, point_id: str, vector: Any, payload: dict, item: Any = None) -> None:
+        # Vector ya calculado (p. ej. imagen duplicada): no pasa por el modelo.
+        # Es de la colección activa; en una migración, la nueva vectoriza `item`
+        # (sin `item`, el punto llega a la nueva con la sincronización final)
+        self._append(self.targets[0], point_id, vector, payload)
+        if len(self.targets) > 1 and item is not None:
+            self._pending.append((point_id, item, payload, vector))
+        self._maybe_upsert()
+
+    def flush(self) -> None:
+        self._embed_pending()
+        self._upsert_points()
+
+    def set_pages(self, pages_by_point: dict[str, list[int]]) -> None:
+        # metadata.pages de puntos ya escritos, en todas las colecciones destino
+        for target in self.targets:
+            for point_id, pages in pages_by_point.items():
+                client.set_payload(
+                    collection_name=target.collection, payload={"pages": pages}, points=[point_id], key="metadata",
+                )
+
+    def _append(self, target: CollectionTarget, point_id: str, vector: Any, payload: dict) -> None:
+        payload = {**payload, "metadata": {**(payload.get("metadata") or {}), "embed_model": target.model_id}}
+        self._points[target.collection].append(PointStruct(id=point_id, vector=vector, payload=payload))
+
+    def _embed_pending(self) -> None:
+        if not self._pending:
+            return
+        for i, target in enumerate(self.targets):
+            todo = [(pid, item, payload) for pid, item, payload, vec in self._pending if i or vec is None]
+            if not todo:
+                continue
+            vectors = self.embed_fn([item for _, item, _ in todo], model_name=target.model_id)
+            for (point_id, _, payload), vec in zip(todo, vectors):
+                if vec is None:
+                    continue
+                self._append(target, point_id, vec, payload)
+        self._pending = []
+        self._maybe_upsert()
+
+    def _maybe_upsert(self) -> None:
+        if any(len(points) >= self.upsert_batch for points in self._points.values()):
+            self._upsert_points()
+
+    def _upsert_points(self) -> None:
+        for collection_name, points in self._points.items():
+            if not points:
+                continue
+            client.upsert(collection_name=collection_name, points=points)
+            if collection_name == self.collection_name:
+                self.written_ids.update(str(p.id) for p in points)
+            self._points[collection_name] = []
+
+    def delete_stale(self, doc_id: str, page_idxs: list[int] | None = None, modalities: list[str] | None = None) -> int:
+        if page_idxs is not None and not page_idxs:
+            return 0
+        # Mismos IDs en todas las colecciones: se limpia cada una con el mismo conjunto
+        deleted = [
+            delete_stale_points(
+                doc_id,
+                self.written_ids,
+                collection_name=target.collection,
+                page_idxs=page_idxs,
+                modalities=modalities,
+            )
+            for target in self.targets
+        ]
+        return deleted[0]
+
+
+def _delete_stale_objects(doc_id: str, prefixes: list[str], keep: set[str], image_collection: str) -> int:
+    """
+    Borra de MinIO los assets derivados bajo `prefixes` que no se han vuelto a escribir
+    (salvo imágenes que otros documentos reutilizan).
+    """
+    if not prefixes:
+        return 0
+    stale = []
+    for root in (f"{doc_id}/images/", f"{doc_id}/tables/"):
+        for name in list_objects(prefix=root):
+            if name.startswith(tuple(prefixes)) and name not in keep:
+                stale.append(name)
+
+    # Imágenes compartidas: no se borran mientras otro documento las use
+    shared = image_paths_in_use(
+        [n for n in stale if n.startswith(f"{doc_id}/images/")],
+        exclude_doc_id=doc_id,
+        collection_name=image_collection,
+    )
+    stale = [n for n in stale if n not in shared]
+    delete_objects(stale)
+    return len(stale)
+
+
+def _image_key(img: dict) -> tuple:
+    # Duplicadas dentro de un documento: mismo dHash y mismo tamaño (sin dHash, mismos bytes)
+    if img.get("phash"):
+        return ("phash", img["phash"], img.get("width"), img.get("height"))
+    return ("sha256", img.get("sha256") or hashlib.sha256(img["bytes"]).hexdigest())
+
+
+def _new_image_stats() -> dict:
+    return {
+        "mode": IMAGE_EXTRACT_MODE,
+        "passthrough": 0,
+        "converted": 0,
+        "bytes": 0,
+        "passthrough_bytes": 0,
+        "extract_ms": 0.0,
+        "passthrough_ms": 0.0,
+        "sampled": 0,
+        "sample_bytes": 0,
+        "sample_ms": 0.0,
+        "sample_png_bytes": 0,
+        "sample_png_ms": 0.0,
+    }
+
+
+def _add_image_stats(stats: dict, img: dict) -> None:
+    st = img.get("stats") or {}
+    size = len(img["bytes"])
+    ms = st.get("ms", 0.0)
+    stats["bytes"] += size
+    stats["extract_ms"] += ms
+
+    if st.get("mode") != "passthrough":
+        stats["converted"] += 1
+        return
+
+    stats["passthrough"] += 1
+    stats["passthrough_bytes"] += size
+    stats["passthrough_ms"] += ms
+    sample = st.get("png_sample")
+    if sample:
+        stats["sampled"] += 1
+        stats["sample_bytes"] += size
+        stats["sample_ms"] += ms
+        stats["sample_png_bytes"] += sample["bytes"]
+        stats["sample_png_ms"] += sample["ms"]
+
+
+def _image_savings(stats: dict) -> dict:
+    """
+    Ahorro estimado del modo passthrough frente a convertir todo a PNG,
+    extrapolando la muestra convertida al resto de imágenes passthrough.
+    """
+    out = {
+        "mode": stats["mode"],
+        "passthrough": stats["passthrough"],
+        "converted": stats["converted"],
+        "bytes": stats["bytes"],
+        "extract_ms": round(stats["extract_ms"], 1),
+        "sampled": stats["sampled"],
+        "est_bytes_saved": 0,
+        "est_ms_saved": 0.0,
+    }
+    if stats["sampled"] and stats["sample_bytes"]:
+        ratio = stats["sample_png_bytes"] / stats["sample_bytes"]
+        ms_per_image = (stats["sample_png_ms"] - stats["sample_ms"]) / stats["sampled"]
+        out["est_bytes_saved"] = int(stats["passthrough_bytes"] * (ratio - 1))
+        out["est_ms_saved"] = round(ms_per_image * stats["passthrough"], 1)
+    return out
+
+
+def process_pdf(
+    pdf_bytes: bytes,
+    original_filename: str | None = None,
+    doc_id: str | None = None,
+    upload_original: bool = True,
+    parallel: bool | None = None,
+    previous_fingerprints: dict | None = None,
+) -> dict:
+    """
+    Ingesta multimodal en streaming:
+      página → extraer → chunking → embeddings por lotes → upsert por lotes
+
       - Subir PDF original a MinIO
-      - Extraer texto + chunking + embeddings CLIP
-      - Extraer tablas + filas → embeddings CLIP
+      - Extraer texto + chunking + embeddings
+      - Extraer tablas + filas → embeddings
       - Extraer imágenes → embeddings CLIP
-      - Guardar todo en una única colección Qdrant: text_chunks
+      - Texto y tablas en TEXT_COLLECTION, imágenes en IMAGE_COLLECTION (y en
+        la colección nueva durante una migración de modelo)
+
+    `parallel` (por defecto INGEST_PARALLEL) reparte la extracción por rangos de
+    páginas en un pool de procesos (INGEST_WORKERS, INGEST_PAGES_PER_TASK).
+    Los lotes de embeddings y upsert se controlan con INGEST_EMBED_BATCH e
+    INGEST_UPSERT_BATCH. Con EMBED_POOL_WORKERS > 1 los embeddings se reparten
+    entre réplicas del modelo en un pool de procesos (ver rag.embeddings.pool).
+
+    Con `previous_fingerprints` (huellas de la ingesta anterior, ver
+    rag.pipeline.fingerprint) solo se reprocesan las páginas/modalidades cuya
+    huella ha cambiado; sus puntos y assets obsoletos se eliminan y el resto se
+    deja intacto.
+
+    Las imágenes repetidas (mismo xref en varias páginas, o mismo hash
+    perceptual en este u otro documento) se suben y vectorizan una sola vez;
+    las páginas adicionales quedan en `metadata.pages` del punto y del asset.
     """
     # 1 — doc_id único
     if doc_id is None:
         doc_id = str(uuid.uuid4())
-        
+
     pdf_path = f"{doc_id}/original.pdf"
 
     # 2 — Subir PDF original
     if upload_original:
         upload_bytes(pdf_path, pdf_bytes, "application/pdf")
 
-    # 4 — Extraer contenido del PDF
-    pages = extract_text_from_pdf(pdf_bytes)
-    images = extract_images_from_pdf(doc_id, pdf_bytes)
-    tables = extract_tables_from_pdf(pdf_bytes)
-    created_assets = []
-
-    # ------------------------------
-    # 🔹 Imágenes
-    # ------------------------------
-    image_points = []
-    for img in images:
-        raw = img.get("bytes")
-        if not isinstance(raw, (bytes, bytearray)):
-            continue
+    if parallel is None:
+        parallel = INGEST_PARALLEL
+
+    # 3 — Huellas por página: decidir qué hay que reprocesar
+    chunker = Chunker()
+    ctx = PdfContext(pdf_bytes)  # el PDF se parsea una sola vez para todas las etapas
+    occurrences = image_occurrences(ctx)
+    fingerprints = compute_page_fingerprints(ctx, _modality_configs(chunker), occurrences=occurrences)
+    num_pages = len(fingerprints)
+    incremental = bool(previous_fingerprints)
+    plan = plan_reprocessing(fingerprints, previous_fingerprints) if incremental else None
+
+    text_changed = plan is not None and (
+        any("text" in mods for mods in plan.values())
+        or removed_pages(fingerprints, previous_fingerprints)
+    )
+    if text_changed and chunker.cross_pages:
+        # Con chunks que cruzan páginas, un cambio de texto mueve las fronteras
+        # de los chunks vecinos: se rechunkea el texto de todo el documento
+        for p in range(num_pages):
+            plan.setdefault(p, set()).add("text")
+
+    embed_cache = get_embedding_cache()
+    embed_cache_snap = embed_cache.counters()
+    # Con EMBED_POOL_WORKERS, lotes más grandes para dar al menos un shard a cada réplica
+    text_writer = _PointWriter(
+        write_targets("text"),
+        partial(embed_texts, parallel=True),
+        embed_batch=pool_batch_size("text", INGEST_EMBED_BATCH),
+    )
+    image_writer = _PointWriter(
+        write_targets("image"),
+        partial(embed_images, parallel=True),
+        embed_batch=pool_batch_size("image", IMAGE_EMBED_BATCH),
+    )
 
+    created_assets = []
+    num_text_chunks = 0
+    # Imágenes ya escritas en este documento: (phash, ancho, alto) o sha256 -> entrada
+    run_images: dict[tuple, dict] = {}
+    merged_pages: dict[str, list[int]] = {}        # point_id -> páginas tras fusionar duplicadas
+    images_reused = 0
+    image_stats = _new_image_stats()
+    text_ordinals: dict[int, int] = {}
+
+    def add_text_chunks(chunks) -> int:
+        # El ordinal es por página de inicio del chunk: mismo ID en cada reindex
+        for chunk in chunks:
+            ordinal = text_ordinals.get(chunk.page, 0)
+            text_ordinals[chunk.page] = ordinal + 1
+            metadata = {
+                "doc_id": doc_id,
+                "page": chunk.page + 1,
+                "page_idx": chunk.page,
+                "modality": "text",
+            }
+            if len(chunk.pages) > 1:
+                metadata["pages"] = [p + 1 for p in chunk.pages]
+            text_writer.add(
+                make_point_id(doc_id, "text", chunk.page, ordinal, chunk.text),
+                chunk.text,
+                {"content": chunk.text, "metadata": metadata},
+            )
+        return len(chunks)
+
+    # 4 — Extraer contenido del PDF por lotes de páginas
+    for batch in iter_page_batches(doc_id, ctx, parallel=parallel, plan=plan, occurrences=occurrences):
+        ctx.absorb(batch.get("metrics"))
+        # ------------------------------
+        # 🔹 Imágenes
+        # ------------------------------
+        images = [img for img in batch["images"] if isinstance(img.get("bytes"), (bytes, bytearray))]
+
+        # Imágenes ya indexadas (en este u otro documento) con el mismo hash
+        # perceptual: candidatas a reutilizar su vector y su objeto en MinIO
         try:
-            vec = embed_image(img["bytes"])
-            if vec is None:
-                continue
+            known = find_images_by_phash(
+                (img.get("phash") for img in images if _image_key(img) not in run_images),
+                collection_name=image_writer.collection_name,
+            )
         except Exception:
-            continue
+            logger.exception("[PDF_INGEST] doc_id=%s: no se pudo consultar el índice de hashes de imagen.", doc_id)
+            known = {}
+
+        image_ordinals: dict[Any, int] = {}
+        for img in images:
+            raw = img["bytes"]
+            _add_image_stats(image_stats, img)
+            phash = img.get("phash")
+            sha256 = img.get("sha256") or hashlib.sha256(raw).hexdigest()
+
+            # El extractor da la página 1-based; como en texto, page = page_idx + 1
+            page_idx = img["page"] - 1
+            page_1based = page_idx + 1
+            pages = img.get("pages") or [img["page"]]
+
+            # Misma imagen que otra de este documento (mismo dHash y tamaño): un
+            # solo asset y un solo punto, con las páginas de las dos
+            first = run_images.get(_image_key(img))
+            if first is not None:
+                first["pages"] = sorted(set(first["pages"]) | set(pages))
+                first["asset"]["meta"]["pages"] = first["pages"]
+                merged_pages[first["point_id"]] = first["pages"]
+                images_reused += 1
+                continue
+
+            ordinal = image_ordinals.get(img.get("page"), 0)
+            image_ordinals[img.get("page")] = ordinal + 1
+            point_id = make_point_id(doc_id, "image", img.get("page"), ordinal, raw)
+
+            # Otro documento: el dHash solo propone candidatas; se reutiliza si
+            # coinciden los bytes (sha256) y el tamaño
+            source = next(
+                (
+                    p for p in known.get(phash) or []
+                    if same_image((p.payload or {}).get("metadata") or {}, sha256, img.get("width"), img.get("height"))
+                ),
+                None,
+            )
+            if source is not None:
+                image_path = (source.payload.get("metadata") or {}).get("image_path")
+                shared_from = (source.payload.get("metadata") or {}).get("doc_id")
+            else:
+                image_path, shared_from = img.get("image_path"), None
+                upload_bytes(image_path, raw, content_type=img.get("content_type", "image/png"))
+
+            metadata = {
+                "doc_id": doc_id,
+                "page": page_1based,
+                "page_idx": page_idx,
+                "modality": "image",
+                "image_path": image_path,
+                "phash": phash,
+                "sha256": sha256,
+                "width": img.get("width"),
+                "height": img.get("height"),
+            }
+            if len(pages) > 1:
+                metadata["pages"] = pages
+            if shared_from and shared_from != doc_id:
+                metadata["shared_from"] = shared_from
+
+            # Guardamos asset para BBDD (si existe path)
+            asset = None
+            if image_path:
+                asset = {
+                    "type": "image",
+                    "page": page_1based,
+                    "storage_key": image_path,
+                    "meta": {
+                        "content": img.get("content", ""),
+                        "page_idx": page_idx,
+                        "pages": pages,
+                        "phash": phash,
+                        **({"shared_from": metadata["shared_from"]} if "shared_from" in metadata else {}),
+                    },
+                }
+                created_assets.append(asset)
+            run_images[_image_key(img)] = {"point_id": point_id, "pages": list(pages), "asset": asset or {"meta": {}}}
+
+            payload = {"content": img.get("content", ""), "metadata": metadata}
+            if source is not None and source.vector is not None:
+                image_writer.add_vector(point_id, source.vector, payload, item=raw)
+                images_reused += 1
+            else:
+                image_writer.add(point_id, raw, payload)
+
+        # ------------------------------
+        # 🔹 Texto
+        # ------------------------------
+        for page in batch["pages"]:
+            num_text_chunks += add_text_chunks(chunker.feed(page["page"], page["text"]))
+
+        # ------------------------------
+        # 🔹 Tablas
+        # ------------------------------
+        for table in batch["tables"]:
+            df = table["df"]
+            page_num = table["page"]  # 1-based, como `page` en el payload
+            table_idx = table.get("idx", 0)
+            page_idx = page_num - 1
+
+            if df.empty:
+                logger.warning("[PDF_INGEST] Tabla %d en página %d está vacía, no se guarda CSV.", table_idx, page_num)
+                continue
+
+            csv_bytes = df.to_csv(index=False).encode("utf-8")
+            csv_path = f"{doc_id}/tables/table_{page_num}_table_{table_idx}.csv"
+            upload_bytes(csv_path, csv_bytes, "text/csv")
 
-        page_1based = (img.get("page", 0) + 1) if isinstance(img.get("page"), int) else img.get("page")
-        image_path = img.get("image_path")
+            # Copia columnar para lecturas parciales (columnas / rangos de filas)
+            parquet_path = parquet_path_for(csv_path)
+            parquet_bytes, parquet_meta = table_to_parquet(df)
+            upload_bytes(parquet_path, parquet_bytes, PARQUET_CONTENT_TYPE)
+
+            headers = list(df.columns)
+            # Pocas filas: un punto por fila; tablas grandes: ventanas + columnas + descripción
+            table_points, index_info = plan_table_points(
+                df, page_num, counter=chunker.counter, max_tokens=chunker.max_tokens
+            )
+            # La tabla completa vive una sola vez (CSV); cada fila solo la referencia
+            table_ref = {"table_id": make_table_id(doc_id, page_num, table_idx), "csv_path": csv_path}
 
-        # Guardamos asset para BBDD (si existe path)
-        if image_path:
+            # Asset para BBDD (tabla completa)
             created_assets.append({
-                "type": "image",
-                "page": page_1based,
-                "storage_key": image_path,
+                "type": "table",
+                "page": page_num,
+                "storage_key": csv_path,
                 "meta": {
-                    "content": img.get("content", ""),
+                    "table_id": table_ref["table_id"],
+                    "idx": table_idx,
+                    "page_idx": page_idx,
+                    "rows": int(df.shape[0]),
+                    "cols": int(df.shape[1]),
+                    "headers": list(df.columns),
+                    "index": index_info,
+                    "parquet_path": parquet_path,
+                    **parquet_meta,
+                    # Dedupe y preview del chat sin volver a bajar el CSV
+                    "signature": table_signature(csv_bytes),
+                    "preview": table_preview(csv_bytes),
                 },
             })
 
-        image_points.append(
-            PointStruct(
-                id=str(uuid.uuid4()),
-                vector=vec,
-                payload={
-                    "content": img.get("content", ""),
-                    "metadata": {
-                        "doc_id": doc_id,
-                        "page": page_1based,
-                        "modality": "image",
-                        "image_path": image_path,
-                    },
-                },
-            )
-        )
-
-    if image_points:
-        client.upsert(collection_name=IMAGE_COLLECTION, points=image_points)
-
-    # ------------------------------
-    # 🔹 Texto
-    # ------------------------------
-    all_chunks = []
-    chunk_id = 0
-
-    for page in pages:
-        page_number = page["page"]
-        text = page["text"]
-
-        for chunk_text_content in chunk_text(text, max_len=500):
-            all_chunks.append(
-                {
-                    "content": chunk_text_content,
-                    "metadata": {
-                        "doc_id": doc_id,
-                        "page": (page_number + 1),
-                        "modality": "text",
-                    },
-                }
-            )
-            chunk_id += 1
-
-    if all_chunks:
-        vectors = embed_texts([c["content"] for c in all_chunks])
-        for c, v in zip(all_chunks, vectors):
-            c["embedding"] = v
-        add_text_chunks(all_chunks)
-
-
-
-    # ------------------------------
-    # 🔹 Tablas
-    # ------------------------------
-
-    table_rows = []
-    row_id = 0
-
-    for table in tables:
-        df = table["df"]
-        page_num = table["page"]
-        table_idx = table.get("idx", 0)
-
-        if df.empty:
-            logger.warning("[PDF_INGEST] Tabla %d en página %d está vacía, no se guarda CSV.", table_idx, page_num)
-            continue
-
-        csv_bytes = df.to_csv(index=False).encode("utf-8")
-        csv_path = f"{doc_id}/tables/table_{page_num}_table_{table_idx}.csv"
-        upload_bytes(csv_path, csv_bytes, "text/csv")
-
-        headers = list(df.columns)
-        rows = df.values.tolist()
-
-        # Asset para BBDD (tabla completa)
-        created_assets.append({
-            "type": "table",
-            "page": page_num + 1,
-            "storage_key": csv_path,
-            "meta": {
-                "idx": table_idx,
-                "rows": int(df.shape[0]),
-                "cols": int(df.shape[1]),
-                "headers": list(df.columns),
-            },
-        })
-
-        for r in rows:
-            row_text_parts = [f"{col_name}: {value}" for col_name, value in zip(headers, r)]
-            row_text = " | ".join(row_text_parts)
-
-            table_rows.append(
-                {
-                    "id": row_id,
-                    "content": row_text,
-                    "metadata": {
-                        "doc_id": doc_id,
-                        "page": (page_num + 1),
-                        "modality": "table",
-                        "csv_path": csv_path,
-                        "table": {
+            for tp in table_points:
+                text_writer.add(
+                    make_point_id(doc_id, "table", page_num, f"{table_idx}:{tp.ordinal}", tp.text),
+                    tp.text,
+                    {
+                        "content": tp.text,
+                        "metadata": {
+                            "doc_id": doc_id,
+                            "page": page_num,
+                            "page_idx": page_idx,
+                            "modality": "table",
+                            "csv_path": csv_path,
+                            "table_ref": table_ref,
+                            "table_point": tp.kind,
                             "headers": headers,
-                            "rows": rows,
+                            **tp.meta,
                         },
                     },
-                }
-            )
-            row_id += 1
+                )
+
+    num_text_chunks += add_text_chunks(chunker.flush())
+
+    image_writer.flush()
+    text_writer.flush()
+
+    if merged_pages:
+        # Los puntos ya están escritos: solo se actualizan sus páginas
+        image_writer.set_pages(merged_pages)
+
+    # 5 — Reintentos/reindex: borrar en un lote los puntos y assets que ya no existen
+    if plan is None:
+        reprocessed = None
+        stale_points = image_writer.delete_stale(doc_id) + text_writer.delete_stale(doc_id)
+        stale_prefixes = [f"{doc_id}/images/", f"{doc_id}/tables/"]
+    else:
+        gone = removed_pages(fingerprints, previous_fingerprints)
+        reprocessed = {
+            m: sorted([p for p, mods in plan.items() if m in mods] + gone)
+            for m in MODALITIES
+        }
+        stale_points = (
+            image_writer.delete_stale(doc_id, page_idxs=reprocessed["image"], modalities=["image"])
+            + text_writer.delete_stale(doc_id, page_idxs=reprocessed["text"], modalities=["text"])
+            + text_writer.delete_stale(doc_id, page_idxs=reprocessed["table"], modalities=["table"])
+        )
+        stale_prefixes = (
+            [f"{doc_id}/images/page_{p + 1}_img_" for p in reprocessed["image"]]
+            + [f"{doc_id}/tables/table_{p + 1}_table_" for p in reprocessed["table"]]
+        )
+
+    try:
+        written = {a["storage_key"] for a in created_assets}
+        written |= {a["meta"]["parquet_path"] for a in created_assets if a["meta"].get("parquet_path")}
+        stale_objects = _delete_stale_objects(doc_id, stale_prefixes, written, image_writer.collection_name)
+    except Exception:
+        logger.exception("[PDF_INGEST] doc_id=%s: no se pudieron borrar assets obsoletos en MinIO.", doc_id)
+        stale_objects = 0
+
+    if stale_points or stale_objects:
+        logger.info(
+            "[PDF_INGEST] doc_id=%s: %d puntos y %d assets obsoletos eliminados.",
+            doc_id, stale_points, stale_objects,
+        )
+
+    pages_reprocessed = num_pages if plan is None else len(plan)
 
-    if table_rows:
-        vectors = embed_texts([r["content"] for r in table_rows])
-        for r, v in zip(table_rows, vectors):
-            r["embedding"] = v
-        add_table_rows(table_rows, collection_name=TEXT_COLLECTION, embedding_key="embedding")
+    # Páginas saltadas (p. ej. tablas fuera de presupuesto): su huella se invalida
+    # para que el próximo reindex las vuelva a intentar
+    skipped_pages = list(ctx.issues)
+    for issue in skipped_pages:
+        fps = fingerprints.get(str(issue["page_idx"]))
+        if fps and issue.get("stage") in fps:
+            fps[issue["stage"]] = "skipped"
 
     result = {
         "status": "ok",
         "doc_id": doc_id,
         "original_filename": original_filename,
         "pdf_path": pdf_path,
-        "pages": len(pages),
-        "num_text_chunks": len(all_chunks),
+        "pages": num_pages,
+        "num_text_chunks": num_text_chunks,
         "num_tables": len([a for a in created_assets if a["type"] == "table"]),
         "num_images": len([a for a in created_assets if a["type"] == "image"]),
+        "num_images_reused": images_reused,
+        "image_extraction": _image_savings(image_stats),
+        "pdf_context": ctx.stats(),
+        "embedding_cache": embed_cache.since(embed_cache_snap),
+        "skipped_pages": skipped_pages,
+        "num_points": text_writer.written + image_writer.written,
+        "stale_points_deleted": stale_points,
+        "stale_assets_deleted": stale_objects,
+        "incremental": incremental,
+        "pages_reprocessed": pages_reprocessed,
+        "pages_skipped": num_pages - pages_reprocessed,
+        "reprocessed": reprocessed,
+        "page_fingerprints": fingerprints,
         "assets": created_assets,  # <-- NUEVO
         "created_at": datetime.utcnow().isoformat()
     }
@@ -221,4 +673,4 @@ def process_pdf(pdf_bytes: bytes, original_filename: str | None = None, doc_id:
     meta_key = f"docs_meta/{doc_id}.json"
     upload_bytes(meta_key, json.dumps(result, ensure_ascii=False).encode("utf-8"), "application/json")
 
-    return result
\ No newline at end of file
+    return result
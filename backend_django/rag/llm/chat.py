@@ -24,6 +24,7 @@ Instrucciones:
 - Solo existen las imágenes adjuntas etiquetadas como IMAGEN N. No inventes imágenes a partir del texto.
 - Las tablas (TABLA N) no son imágenes. No listes filas de tabla como si fueran imágenes.
 - Si una tabla está incompleta (preview), indícalo.
+- Si aparece "RESULTADO CALCULADO SOBRE LA TABLA COMPLETA", sus cifras son exactas: úsalas tal cual y no las recalcules.
 """
 
 def _guess_mime(image_bytes: bytes) -> str:
@@ -0,0 +1,111 @@
+from pathlib import Path
+from statistics import mean
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from rag.pipeline.chunking import Chunker, default_token_counter
+from rag.pipeline.text_extractor import extract_text_from_pdf
+
+
+def legacy_chunk_text(text: str, max_len=500):
+    """
+    Chunker anterior (por caracteres, une la lista tras cada palabra). Solo para comparar.
+    """
+    chunks = []
+    current = []
+
+    words = text.split()
+
+    for word in words:
+        current.append(word)
+        if len(" ".join(current)) > max_len:
+            chunks.append(" ".join(current))
+            current = []
+
+    if current:
+        chunks.append(" ".join(current))
+
+    return chunks
+
+
+class Command(BaseCommand):
+    help = "Compara el chunker anterior con el chunker por tokens sobre los PDFs de tests/files"
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="*", help="PDFs o carpetas (por defecto tests/files)")
+        parser.add_argument("--repeat", type=int, default=5, help="Repeticiones por PDF")
+        parser.add_argument("--scale", type=int, default=1, help="Multiplica el texto de cada página")
+        parser.add_argument("--max-len", type=int, default=500, help="max_len del chunker anterior")
+
+    def handle(self, *args, **options):
+        pdfs = self._collect(options["paths"] or [Path(settings.BASE_DIR).parent / "tests" / "files"])
+        if not pdfs:
+            self.stderr.write("No se han encontrado PDFs.")
+            return
+
+        counter = default_token_counter()
+        repeat = max(1, options["repeat"])
+        scale = max(1, options["scale"])
+
+        for path in pdfs:
+            pages = extract_text_from_pdf(path.read_bytes())
+            pages = [{"page": p["page"], "text": "\n\n".join([p["text"]] * scale)} for p in pages]
+            n_chars = sum(len(p["text"]) for p in pages)
+
+            t_legacy, legacy = self._time(
+                repeat, lambda: [c for p in pages for c in legacy_chunk_text(p["text"], max_len=options["max_len"])]
+            )
+
+            def run_new():
+                chunker = Chunker(counter=counter)
+                out = []
+                for p in pages:
+                    out.extend(chunker.feed(p["page"], p["text"]))
+                out.extend(chunker.flush())
+                return out
+
+            t_new, new = self._time(repeat, run_new)
+            chunker = Chunker(counter=counter)
+
+            legacy_tokens = counter.counts(legacy)
+            new_tokens = [c.n_tokens for c in new]
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{path.name} ({len(pages)} págs, {n_chars} chars)"))
+            self.stdout.write(self._row("anterior", t_legacy, legacy_tokens, chunker.max_tokens))
+            self.stdout.write(self._row("tokens", t_new, new_tokens, chunker.max_tokens))
+            self.stdout.write(
+                f"  max_tokens={chunker.max_tokens} overlap={chunker.overlap_tokens} "
+                f"cross_pages={chunker.cross_pages}"
+            )
+
+    @staticmethod
+    def _collect(paths):
+        out = []
+        for raw in paths:
+            path = Path(raw)
+            out.extend(sorted(path.glob("*.pdf")) if path.is_dir() else [path])
+        return out
+
+    @staticmethod
+    def _time(repeat, fn):
+        best = None
+        result = None
+        for _ in range(repeat):
+            t0 = perf_counter()
+            result = fn()
+            elapsed = (perf_counter() - t0) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    @staticmethod
+    def _row(label, ms, tokens, max_tokens):
+        if not tokens:
+            return f"  {label:<9} {ms:9.2f} ms   0 chunks"
+        over = sum(1 for n in tokens if n > max_tokens)
+        return (
+            f"  {label:<9} {ms:9.2f} ms {len(tokens):4d} chunks  "
+            f"tokens media={mean(tokens):.0f} max={max(tokens)}  "
+            f">{max_tokens} tokens: {over}"
+        )
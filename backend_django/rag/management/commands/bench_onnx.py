@@ -0,0 +1,148 @@
+from pathlib import Path
+from time import perf_counter
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+
+from rag.embeddings import onnx_backend
+from rag.embeddings.image_embeddings import CLIP_MODEL_NAME, _decode
+from rag.embeddings.text_embeddings import TEXT_EMBEDDING_MODEL, _clean
+from rag.pipeline.chunking import chunk_text
+from rag.pipeline.image_extractor import extract_images_from_pdf
+from rag.pipeline.text_extractor import extract_text_from_pdf
+
+BATCH_SIZES = (1, 64)
+
+
+def cosine(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True).clip(1e-12)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True).clip(1e-12)
+    return (a * b).sum(axis=1)
+
+
+class Command(BaseCommand):
+    help = (
+        "Paridad (coseno) y rendimiento (lotes de 1 y 64) de MiniLM/CLIP: PyTorch frente a ONNX int8, "
+        "sobre los PDFs de tests/files"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="*", help="PDFs o carpetas (por defecto tests/files)")
+        parser.add_argument("--models", default="text,image", help="text, image o ambos")
+        parser.add_argument("--samples", type=int, default=128, help="Entradas por modelo (se repiten si faltan)")
+        parser.add_argument("--repeat", type=int, default=3, help="Repeticiones por tamaño de lote")
+        parser.add_argument(
+            "--min-text-cosine", type=float, default=onnx_backend.PARITY_MIN_COSINE["text"],
+            help="Coseno mínimo exigido (texto)",
+        )
+        parser.add_argument(
+            "--min-image-cosine", type=float, default=onnx_backend.PARITY_MIN_COSINE["image"],
+            help="Coseno mínimo exigido (imagen)",
+        )
+
+    def handle(self, *args, **options):
+        from sentence_transformers import SentenceTransformer
+
+        pdfs = self._collect(options["paths"] or [Path(settings.BASE_DIR).parent / "tests" / "files"])
+        models = {m.strip() for m in options["models"].split(",") if m.strip()}
+        n = max(max(BATCH_SIZES), options["samples"])
+        failures = []
+
+        if "text" in models:
+            if not onnx_backend.text_exported(TEXT_EMBEDDING_MODEL):
+                raise CommandError("MiniLM no está exportado: python manage.py export_onnx --models text")
+            texts = self._texts(pdfs, n)
+            torch_model = SentenceTransformer(TEXT_EMBEDDING_MODEL, device="cpu")
+            onnx_model = onnx_backend.load_text_model(TEXT_EMBEDDING_MODEL)
+            failures += self._report(
+                f"text: {TEXT_EMBEDDING_MODEL} ({len(texts)} chunks)",
+                texts, torch_model, onnx_model, options["min_text_cosine"], options["repeat"],
+            )
+
+        if "image" in models:
+            if not onnx_backend.clip_exported(CLIP_MODEL_NAME):
+                raise CommandError("CLIP no está exportado: python manage.py export_onnx --models image")
+            images = self._images(pdfs, n)
+            torch_model = SentenceTransformer(CLIP_MODEL_NAME, device="cpu")
+            onnx_model = onnx_backend.load_clip_model(CLIP_MODEL_NAME)
+            failures += self._report(
+                f"image: {CLIP_MODEL_NAME} ({len(images)} imágenes)",
+                images, torch_model, onnx_model, options["min_image_cosine"], options["repeat"],
+            )
+
+        if failures:
+            raise CommandError("Paridad insuficiente: " + "; ".join(failures))
+
+    def _report(self, title, items, torch_model, onnx_model, min_cosine, repeat):
+        ref = np.asarray(torch_model.encode(items, batch_size=64))
+        got = np.asarray(onnx_model.encode(items, batch_size=64))
+        cos = cosine(ref, got)
+
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        self.stdout.write(
+            f"  paridad: coseno medio={cos.mean():.4f}  mínimo={cos.min():.4f}  "
+            f"p5={np.percentile(cos, 5):.4f}  (umbral {min_cosine})"
+        )
+        for batch in BATCH_SIZES:
+            t_torch = self._throughput(torch_model, items, batch, repeat)
+            t_onnx = self._throughput(onnx_model, items, batch, repeat)
+            self.stdout.write(
+                f"  lote={batch:<3d} torch={t_torch:8.1f}/s  onnx-int8={t_onnx:8.1f}/s  "
+                f"x{t_onnx / t_torch if t_torch else 0:4.1f}"
+            )
+        return [f"{title}: mínimo {cos.min():.4f} < {min_cosine}"] if cos.min() < min_cosine else []
+
+    @staticmethod
+    def _throughput(model, items, batch, repeat) -> float:
+        # Lote 1 = consulta (una pregunta); lote 64 = ingesta
+        items = items[:batch] if batch == 1 else items
+        model.encode(items[:batch], batch_size=batch)  # calentamiento
+        best = None
+        for _ in range(max(1, repeat)):
+            t0 = perf_counter()
+            if batch == 1:
+                for _ in range(32):
+                    model.encode(items, batch_size=1)
+                count = 32
+            else:
+                for start in range(0, len(items), batch):
+                    model.encode(items[start:start + batch], batch_size=batch)
+                count = len(items)
+            elapsed = perf_counter() - t0
+            best = elapsed if best is None else min(best, elapsed)
+        return count / best if best else 0.0
+
+    @staticmethod
+    def _texts(pdfs, n):
+        texts = []
+        for path in pdfs:
+            for page in extract_text_from_pdf(path.read_bytes()):
+                texts.extend(_clean(c) for c in chunk_text(page["text"]))
+        texts = [t for t in texts if t] or ["El informe anual recoge los ingresos por región y trimestre."]
+        return (texts * (n // len(texts) + 1))[:n]
+
+    @staticmethod
+    def _images(pdfs, n):
+        images = []
+        for path in pdfs:
+            for img in extract_images_from_pdf("bench", path.read_bytes()):
+                decoded = _decode(img["bytes"])
+                if decoded is not None:
+                    images.append(decoded)
+        if not images:
+            # Sin imágenes en los PDFs: ruido reproducible (la paridad sigue siendo válida)
+            rng = np.random.default_rng(0)
+            images = [
+                Image.fromarray(rng.integers(0, 255, (224, 224, 3), dtype=np.uint8)) for _ in range(8)
+            ]
+        return (images * (n // len(images) + 1))[:n]
+
+    @staticmethod
+    def _collect(paths):
+        out = []
+        for raw in paths:
+            path = Path(raw)
+            out.extend(sorted(path.glob("*.pdf")) if path.is_dir() else [path])
+        return out
@@ -0,0 +1,95 @@
+from collections import Counter
+from pathlib import Path
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from rag.pipeline.pdf_context import PdfContext
+from rag.pipeline.table_extractor import extract_tables_from_pdf
+
+# (detector, motor) a comparar; la referencia es Camelot sobre todas las páginas
+COMBOS = [
+    ("none", "camelot"),
+    ("rulings", "camelot"),
+    ("pymupdf", "camelot"),
+    ("rulings", "pymupdf"),
+    ("none", "pymupdf"),
+]
+
+
+class Command(BaseCommand):
+    help = "Compara tiempo y recall de los detectores/motores de tablas sobre los PDFs de tests/files"
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="*", help="PDFs o carpetas (por defecto tests/files)")
+        parser.add_argument("--repeat", type=int, default=1, help="Repeticiones por combinación")
+        parser.add_argument("--scale", type=int, default=1, help="Repite las páginas de cada PDF N veces")
+        parser.add_argument(
+            "--filler", type=int, default=0,
+            help="Páginas de solo texto intercaladas tras cada página (documento más realista)",
+        )
+
+    def handle(self, *args, **options):
+        pdfs = self._collect(options["paths"] or [Path(settings.BASE_DIR).parent / "tests" / "files"])
+        if not pdfs:
+            self.stderr.write("No se han encontrado PDFs.")
+            return
+
+        repeat = max(1, options["repeat"])
+        for path in pdfs:
+            pdf_bytes = self._scaled(path.read_bytes(), max(1, options["scale"]), max(0, options["filler"]))
+            num_pages = len(PdfContext(pdf_bytes))
+
+            results = {}
+            for detector, engine in COMBOS:
+                best, tables = None, []
+                for _ in range(repeat):
+                    t0 = perf_counter()
+                    tables = extract_tables_from_pdf(pdf_bytes, engine=engine, detector=detector)
+                    elapsed = (perf_counter() - t0) * 1000
+                    best = elapsed if best is None else min(best, elapsed)
+                results[(detector, engine)] = (best, tables)
+
+            ref_ms, ref_tables = results[COMBOS[0]]
+            reference = Counter((t["page"], t["df"].shape) for t in ref_tables)
+            ref_pages = Counter(t["page"] for t in ref_tables)
+
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{path.name} ({num_pages} págs, {len(ref_tables)} tablas de referencia)"
+            ))
+            for (detector, engine), (ms, tables) in results.items():
+                found = Counter((t["page"], t["df"].shape) for t in tables)
+                pages = Counter(t["page"] for t in tables)
+                exact = sum((found & reference).values())
+                by_page = sum((pages & ref_pages).values())
+                total = len(ref_tables) or 1
+                self.stdout.write(
+                    f"  {detector:<8} + {engine:<8} {ms:9.1f} ms  x{ref_ms / ms if ms else 0:5.1f}  "
+                    f"tablas={len(tables):3d}  recall(página)={by_page / total:5.0%}  "
+                    f"recall(página+forma)={exact / total:5.0%}"
+                )
+
+    @staticmethod
+    def _collect(paths):
+        out = []
+        for raw in paths:
+            path = Path(raw)
+            out.extend(sorted(path.glob("*.pdf")) if path.is_dir() else [path])
+        return out
+
+    @staticmethod
+    def _scaled(pdf_bytes: bytes, scale: int, filler: int) -> bytes:
+        if scale == 1 and not filler:
+            return pdf_bytes
+        import fitz  # PyMuPDF
+
+        src = fitz.open(stream=pdf_bytes, filetype="pdf")
+        out = fitz.open()
+        for _ in range(scale):
+            for p in range(len(src)):
+                out.insert_pdf(src, from_page=p, to_page=p)
+                for _ in range(filler):
+                    page = out.new_page()
+                    page.insert_textbox(page.rect + (72, 72, -72, -72), src[p].get_text("text"))
+        return out.tobytes()
@@ -0,0 +1,40 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rag.embeddings.client import EmbeddingServerError
+
+from rag.embeddings.server import (
+    EMBED_SERVER_BIND,
+    EMBED_SERVER_MAX_BATCH,
+    EMBED_SERVER_MAX_WAIT_MS,
+    EmbeddingServer,
+)
+
+
+class Command(BaseCommand):
+    help = "Servidor de embeddings compartido (texto e imagen) con micro-batching; usar con EMBED_MODE=server"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bind", default=EMBED_SERVER_BIND, help="host:puerto o ruta de socket Unix")
+        parser.add_argument("--no-preload", action="store_true", help="Cargar los modelos en la primera petición")
+
+    def handle(self, *args, **options):
+        logging.basicConfig(level=logging.INFO)
+        try:
+            server = EmbeddingServer(bind=options["bind"])
+        except EmbeddingServerError as e:
+            raise CommandError(str(e))
+
+        if not options["no_preload"]:
+            from rag.embeddings.image_embeddings import get_clip_model
+            from rag.embeddings.text_embeddings import get_text_embedding_model
+
+            get_text_embedding_model()
+            get_clip_model()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Servidor de embeddings en {options['bind']} "
+            f"(lote máx. {EMBED_SERVER_MAX_BATCH}, espera máx. {EMBED_SERVER_MAX_WAIT_MS} ms)"
+        ))
+        server.serve_forever()
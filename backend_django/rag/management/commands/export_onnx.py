@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rag.embeddings import onnx_backend
+from rag.embeddings.image_embeddings import CLIP_MODEL_NAME
+from rag.embeddings.text_embeddings import TEXT_EMBEDDING_MODEL
+
+
+class Command(BaseCommand):
+    help = "Exporta MiniLM y CLIP (visión) a ONNX int8 para EMBED_BACKEND=onnx"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--models", default="text,image", help="text, image o ambos (separados por comas)")
+        parser.add_argument("--force", action="store_true", help="Reexportar aunque ya exista")
+
+    def handle(self, *args, **options):
+        models = [m.strip() for m in options["models"].split(",") if m.strip()]
+        unknown = set(models) - {"text", "image"}
+        if unknown:
+            raise CommandError(f"Modelos desconocidos: {', '.join(sorted(unknown))}")
+
+        if "text" in models:
+            path = onnx_backend.export_text_model(TEXT_EMBEDDING_MODEL, force=options["force"])
+            self.stdout.write(self.style.SUCCESS(f"text: {TEXT_EMBEDDING_MODEL} -> {path}"))
+        if "image" in models:
+            path = onnx_backend.export_clip_model(CLIP_MODEL_NAME, force=options["force"])
+            self.stdout.write(self.style.SUCCESS(f"image: {CLIP_MODEL_NAME} -> {path}"))
+
+        self.stdout.write(
+            f"Activar con EMBED_BACKEND=onnx (cuantización {onnx_backend.ONNX_QUANT_CONFIG}, "
+            f"ONNX_MODEL_DIR={onnx_backend.ONNX_MODEL_DIR})"
+        )
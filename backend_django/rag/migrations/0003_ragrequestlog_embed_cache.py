@@ -0,0 +1,23 @@
+# Generated by Django 5.2.9 on 2026-10-17 03:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rag', '0002_ragrequestlog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ragrequestlog',
+            name='embed_cache_hit',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='ragrequestlog',
+            name='embed_saved_ms',
+            field=models.IntegerField(default=0),
+        ),
+    ]
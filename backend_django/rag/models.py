@@ -95,6 +95,9 @@ class RagRequestLog(models.Model):
     minio_ms = models.IntegerField(default=0)
     llm_ms = models.IntegerField(default=0)
     total_ms = models.IntegerField(default=0)
+    # LRU de vectores de pregunta: acierto y tiempo de embedding ahorrado
+    embed_cache_hit = models.BooleanField(default=False)
+    embed_saved_ms = models.IntegerField(default=0)
 
     api_pre_rag_ms = models.IntegerField(default=0)
     api_post_rag_ms = models.IntegerField(default=0)
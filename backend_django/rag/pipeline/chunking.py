@@ -1,19 +1,248 @@
-def chunk_text(text: str, max_len=500):
+# backend_django/rag/pipeline/chunking.py
+"""
+Chunking por tokens del modelo de embeddings activo.
+
+- Mide los chunks en tokens del tokenizer del modelo de texto (no en caracteres).
+- Corta en fronteras de frase y, si puede, de párrafo.
+- Solapamiento configurable (en tokens) entre chunks consecutivos.
+- Tiempo lineal: cada frase se tokeniza una sola vez y cada chunk se une una vez.
+- `Chunker` es incremental (feed por página), así que puede cruzar saltos de
+  página si CHUNK_CROSS_PAGES=true.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import re
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "200"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "40"))
+CHUNK_CROSS_PAGES = os.getenv("CHUNK_CROSS_PAGES", "false").lower() == "true"
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?…])[\"'»”)\]]*\s+(?=[\"'«“(¿¡]?[A-ZÁÉÍÓÚÜÑ0-9])")
+
+
+@dataclass
+class Chunk:
+    text: str
+    page: int                 # página (0-based) donde empieza el chunk
+    pages: Tuple[int, ...]    # todas las páginas que toca
+    n_tokens: int
+
+
+class TokenCounter:
+    """
+    Cuenta y trocea por tokens con un tokenizer HF (fast). Sin tokenizer, usa palabras.
+    """
+
+    def __init__(self, tokenizer: Any = None):
+        self.tokenizer = tokenizer
+
+    def counts(self, texts: List[str]) -> List[int]:
+        if not texts:
+            return []
+        if self.tokenizer is None:
+            return [len(t.split()) for t in texts]
+        enc = self.tokenizer(texts, add_special_tokens=False)
+        return [len(ids) for ids in enc["input_ids"]]
+
+    def split(self, text: str, max_tokens: int) -> List[Tuple[str, int]]:
+        """
+        Parte un texto más largo que `max_tokens` en trozos de como mucho `max_tokens`.
+        """
+        if self.tokenizer is None:
+            words = text.split()
+            return [
+                (" ".join(words[i:i + max_tokens]), len(words[i:i + max_tokens]))
+                for i in range(0, len(words), max_tokens)
+            ]
+
+        enc = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+        offsets = enc["offset_mapping"]
+        out = []
+        for i in range(0, len(offsets), max_tokens):
+            window = offsets[i:i + max_tokens]
+            piece = text[window[0][0]:window[-1][1]].strip()
+            if piece:
+                out.append((piece, len(window)))
+        return out
+
+
+def _text_tokenizer():
+    # Solo el tokenizer (y max_seq_length) del modelo de texto: nunca el modelo
+    from rag.embeddings.text_embeddings import get_text_tokenizer
+
+    try:
+        return get_text_tokenizer()
+    except Exception:
+        logger.warning("[CHUNKING] Tokenizer no disponible; se cuentan palabras.", exc_info=True)
+        return None, None
+
+
+def default_token_counter() -> TokenCounter:
+    """
+    Tokenizer del modelo de embeddings de texto activo.
+    """
+    return TokenCounter(_text_tokenizer()[0])
+
+
+def default_max_tokens() -> int:
     """
-    Crea chunks simples de longitud ~500 caracteres.
+    CHUNK_MAX_TOKENS, acotado a la ventana del modelo (menos [CLS]/[SEP]).
     """
-    chunks = []
-    current = []
+    seq = _text_tokenizer()[1]
+    if seq:
+        return max(1, min(CHUNK_MAX_TOKENS, int(seq) - 2))
+    return CHUNK_MAX_TOKENS
 
-    words = text.split()
 
-    for word in words:
-        current.append(word)
-        if len(" ".join(current)) > max_len:
-            chunks.append(" ".join(current))
-            current = []
+def split_sentences(text: str) -> List[Tuple[str, bool]]:
+    """
+    Devuelve [(frase, termina_parrafo)] normalizando los saltos de línea internos.
+    """
+    out: List[Tuple[str, bool]] = []
+    for para in _PARAGRAPH_RE.split(text or ""):
+        para = " ".join(para.split())
+        if not para:
+            continue
+        sentences = [s for s in _SENTENCE_END_RE.split(para) if s]
+        for i, s in enumerate(sentences):
+            out.append((s, i == len(sentences) - 1))
+    return out
+
+
+class Chunker:
+    """
+    Chunker incremental: `feed(page, text)` devuelve los chunks ya completos y
+    `flush()` el último. Con `cross_pages=False` cada página se cierra por separado.
+    """
+
+    def __init__(
+        self,
+        max_tokens: Optional[int] = None,
+        overlap_tokens: Optional[int] = None,
+        counter: Optional[TokenCounter] = None,
+        cross_pages: Optional[bool] = None,
+    ):
+        self.counter = counter if counter is not None else default_token_counter()
+        self.max_tokens = max(1, max_tokens if max_tokens is not None else default_max_tokens())
+        overlap = CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+        self.overlap_tokens = max(0, min(overlap, self.max_tokens // 2))
+        self.cross_pages = CHUNK_CROSS_PAGES if cross_pages is None else cross_pages
+
+        # (texto, n_tokens, página, termina_parrafo, es_solape)
+        self._buf: Deque[Tuple[str, int, int, bool, bool]] = deque()
+        self._buf_tokens = 0
+        self._buf_fresh = 0  # nº de segmentos que no son solape
+
+    def feed(self, page: int, text: str) -> List[Chunk]:
+        out: List[Chunk] = []
+        sentences = split_sentences(text)
+        counts = self.counter.counts([s for s, _ in sentences])
+
+        for (sentence, para_end), n in zip(sentences, counts):
+            pieces = [(sentence, n)] if n <= self.max_tokens else self.counter.split(sentence, self.max_tokens)
+            for i, (piece, n_piece) in enumerate(pieces):
+                self._push(piece, n_piece, page, para_end and i == len(pieces) - 1, out)
+
+        if not self.cross_pages:
+            out.extend(self.flush())
+        return out
+
+    def flush(self) -> List[Chunk]:
+        out: List[Chunk] = []
+        if self._buf_fresh:
+            out.append(self._make_chunk(list(self._buf)))
+        self._reset([])
+        return out
 
-    if current:
-        chunks.append(" ".join(current))
+    # ---------- internos ----------
 
-    return chunks
+    def _push(self, text: str, n: int, page: int, para_end: bool, out: List[Chunk]) -> None:
+        while self._buf and self._buf_tokens + n > self.max_tokens:
+            if self._buf_fresh:
+                self._emit(out)
+            else:
+                # si el solape + la frase nueva no caben, se sacrifica solape
+                self._drop_left()
+        self._buf.append((text, n, page, para_end, False))
+        self._buf_tokens += n
+        self._buf_fresh += 1
+
+    def _emit(self, out: List[Chunk]) -> None:
+        segs = list(self._buf)
+
+        # Preferir cortar en fin de párrafo si deja al menos medio chunk
+        cut = len(segs)
+        acc = 0
+        best = None
+        for i, seg in enumerate(segs):
+            acc += seg[1]
+            if seg[3] and i < len(segs) - 1 and acc >= self.max_tokens // 2:
+                best = i + 1
+        if best is not None:
+            cut = best
+
+        head, tail = segs[:cut], segs[cut:]
+        if any(not seg[4] for seg in head):
+            out.append(self._make_chunk(head))
+
+        # el resto tras un fin de párrafo abre el nuevo chunk (sin solape)
+        self._reset(tail if tail else self._overlap_tail(head))
+
+    def _reset(self, segs: List[Tuple[str, int, int, bool, bool]]) -> None:
+        self._buf = deque(segs)
+        self._buf_tokens = sum(seg[1] for seg in segs)
+        self._buf_fresh = sum(1 for seg in segs if not seg[4])
+
+    def _overlap_tail(self, segs: List[Tuple[str, int, int, bool, bool]]) -> List[Tuple[str, int, int, bool, bool]]:
+        if not self.overlap_tokens:
+            return []
+        tail: List[Tuple[str, int, int, bool, bool]] = []
+        acc = 0
+        for seg in reversed(segs):
+            if acc + seg[1] > self.overlap_tokens:
+                break
+            tail.append((seg[0], seg[1], seg[2], seg[3], True))
+            acc += seg[1]
+        tail.reverse()
+        return tail
+
+    def _drop_left(self) -> None:
+        seg = self._buf.popleft()
+        self._buf_tokens -= seg[1]
+        self._buf_fresh -= 0 if seg[4] else 1
+
+    @staticmethod
+    def _make_chunk(segs: List[Tuple[str, int, int, bool, bool]]) -> Chunk:
+        parts: List[str] = []
+        for i, seg in enumerate(segs):
+            parts.append(seg[0])
+            if i < len(segs) - 1:
+                parts.append("\n\n" if seg[3] else " ")
+        pages = tuple(sorted({seg[2] for seg in segs}))
+        return Chunk(
+            text="".join(parts),
+            page=segs[0][2],
+            pages=pages,
+            n_tokens=sum(seg[1] for seg in segs),
+        )
+
+
+def chunk_text(
+    text: str,
+    max_tokens: Optional[int] = None,
+    overlap_tokens: Optional[int] = None,
+    counter: Optional[TokenCounter] = None,
+) -> List[str]:
+    """
+    Chunks de un único texto (sin estado entre llamadas).
+    """
+    chunker = Chunker(max_tokens=max_tokens, overlap_tokens=overlap_tokens, counter=counter, cross_pages=False)
+    return [c.text for c in chunker.feed(0, text)]
@@ -0,0 +1,112 @@
+# backend_django/rag/pipeline/fingerprint.py
+"""
+Huellas por página y modalidad para el reindexado incremental.
+
+Cada página tiene una huella por modalidad:
+  - text:  texto extraído + configuración de chunking/embeddings
+  - table: content streams de la página + configuración de tablas
+  - image: streams de sus imágenes + configuración de imágenes
+
+Así, cambiar solo el chunker reprocesa el texto de todas las páginas pero no
+vuelve a tocar imágenes ni tablas, y editar unas pocas páginas solo reprocesa esas.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Set, Union
+
+from rag.pipeline.pdf_context import PdfContext
+
+MODALITIES = ("text", "table", "image")
+
+
+def _config_digest(config: Dict[str, Any]) -> bytes:
+    return json.dumps(config or {}, sort_keys=True, default=str).encode("utf-8")
+
+
+def compute_page_fingerprints(
+    pdf: Union[bytes, PdfContext],
+    configs: Dict[str, Dict[str, Any]],
+    occurrences: Optional[Dict[int, List[int]]] = None,
+) -> Dict[str, Dict[str, str]]:
+    """
+    Devuelve {"<page_idx>": {"text": sha, "table": sha, "image": sha}} (page_idx 0-based, clave str
+    para que sobreviva a JSONField).
+
+    Con `occurrences` ({xref: [page_idx]}), la huella de imagen de la página
+    canónica incluye también las páginas donde se repite la imagen, de modo que
+    si cambian se actualiza su punto.
+
+    Con un PdfContext, el texto de cada página queda cacheado para la extracción.
+    """
+    ctx = PdfContext.of(pdf)
+    occurrences = occurrences or {}
+    doc = ctx.doc
+    cfg = {m: _config_digest(configs.get(m, {})) for m in MODALITIES}
+
+    out: Dict[str, Dict[str, str]] = {}
+    for page_idx in range(len(doc)):
+        h_text = hashlib.sha256(cfg["text"])
+        h_text.update(ctx.text(page_idx).encode("utf-8"))
+
+        with ctx.timed("fingerprint"):
+            out[str(page_idx)] = {
+                "text": h_text.hexdigest(),
+                "table": _table_digest(ctx, page_idx, cfg["table"]),
+                "image": _image_digest(ctx, page_idx, cfg["image"], occurrences),
+            }
+
+    return out
+
+
+def _table_digest(ctx: PdfContext, page_idx: int, cfg: bytes) -> str:
+    h_table = hashlib.sha256(cfg)
+    h_table.update(ctx.page(page_idx).read_contents() or b"")
+    return h_table.hexdigest()
+
+
+def _image_digest(ctx: PdfContext, page_idx: int, cfg: bytes, occurrences: Dict[int, List[int]]) -> str:
+    h_image = hashlib.sha256(cfg)
+    for img_idx, img_info in enumerate(ctx.images(page_idx)):
+        xref = img_info[0]
+        seen_on = occurrences.get(xref) or [page_idx]
+        if seen_on[0] != page_idx:
+            h_image.update(f"{img_idx}:dup".encode("utf-8"))
+            continue
+        try:
+            stream = ctx.doc.xref_stream_raw(xref) or b""
+        except Exception:
+            stream = str(xref).encode("utf-8")
+        h_image.update(f"{img_idx}:".encode("utf-8"))
+        h_image.update(hashlib.sha256(stream).digest())
+        h_image.update(json.dumps(seen_on).encode("utf-8"))
+    return h_image.hexdigest()
+
+
+def plan_reprocessing(
+    new: Dict[str, Dict[str, str]],
+    previous: Optional[Dict[str, Dict[str, str]]],
+) -> Dict[int, Set[str]]:
+    """
+    Devuelve {page_idx: {modalidades a reprocesar}} para las páginas con algún cambio.
+    Sin huellas previas se reprocesa todo.
+    """
+    previous = previous or {}
+    plan: Dict[int, Set[str]] = {}
+    for key, fps in new.items():
+        old = previous.get(key) or {}
+        changed = {m for m in MODALITIES if fps.get(m) != old.get(m)}
+        if changed:
+            plan[int(key)] = changed
+    return plan
+
+
+def removed_pages(
+    new: Dict[str, Dict[str, str]],
+    previous: Optional[Dict[str, Dict[str, str]]],
+) -> list[int]:
+    """
+    Páginas que existían en la ingesta anterior y ya no están en el PDF.
+    """
+    return sorted(int(k) for k in (previous or {}) if k not in new)
@@ -1,49 +1,255 @@
+import hashlib
+import logging
+import os
+from io import BytesIO
+from time import perf_counter
+
 import fitz  # PyMuPDF
-from typing import List, Dict, Any
+import numpy as np
+from PIL import Image
+from typing import List, Dict, Any, Optional, Sequence, Union
+
+from rag.pipeline.pdf_context import PdfContext
+
+logger = logging.getLogger(__name__)
+
+# Filtro de imágenes triviales (iconos, separadores, fondos lisos). La entropía
+# por defecto es baja a propósito: los diagramas de línea sobre blanco rondan 0.3
+IMAGE_MIN_SIDE = int(os.getenv("IMAGE_MIN_SIDE", "32"))
+IMAGE_MIN_PIXELS = int(os.getenv("IMAGE_MIN_PIXELS", "4096"))
+IMAGE_MIN_ENTROPY = float(os.getenv("IMAGE_MIN_ENTROPY", "0.1"))
+
+# passthrough: guarda el stream original si ya es un formato web (JPEG RGB/gris)
+# png: convierte siempre a PNG vía Pixmap (comportamiento anterior)
+IMAGE_EXTRACT_MODE = os.getenv("IMAGE_EXTRACT_MODE", "passthrough").lower()
+# Imágenes passthrough por llamada que además se convierten a PNG para estimar el ahorro
+IMAGE_SAVINGS_SAMPLE = int(os.getenv("IMAGE_SAVINGS_SAMPLE", "2"))
+
+
+def image_filter_config() -> Dict[str, Any]:
+    return {
+        "min_side": IMAGE_MIN_SIDE,
+        "min_pixels": IMAGE_MIN_PIXELS,
+        "min_entropy": IMAGE_MIN_ENTROPY,
+    }
+
+
+def is_too_small(width: int, height: int) -> bool:
+    return min(width, height) < IMAGE_MIN_SIDE or width * height < IMAGE_MIN_PIXELS
+
+
+def pixmap_entropy(pix: fitz.Pixmap) -> float:
+    """
+    Entropía (bits) del histograma de grises; ~0 para imágenes planas o casi planas.
+    """
+    try:
+        gray = fitz.Pixmap(pix, 0) if pix.alpha else pix
+        if gray.colorspace is None or gray.colorspace.n != 1:
+            gray = fitz.Pixmap(fitz.csGRAY, gray)
+    except Exception:
+        # máscaras y espacios de color raros: no se filtran por entropía
+        return float("inf")
+
+    return _histogram_entropy(gray.samples)
+
+
+def _histogram_entropy(samples: bytes) -> float:
+    hist = np.bincount(np.frombuffer(samples, dtype=np.uint8), minlength=256)
+    total = hist.sum()
+    if not total:
+        return 0.0
+    p = hist[hist > 0] / total
+    return float(-(p * np.log2(p)).sum())
+
+
+def image_occurrences(pdf: Union[bytes, PdfContext]) -> Dict[int, List[int]]:
+    """
+    {xref: [page_idx, ...]} con todas las páginas (0-based) donde aparece cada imagen.
+    La primera página es la canónica: ahí se extrae, se sube y se vectoriza.
+    """
+    return PdfContext.of(pdf).image_occurrences()
+
+
+def _gray(image_bytes: bytes) -> Optional[Image.Image]:
+    try:
+        img = Image.open(BytesIO(image_bytes))
+        # JPEG: decodifica directamente a escala reducida (mucho más barato)
+        img.draft("L", (256, 256))
+        return img.convert("L")
+    except Exception:
+        return None
+
+
+def _dhash(gray: Image.Image) -> str:
+    px = np.asarray(gray.resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    bits = (px[:, 1:] > px[:, :-1]).flatten()
+    return f"{int(''.join('1' if b else '0' for b in bits), 2):016x}"
+
 
-from integrations.minio_client import upload_bytes
+def perceptual_hash(image_bytes: bytes) -> Optional[str]:
+    """
+    dHash de 64 bits (hex): estable frente a reescalados y recompresiones.
+    """
+    gray = _gray(image_bytes)
+    return _dhash(gray) if gray is not None else None
 
 
-def extract_images_from_pdf(doc_id: str, pdf_bytes: bytes) -> List[Dict[str, Any]]:
+def _passthrough_stream(doc: fitz.Document, img_info: tuple) -> Optional[bytes]:
+    """
+    Stream original de la imagen si se puede servir tal cual: JPEG sin máscara
+    de transparencia, sin /Decode y con 1 o 3 componentes (gris/RGB, también
+    ICCBased). Si no, None.
+    """
+    xref, smask, filters = img_info[0], img_info[1], img_info[8]
+    if IMAGE_EXTRACT_MODE != "passthrough" or smask or filters != "DCTDecode":
+        return None
+    try:
+        if doc.xref_get_key(xref, "Decode")[0] != "null":
+            return None
+        # Para DCTDecode, extract_image devuelve el stream tal cual, sin recodificar
+        info = doc.extract_image(xref)
+    except Exception:
+        return None
+    if not info or info.get("ext") not in ("jpeg", "jpg") or info.get("colorspace") not in (1, 3):
+        return None
+    raw = info.get("image")
+    return raw if raw and raw[:2] == b"\xff\xd8" else None
+
+
+def _pixmap(doc: fitz.Document, xref: int) -> fitz.Pixmap:
+    pix = fitz.Pixmap(doc, xref)
+
+    # Convertir a RGB si viene en CMYK/alpha
+    if pix.n > 4:
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+    return pix
+
+
+def extract_images_from_pdf(
+    doc_id: str,
+    pdf: Union[bytes, PdfContext],
+    pages: Optional[Sequence[int]] = None,
+    occurrences: Optional[Dict[int, List[int]]] = None,
+) -> List[Dict[str, Any]]:
     """
     Extrae imágenes reales del PDF y devuelve una lista de dicts:
-      - bytes: PNG bytes válidos
-      - image_path: key en MinIO
-      - page: número de página
+      - bytes: imagen codificada (JPEG original o PNG)
+      - ext / content_type: formato de `bytes`
+      - image_path: key en MinIO (la subida la hace la ingesta)
+      - page: número de página (canónica)
+      - pages: todas las páginas donde aparece la imagen
+      - phash: hash perceptual para deduplicar entre documentos
+      - sha256, width, height: confirman que dos imágenes con el mismo
+        phash son de verdad la misma antes de reutilizarla
+      - stats: modo (passthrough/png), ms de extracción y, en una muestra,
+        tamaño y coste de la conversión a PNG evitada
       - content: opcional (caption vacío por ahora)
+    Si se pasa `pages`, solo se procesan esas páginas (índices 0-based absolutos).
+    `pdf` puede ser el PDF en bytes o un PdfContext ya abierto (sin re-parsear).
+
+    Cada xref se extrae una sola vez, en su página canónica (ver
+    `image_occurrences`); en el resto de páginas se omite.
+
+    Con IMAGE_EXTRACT_MODE=passthrough los JPEG aptos para web se guardan sin
+    recodificar; el resto se convierte a PNG.
+
+    Las imágenes por debajo de IMAGE_MIN_SIDE / IMAGE_MIN_PIXELS o de
+    IMAGE_MIN_ENTROPY se descartan antes de convertirlas.
     """
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    ctx = PdfContext.of(pdf)
+    if occurrences is None:
+        occurrences = ctx.image_occurrences()
+
+    page_range = pages if pages is not None else range(len(ctx))
+
+    with ctx.timed("images"):
+        out, skipped = _extract_pages(doc_id, ctx, page_range, occurrences)
+
+    if skipped:
+        logger.info("[PDF_INGEST] doc_id=%s: %d imágenes triviales descartadas.", doc_id, skipped)
+
+    return out
+
+
+def _extract_pages(
+    doc_id: str,
+    ctx: PdfContext,
+    page_range: Sequence[int],
+    occurrences: Dict[int, List[int]],
+) -> tuple[List[Dict[str, Any]], int]:
+    doc = ctx.doc
     out: List[Dict[str, Any]] = []
+    skipped = 0
+    sampled = 0
 
-    for page_idx in range(len(doc)):
-        page = doc[page_idx]
-        images = page.get_images(full=True)  # lista de xrefs
+    for page_idx in page_range:
+        images = ctx.images(page_idx)  # lista de xrefs
 
         for img_idx, img_info in enumerate(images):
-            xref = img_info[0]
-            pix = fitz.Pixmap(doc, xref)
+            xref, width, height = img_info[0], img_info[2], img_info[3]
 
-            # Convertir a RGB si viene en CMYK/alpha
-            if pix.n > 4:
-                pix = fitz.Pixmap(fitz.csRGB, pix)
+            seen_on = occurrences.get(xref) or [page_idx]
+            if seen_on[0] != page_idx:
+                continue  # repetida: ya se extrae en su página canónica
 
-            png_bytes = pix.tobytes("png")
-            if not png_bytes:
+            # El tamaño viene en el diccionario de la imagen: sin decodificar nada
+            if is_too_small(width, height):
+                skipped += 1
                 continue
 
-            image_path = f"{doc_id}/images/page_{page_idx+1}_img_{img_idx+1}.png"
+            t0 = perf_counter()
+            raw = _passthrough_stream(doc, img_info)
+            stats: Dict[str, Any]
 
-            # Subir a MinIO (opcional, pero normalmente lo quieres)
-            upload_bytes(image_path, png_bytes, content_type="image/png")
+            if raw is not None:
+                gray = _gray(raw)
+                if gray is None:
+                    raw = None  # JPEG que PIL no entiende: se convierte
+                elif IMAGE_MIN_ENTROPY > 0 and _histogram_entropy(gray.tobytes()) < IMAGE_MIN_ENTROPY:
+                    skipped += 1
+                    continue
+
+            if raw is not None:
+                data, ext, content_type = raw, "jpg", "image/jpeg"
+                phash = _dhash(gray)
+                stats = {"mode": "passthrough", "ms": (perf_counter() - t0) * 1000}
+
+                if sampled < IMAGE_SAVINGS_SAMPLE:
+                    # Muestra: cuánto habría costado la conversión a PNG
+                    sampled += 1
+                    t1 = perf_counter()
+                    png = _pixmap(doc, xref).tobytes("png")
+                    stats["png_sample"] = {"bytes": len(png), "ms": (perf_counter() - t1) * 1000}
+            else:
+                pix = _pixmap(doc, xref)
+                if IMAGE_MIN_ENTROPY > 0 and pixmap_entropy(pix) < IMAGE_MIN_ENTROPY:
+                    skipped += 1
+                    continue
+
+                data, ext, content_type = pix.tobytes("png"), "png", "image/png"
+                phash = perceptual_hash(data)
+                stats = {"mode": "png", "ms": (perf_counter() - t0) * 1000}
+
+            if not data:
+                continue
 
             out.append(
                 {
-                    "bytes": png_bytes,
-                    "image_path": image_path,
+                    "bytes": data,
+                    "ext": ext,
+                    "content_type": content_type,
+                    "image_path": f"{doc_id}/images/page_{page_idx+1}_img_{img_idx+1}.{ext}",
                     "page": page_idx + 1,
+                    "pages": [p + 1 for p in seen_on],
+                    "xref": xref,
+                    "phash": phash,
+                    "sha256": hashlib.sha256(data).hexdigest(),
+                    "width": width,
+                    "height": height,
+                    "stats": stats,
                     "content": "",
                     "modality": "image",
                 }
             )
 
-    return out
+    return out, skipped
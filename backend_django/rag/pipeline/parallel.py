@@ -0,0 +1,161 @@
+# backend_django/rag/pipeline/parallel.py
+"""
+Extracción multimodal por lotes de páginas, en serie o en paralelo.
+
+Las páginas a procesar se agrupan en lotes y cada lote se procesa (texto,
+imágenes y tablas Camelot) en el propio proceso o en un proceso del pool. Los
+lotes se entregan en orden, con la misma numeración de páginas y las mismas
+rutas de assets que una pasada sobre el documento entero.
+
+En serie todos los lotes comparten el PdfContext del documento; en paralelo
+cada worker abre su propio contexto una sola vez y devuelve sus métricas en
+cada lote ("metrics").
+"""
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Deque, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from rag.pipeline.pdf_context import PdfContext
+from rag.pipeline.image_extractor import extract_images_from_pdf, image_occurrences
+from rag.pipeline.table_extractor import extract_tables_from_pdf
+from rag.pipeline.text_extractor import extract_text_from_pdf
+
+logger = logging.getLogger(__name__)
+
+INGEST_PARALLEL = os.getenv("INGEST_PARALLEL", "false").lower() == "true"
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "0")) or (os.cpu_count() or 1)
+INGEST_PAGES_PER_TASK = int(os.getenv("INGEST_PAGES_PER_TASK", "8"))
+
+# Estado por proceso del pool: el PDF (y el mapa de imágenes repetidas) se
+# envía y se parsea una vez por worker
+_worker_ctx: Optional[PdfContext] = None
+_worker_occurrences: Optional[Dict[int, List[int]]] = None
+
+
+def _init_worker(pdf_bytes: bytes, occurrences: Optional[Dict[int, List[int]]] = None) -> None:
+    global _worker_ctx, _worker_occurrences
+    _worker_ctx = PdfContext(pdf_bytes)
+    _worker_occurrences = occurrences
+
+
+# Unidad de trabajo: [(page_idx, ("text", "table", "image")), ...]
+PageWork = List[Tuple[int, Tuple[str, ...]]]
+
+ALL_MODALITIES = ("text", "table", "image")
+
+
+def _extract_range(
+    doc_id: str,
+    work: PageWork,
+    ctx: Optional[PdfContext] = None,
+    occurrences: Optional[Dict[int, List[int]]] = None,
+) -> Dict[str, Any]:
+    in_worker = ctx is None
+    if in_worker:
+        ctx = _worker_ctx
+        occurrences = _worker_occurrences
+    snap = ctx.snapshot()
+
+    def pages_for(modality: str) -> List[int]:
+        return [p for p, mods in work if modality in mods]
+
+    out = {
+        "work": work,
+        "pages": extract_text_from_pdf(ctx, pages=pages_for("text")),
+        "images": extract_images_from_pdf(doc_id, ctx, pages=pages_for("image"), occurrences=occurrences),
+        "tables": extract_tables_from_pdf(ctx, pages=pages_for("table")),
+    }
+    if in_worker:
+        out["metrics"] = ctx.since(snap)
+    return out
+
+
+def split_work(work: PageWork, pages_per_task: int) -> List[PageWork]:
+    size = max(1, pages_per_task)
+    return [work[i:i + size] for i in range(0, len(work), size)]
+
+
+def can_fork_workers() -> bool:
+    # Los hijos del pool prefork de Celery son daemon y no pueden crear procesos
+    return not multiprocessing.current_process().daemon
+
+
+def iter_page_batches(
+    doc_id: str,
+    pdf: Union[bytes, PdfContext],
+    parallel: bool = False,
+    workers: Optional[int] = None,
+    pages_per_task: Optional[int] = None,
+    plan: Optional[Dict[int, Set[str]]] = None,
+    occurrences: Optional[Dict[int, List[int]]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Generador de lotes de páginas extraídas, en orden de página:
+      {"work": [(page_idx, modalidades)], "pages": [...], "images": [...], "tables": [...]}
+
+    `plan` ({page_idx: {modalidades}}) limita la extracción a las páginas y
+    modalidades que han cambiado; sin plan se extrae todo el documento.
+    `occurrences` ({xref: [page_idx]}, ver image_extractor.image_occurrences)
+    se calcula una vez por documento y se comparte con todos los lotes.
+
+    En modo paralelo hay como mucho `workers` lotes en vuelo, de modo que la
+    memoria depende del tamaño de lote y no del tamaño del documento.
+    """
+    workers = workers or INGEST_WORKERS
+    pages_per_task = pages_per_task or INGEST_PAGES_PER_TASK
+    ctx = PdfContext.of(pdf)
+
+    if plan is None:
+        num_pages = len(ctx)
+        work: PageWork = [(p, ALL_MODALITIES) for p in range(num_pages)]
+    else:
+        work = [(p, tuple(m for m in ALL_MODALITIES if m in plan[p])) for p in sorted(plan)]
+
+    tasks = split_work(work, pages_per_task)
+    if occurrences is None and any("image" in mods for _, mods in work):
+        occurrences = image_occurrences(ctx)
+
+    if parallel and len(tasks) > 1 and workers > 1 and not can_fork_workers():
+        logger.warning("[PDF_INGEST] Proceso daemon: extracción paralela no disponible, se usa modo serie.")
+        parallel = False
+
+    if parallel and len(tasks) > 1 and workers > 1:
+        logger.info(
+            "[PDF_INGEST] Extracción paralela: %d páginas en %d lotes con %d workers",
+            len(work), len(tasks), min(workers, len(tasks)),
+        )
+        yield from _iter_pool(doc_id, ctx.pdf_bytes, tasks, min(workers, len(tasks)), occurrences)
+    else:
+        for t in tasks:
+            yield _extract_range(doc_id, t, ctx=ctx, occurrences=occurrences)
+
+
+def _iter_pool(
+    doc_id: str,
+    pdf_bytes: bytes,
+    tasks: List[PageWork],
+    workers: int,
+    occurrences: Optional[Dict[int, List[int]]] = None,
+) -> Iterator[Dict[str, Any]]:
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(pdf_bytes, occurrences),
+    ) as ex:
+        pending = iter(tasks)
+        inflight: Deque[Future] = deque(
+            ex.submit(_extract_range, doc_id, t) for t in islice(pending, workers)
+        )
+        while inflight:
+            res = inflight.popleft().result()
+            nxt = next(pending, None)
+            if nxt is not None:
+                inflight.append(ex.submit(_extract_range, doc_id, nxt))
+            yield res
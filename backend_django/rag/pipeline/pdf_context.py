@@ -0,0 +1,149 @@
+# backend_django/rag/pipeline/pdf_context.py
+"""
+Contexto compartido de un PDF: se parsea una vez y todos los extractores
+(huellas, texto, imágenes, tablas) trabajan sobre el mismo `fitz.Document`.
+
+- Texto y lista de imágenes por página se calculan una vez y se cachean.
+- Camelot recibe un PDF con solo las páginas que tiene que analizar.
+- Lleva la cuenta del tiempo por etapa y de los re-parseos evitados.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Union
+
+import fitz  # PyMuPDF
+
+
+class PdfContext:
+    def __init__(self, pdf_bytes: bytes):
+        self.pdf_bytes = pdf_bytes
+        self.timings: Dict[str, float] = defaultdict(float)
+        # reparses_avoided: veces que el pipeline anterior habría vuelto a parsear el PDF
+        # camelot_bytes_avoided: bytes que Camelot ya no tiene que leer gracias a subset_pdf
+        self.counters: Dict[str, int] = defaultdict(int)
+        # Incidencias por página (p. ej. tablas descartadas por tiempo o memoria)
+        self.issues: List[Dict[str, Any]] = []
+
+        with self.timed("open"):
+            self.doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        self.counters["opens"] += 1
+
+        self._text: Dict[int, str] = {}
+        self._images: Dict[int, list] = {}
+        self._occurrences: Optional[Dict[int, List[int]]] = None
+
+    @classmethod
+    def of(cls, pdf: Union[bytes, "PdfContext"]) -> "PdfContext":
+        """
+        Acepta bytes (compatibilidad) o un contexto ya abierto.
+        """
+        if isinstance(pdf, PdfContext):
+            pdf.counters["reparses_avoided"] += 1
+            return pdf
+        return cls(pdf)
+
+    def __len__(self) -> int:
+        return len(self.doc)
+
+    @contextmanager
+    def timed(self, stage: str) -> Iterator[None]:
+        t0 = perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] += (perf_counter() - t0) * 1000
+
+    # ---------- por página ----------
+
+    def page(self, page_idx: int) -> fitz.Page:
+        return self.doc[page_idx]
+
+    def text(self, page_idx: int) -> str:
+        if page_idx in self._text:
+            self.counters["text_cache_hits"] += 1
+            return self._text[page_idx]
+        with self.timed("text"):
+            text = self.doc[page_idx].get_text("text")
+        self._text[page_idx] = text
+        self.counters["text_pages"] += 1
+        return text
+
+    def images(self, page_idx: int) -> list:
+        if page_idx not in self._images:
+            self._images[page_idx] = self.doc[page_idx].get_images(full=True)
+        return self._images[page_idx]
+
+    # ---------- documento ----------
+
+    def image_occurrences(self) -> Dict[int, List[int]]:
+        """
+        {xref: [page_idx, ...]} con las páginas (0-based) donde aparece cada imagen.
+        """
+        if self._occurrences is None:
+            out: Dict[int, List[int]] = {}
+            for page_idx in range(len(self.doc)):
+                for img_info in self.images(page_idx):
+                    pages = out.setdefault(img_info[0], [])
+                    if not pages or pages[-1] != page_idx:
+                        pages.append(page_idx)
+            self._occurrences = out
+        return self._occurrences
+
+    def subset_pdf(self, pages: Sequence[int]) -> bytes:
+        """
+        PDF con solo `pages` (0-based, en ese orden) para herramientas que leen
+        de fichero, como Camelot.
+        """
+        with self.timed("subset"):
+            if list(pages) == list(range(len(self.doc))):
+                return self.pdf_bytes
+            sub = fitz.open()
+            for p in pages:
+                sub.insert_pdf(self.doc, from_page=p, to_page=p)
+            data = sub.tobytes()
+        self.counters["camelot_bytes_avoided"] += max(0, len(self.pdf_bytes) - len(data))
+        return data
+
+    # ---------- métricas ----------
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"timings": dict(self.timings), "counters": dict(self.counters), "issues": len(self.issues)}
+
+    def since(self, snap: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Métricas acumuladas desde `snap` (para devolverlas desde un worker del pool).
+        """
+        return {
+            "timings": {k: v - snap["timings"].get(k, 0.0) for k, v in self.timings.items()},
+            "counters": {k: v - snap["counters"].get(k, 0) for k, v in self.counters.items()},
+            "issues": self.issues[snap["issues"]:],
+        }
+
+    def absorb(self, metrics: Optional[Dict[str, Any]]) -> None:
+        """
+        Suma las métricas de otro contexto (workers del pool) a las de este.
+        """
+        for k, v in (metrics or {}).get("timings", {}).items():
+            self.timings[k] += v
+        for k, v in (metrics or {}).get("counters", {}).items():
+            self.counters[k] += v
+        self.issues.extend((metrics or {}).get("issues", []))
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Tiempos por etapa (ms) y ahorro estimado: cada re-parseo evitado vale lo
+        que costó abrir el documento, y cada texto cacheado su media de extracción.
+        """
+        opens = max(1, self.counters["opens"])
+        open_ms = self.timings["open"] / opens
+        texts = self.counters["text_pages"]
+        text_ms = self.timings["text"] / texts if texts else 0.0
+        saved = self.counters["reparses_avoided"] * open_ms + self.counters["text_cache_hits"] * text_ms
+        return {
+            "timings_ms": {k: round(v, 1) for k, v in sorted(self.timings.items())},
+            **dict(sorted(self.counters.items())),
+            "est_ms_saved": round(saved, 1),
+        }
@@ -1,61 +1,446 @@
 import camelot
 import pandas as pd
-from typing import List, Dict
+from typing import List, Dict, Optional, Sequence, Tuple, Union
 import numpy as np
+import abc
+import atexit
 import logging
+import os
+import pickle
+import select
+import signal
+import subprocess
+import sys
+import threading
+from pathlib import Path
+from time import monotonic, perf_counter
+
+from rag.pipeline.pdf_context import PdfContext
+from rag.pipeline.table_worker import HEADER, write_frame
 
 logger = logging.getLogger(__name__)
 
-def extract_tables_from_pdf(pdf_bytes: bytes) -> List[Dict]:
+# Detector de páginas candidatas (barato) y motor de extracción (caro):
+#   TABLE_DETECTOR: rulings (líneas horizontales/verticales del dibujo) | pymupdf (find_tables) | none
+#   TABLE_ENGINE:   camelot | pymupdf (find_tables, con Camelot como respaldo)
+TABLE_DETECTOR = os.getenv("TABLE_DETECTOR", "rulings").lower()
+TABLE_ENGINE = os.getenv("TABLE_ENGINE", "camelot").lower()
+TABLE_FALLBACK_ENGINE = os.getenv("TABLE_FALLBACK_ENGINE", "camelot").lower()
+# Mínimo de líneas horizontales y de verticales para considerar que hay rejilla
+TABLE_MIN_RULINGS = int(os.getenv("TABLE_MIN_RULINGS", "2"))
+
+# Aislamiento: el motor corre en un proceso hijo con presupuesto de tiempo (por
+# página) y de memoria; si se pasa, se mata su grupo de procesos (Ghostscript
+# incluido) y esas páginas se saltan.
+TABLE_ISOLATION = os.getenv("TABLE_ISOLATION", "true").lower() == "true"
+TABLE_PAGE_TIMEOUT = float(os.getenv("TABLE_PAGE_TIMEOUT", "60"))
+TABLE_MAX_MEMORY_MB = int(os.getenv("TABLE_MAX_MEMORY_MB", "2048"))
+TABLE_PAGES_PER_PROC = int(os.getenv("TABLE_PAGES_PER_PROC", "1"))
+# El proceso hijo se recicla tras N peticiones (fugas de memoria de Camelot/GS)
+TABLE_WORKER_MAX_TASKS = int(os.getenv("TABLE_WORKER_MAX_TASKS", "200"))
+
+_BACKEND_ROOT = Path(__file__).resolve().parents[2]
+
+
+def table_config() -> Dict[str, Union[str, int]]:
+    return {
+        "detector": TABLE_DETECTOR,
+        "engine": TABLE_ENGINE,
+        "fallback": TABLE_FALLBACK_ENGINE,
+        "min_rulings": TABLE_MIN_RULINGS,
+    }
+
+
+# ---------- detección de páginas candidatas ----------
+
+def _count_rulings(page) -> tuple[int, int]:
+    """
+    Nº de segmentos horizontales y verticales (líneas y bordes de rectángulos).
+    """
+    horizontal = vertical = 0
+    for drawing in page.get_drawings():
+        for item in drawing["items"]:
+            if item[0] == "l":
+                p1, p2 = item[1], item[2]
+                if abs(p1.y - p2.y) < 1 and abs(p1.x - p2.x) > 5:
+                    horizontal += 1
+                elif abs(p1.x - p2.x) < 1 and abs(p1.y - p2.y) > 5:
+                    vertical += 1
+            elif item[0] == "re":
+                rect = item[1]
+                if rect.height < 2 and rect.width > 5:
+                    horizontal += 1       # filete dibujado como rectángulo fino
+                elif rect.width < 2 and rect.height > 5:
+                    vertical += 1
+                elif rect.width > 5 and rect.height > 5:
+                    horizontal += 2
+                    vertical += 2
+    return horizontal, vertical
+
+
+def detect_table_pages(
+    pdf: Union[bytes, PdfContext],
+    pages: Optional[Sequence[int]] = None,
+    detector: Optional[str] = None,
+) -> List[int]:
+    """
+    Páginas (0-based) que pueden contener tablas. Con detector "none" devuelve todas.
     """
-    Extrae tablas del PDF usando Camelot.
+    ctx = PdfContext.of(pdf)
+    detector = (detector or TABLE_DETECTOR).lower()
+    pages = sorted(set(pages)) if pages is not None else list(range(len(ctx)))
+    if detector == "none":
+        return pages
+
+    out = []
+    with ctx.timed("table_detect"):
+        for p in pages:
+            page = ctx.page(p)
+            if detector == "pymupdf":
+                if page.find_tables().tables:
+                    out.append(p)
+            else:
+                horizontal, vertical = _count_rulings(page)
+                if horizontal >= TABLE_MIN_RULINGS and vertical >= TABLE_MIN_RULINGS:
+                    out.append(p)
+    return out
+
+
+# ---------- motores ----------
+
+class TableEngine(abc.ABC):
+    """
+    Interfaz de motor de tablas: `extract(ctx, pages)` devuelve
+    [{"page": página 1-based, "df": DataFrame crudo con la cabecera en la fila 0}]
+    en orden de página.
+    """
+
+    name = "base"
+
+    @abc.abstractmethod
+    def extract(self, ctx: PdfContext, pages: List[int]) -> List[Dict]:
+        ...
+
+
+class CamelotEngine(TableEngine):
+    name = "camelot"
+
+    def extract(self, ctx: PdfContext, pages: List[int]) -> List[Dict]:
+        import tempfile
+
+        subset = ctx.subset_pdf(pages)
+
+        # Guardar PDF temporalmente (Camelot necesita archivo)
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as tmp:
+            tmp.write(subset)
+            tmp.flush()
+
+            tables = camelot.read_pdf(tmp.name, pages="all")
+
+        logger.info("[TABLE_EXTRACTOR] Nº tablas encontradas por Camelot: %d", len(tables))
+
+        # Página del subconjunto (1-based) -> página real (1-based)
+        return [{"page": pages[int(t.page) - 1] + 1, "df": t.df} for t in tables]
+
+
+class PyMuPDFEngine(TableEngine):
+    """
+    `page.find_tables()` de PyMuPDF: sin fichero temporal ni segundo parser.
+    Las páginas donde no encuentra nada pasan al motor de respaldo.
+    """
+
+    name = "pymupdf"
+
+    def __init__(self, fallback: Optional[TableEngine] = None):
+        self.fallback = fallback
+
+    def extract(self, ctx: PdfContext, pages: List[int]) -> List[Dict]:
+        out = []
+        missed = []
+        for p in pages:
+            found = ctx.page(p).find_tables().tables
+            if not found:
+                missed.append(p)
+                continue
+            for t in found:
+                rows = [["" if cell is None else str(cell) for cell in row] for row in t.extract()]
+                out.append({"page": p + 1, "df": pd.DataFrame(rows)})
+
+        logger.info("[TABLE_EXTRACTOR] Nº tablas encontradas por PyMuPDF: %d", len(out))
+
+        if missed and self.fallback is not None:
+            out.extend(self.fallback.extract(ctx, missed))
+            out.sort(key=lambda t: t["page"])  # estable: respeta el orden dentro de cada página
+        return out
+
+
+def get_table_engine(name: Optional[str] = None, fallback: Optional[str] = None) -> TableEngine:
+    name = (name or TABLE_ENGINE).lower()
+    fallback = (fallback if fallback is not None else TABLE_FALLBACK_ENGINE).lower()
+    if name == "camelot":
+        return CamelotEngine()
+    if name == "pymupdf":
+        backup = None if fallback in ("", "none", "pymupdf") else get_table_engine(fallback, fallback="none")
+        return PyMuPDFEngine(fallback=backup)
+    raise ValueError(f"Motor de tablas desconocido: {name}")
+
+
+# ---------- aislamiento en subproceso ----------
+
+class IsolatedTableRunner:
+    """
+    Proceso hijo persistente (rag.pipeline.table_worker) que ejecuta el motor de
+    tablas sobre PDFs de pocas páginas. Cada petición tiene su propio límite de
+    tiempo; el hijo tiene RLIMIT_AS como límite de memoria. Si se pasa o muere,
+    se mata su grupo de procesos y la siguiente petición arranca uno nuevo.
+    """
+
+    def __init__(self, max_memory_mb: Optional[int] = None, max_tasks: Optional[int] = None):
+        self.max_memory_mb = TABLE_MAX_MEMORY_MB if max_memory_mb is None else max_memory_mb
+        self.max_tasks = max_tasks or TABLE_WORKER_MAX_TASKS
+        self.proc: Optional[subprocess.Popen] = None
+        self.tasks = 0
+        self.lock = threading.Lock()
+
+    def _set_limits(self) -> None:
+        if self.max_memory_mb > 0:
+            import resource
+
+            limit = self.max_memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    def _start(self) -> None:
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "rag.pipeline.table_worker"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            cwd=str(_BACKEND_ROOT),
+            # Con RLIMIT_AS, los buffers por hilo de OpenBLAS agotarían el límite al importar numpy
+            env={**os.environ, "OPENBLAS_NUM_THREADS": "1", "OMP_NUM_THREADS": "1"},
+            start_new_session=True,  # grupo propio: killpg alcanza también a Ghostscript
+            preexec_fn=self._set_limits,
+        )
+        self.tasks = 0
+
+    def close(self) -> None:
+        proc, self.proc = self.proc, None
+        if proc is None:
+            return
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        proc.wait()
+
+    def _read_exact(self, n: int, deadline: float) -> Optional[bytes]:
+        fd = self.proc.stdout.fileno()
+        buf = bytearray()
+        while len(buf) < n:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                raise TimeoutError
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if not ready:
+                raise TimeoutError
+            chunk = os.read(fd, n - len(buf))
+            if not chunk:
+                return None
+            buf.extend(chunk)
+        return bytes(buf)
+
+    def _write_request(self, request: Dict, deadline: float) -> None:
+        # La escritura en la tubería bloquea si el hijo no lee (colgado o atascado en
+        # la petición anterior): se hace en un hilo y cuenta contra el mismo plazo
+        errors: List[Exception] = []
+
+        def write():
+            try:
+                write_frame(self.proc.stdin, request)
+            except Exception as e:
+                errors.append(e)
+
+        writer = threading.Thread(target=write, name="table-runner-write", daemon=True)
+        writer.start()
+        writer.join(max(0.0, deadline - monotonic()))
+        if writer.is_alive():
+            # close() mata al hijo: la escritura pendiente falla y el hilo termina
+            raise TimeoutError
+        if errors:
+            raise errors[0]
+
+    def run(
+        self,
+        pdf_bytes: bytes,
+        pages: List[int],
+        engine: str,
+        fallback: str,
+        timeout: float,
+    ) -> Tuple[Optional[List[Dict]], Optional[str]]:
+        """
+        Devuelve (tablas, None) o (None, motivo): timeout, memory, crashed (exit N) o error: ...
+        """
+        with self.lock:
+            if self.proc is None or self.proc.poll() is not None or self.tasks >= self.max_tasks:
+                self.close()
+                self._start()
+            self.tasks += 1
+
+            deadline = monotonic() + timeout
+            try:
+                self._write_request(
+                    {"pdf": pdf_bytes, "pages": pages, "engine": engine, "fallback": fallback}, deadline,
+                )
+                header = self._read_exact(HEADER.size, deadline)
+                body = self._read_exact(HEADER.unpack(header)[0], deadline) if header else None
+            except TimeoutError:
+                self.close()
+                return None, "timeout"
+            except (BrokenPipeError, OSError):
+                self.close()
+                return None, "crashed"
+
+            if body is None:
+                code = self.proc.wait()
+                self.close()
+                return None, f"crashed (exit {code})"
+
+            reply = pickle.loads(body)
+            if reply.get("ok"):
+                return reply["tables"], None
+            if reply.get("error") == "memory":
+                self.close()
+                return None, "memory"
+            return None, f"error: {reply.get('error')}"
+
+
+_runner: Optional[IsolatedTableRunner] = None
+
+
+def _shared_runner() -> IsolatedTableRunner:
+    # Uno por proceso (worker de Celery o del pool): el arranque se paga una vez
+    global _runner
+    if _runner is None:
+        _runner = IsolatedTableRunner()
+        atexit.register(_runner.close)
+    return _runner
+
+
+def _extract_isolated(ctx: PdfContext, pages: List[int], engine: str, fallback: str) -> List[Dict]:
+    """
+    Ejecuta el motor por grupos de TABLE_PAGES_PER_PROC páginas en el proceso
+    aislado. Si un grupo falla se reintenta página a página; las páginas que
+    aun así se pasan de presupuesto quedan en `ctx.issues` y se saltan.
+    """
+    runner = _shared_runner()
+    size = max(1, TABLE_PAGES_PER_PROC)
+    out: List[Dict] = []
+    queue = [pages[i:i + size] for i in range(0, len(pages), size)]
+
+    while queue:
+        group = queue.pop(0)
+        t0 = perf_counter()
+        tables, error = runner.run(
+            ctx.subset_pdf(group), list(range(len(group))), engine, fallback,
+            timeout=TABLE_PAGE_TIMEOUT * len(group),
+        )
+        elapsed_ms = round((perf_counter() - t0) * 1000, 1)
+
+        if error is None:
+            for t in tables:
+                # Página del subconjunto (1-based) -> página real (1-based)
+                t["page"] = group[t["page"] - 1] + 1
+                out.append(t)
+            continue
+
+        if len(group) > 1:
+            queue[:0] = [[p] for p in group]  # aislar la página problemática
+            continue
+
+        page_idx = group[0]
+        logger.warning(
+            "[TABLE_EXTRACTOR] Página %d saltada (%s, %.0f ms).", page_idx + 1, error, elapsed_ms,
+        )
+        ctx.issues.append({
+            "stage": "table",
+            "page": page_idx + 1,
+            "page_idx": page_idx,
+            "reason": error,
+            "elapsed_ms": elapsed_ms,
+        })
+
+    return out
+
+
+# ---------- API ----------
+
+def extract_tables_from_pdf(
+    pdf: Union[bytes, PdfContext],
+    pages: Optional[Sequence[int]] = None,
+    engine: Optional[str] = None,
+    detector: Optional[str] = None,
+) -> List[Dict]:
+    """
+    Extrae tablas del PDF: detecta páginas candidatas (TABLE_DETECTOR) y solo
+    en esas ejecuta el motor configurado (TABLE_ENGINE).
     Retorna una lista de dicts con:
     - page
     - df (pandas DataFrame)
-    """
-    import tempfile
+    - idx: índice de la tabla dentro de su página (estable aunque se procese
+      solo un subconjunto de páginas)
+    Si se pasa `pages`, solo se procesan esas páginas (índices 0-based absolutos).
+    `pdf` puede ser el PDF en bytes o un PdfContext ya abierto.
 
+    Con TABLE_ISOLATION el motor corre en un subproceso con presupuesto de
+    tiempo y memoria; las páginas que se pasan se saltan y quedan en `ctx.issues`.
+    """
     tables_data = []
 
-    # Guardar PDF temporalmente (Camelot necesita archivo)
-    with tempfile.NamedTemporaryFile(suffix=".pdf") as tmp:
-        tmp.write(pdf_bytes)
-        tmp.flush()
+    ctx = PdfContext.of(pdf)
+    candidates = detect_table_pages(ctx, pages, detector=detector)
+    if not candidates:
+        return []
 
-        tables = camelot.read_pdf(tmp.name, pages="all")
+    with ctx.timed("tables"):
+        if TABLE_ISOLATION:
+            tables = _extract_isolated(ctx, candidates, engine or TABLE_ENGINE, TABLE_FALLBACK_ENGINE)
+        else:
+            tables = get_table_engine(engine).extract(ctx, candidates)
 
-        logger.info("[TABLE_EXTRACTOR] Nº tablas encontradas por Camelot: %d", len(tables))
+    per_page: Dict[int, int] = {}
+    for idx, t in enumerate(tables):
+        page_num = t["page"]
+        page_table_idx = per_page.get(page_num, 0)
+        per_page[page_num] = page_table_idx + 1
 
-        for idx, t in enumerate(tables):
-            df_raw = t.df
-            logger.info("[TABLE_EXTRACTOR] Tabla %d raw shape: %s", idx, df_raw.shape)
-            logger.info("[TABLE_EXTRACTOR] Tabla %d raw head():\n%s", idx, df_raw.head())
+        df_raw = t["df"]
+        logger.info("[TABLE_EXTRACTOR] Tabla %d raw shape: %s", idx, df_raw.shape)
+        logger.info("[TABLE_EXTRACTOR] Tabla %d raw head():\n%s", idx, df_raw.head())
 
-            df_tmp = df_raw.copy()
-            df_tmp = df_tmp.replace(r"^\s*$", pd.NA, regex=True)
+        df_tmp = df_raw.copy()
+        df_tmp = df_tmp.replace(r"^\s*$", pd.NA, regex=True)
 
-            # Si todas las filas están vacías o solo hay la cabecera -> descartar
-            if df_tmp.dropna(how="all").shape[0] <= 1:
-                logger.info("[TABLE_EXTRACTOR] Tabla %d vacía tras limpiar, se ignora.", idx)
-                continue
+        # Si todas las filas están vacías o solo hay la cabecera -> descartar
+        if df_tmp.dropna(how="all").shape[0] <= 1:
+            logger.info("[TABLE_EXTRACTOR] Tabla %d vacía tras limpiar, se ignora.", idx)
+            continue
 
-            # Si todas las columnas están vacías -> descartar
-            if df_tmp.dropna(axis=1, how="all").shape[1] == 0:
-                logger.info("[TABLE_EXTRACTOR] Tabla %d sin columnas útiles, se ignora.", idx)
-                continue
-            
-            # 👉 Limpiar celdas vacías y descartar tablas totalmente vacías
-            header = df_raw.iloc[0].tolist()
-            df_clean = df_raw.iloc[1:].reset_index(drop=True)
-            df_clean.columns = header
-
-            logger.info("[TABLE_EXTRACTOR] Tabla %d clean shape: %s", idx, df_clean.shape)
-            logger.info("[TABLE_EXTRACTOR] Tabla %d clean head:\n%s", idx, df_clean.head())
-
-            tables_data.append({
-                "page": t.page,
-                "df": df_clean,
-                "idx": idx,   # opcionalmente guardamos el índice
-            })
+        # Si todas las columnas están vacías -> descartar
+        if df_tmp.dropna(axis=1, how="all").shape[1] == 0:
+            logger.info("[TABLE_EXTRACTOR] Tabla %d sin columnas útiles, se ignora.", idx)
+            continue
+
+        # 👉 Limpiar celdas vacías y descartar tablas totalmente vacías
+        header = df_raw.iloc[0].tolist()
+        df_clean = df_raw.iloc[1:].reset_index(drop=True)
+        df_clean.columns = header
+
+        logger.info("[TABLE_EXTRACTOR] Tabla %d clean shape: %s", idx, df_clean.shape)
+        logger.info("[TABLE_EXTRACTOR] Tabla %d clean head:\n%s", idx, df_clean.head())
+
+        tables_data.append({
+            "page": page_num,
+            "df": df_clean,
+            "idx": page_table_idx,
+        })
 
     return tables_data
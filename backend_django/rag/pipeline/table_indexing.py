@@ -0,0 +1,154 @@
+# backend_django/rag/pipeline/table_indexing.py
+"""
+Indexado adaptativo de tablas: qué puntos se vectorizan por cada tabla.
+
+- Tablas pequeñas (hasta TABLE_INDEX_MAX_ROWS filas y TABLE_INDEX_MAX_CELLS
+  celdas): un punto por fila, como hasta ahora.
+- Tablas grandes: ventanas de filas (las que quepan en la ventana del modelo,
+  hasta TABLE_INDEX_WINDOW_ROWS), un resumen por columna y un punto con la
+  descripción de la tabla. Una tabla de 20.000 filas pasa de 20.000 puntos a
+  unos cientos.
+
+La tabla completa sigue en su CSV; los puntos solo la referencian.
+"""
+from __future__ import annotations
+
+import math
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+TABLE_INDEX_MAX_ROWS = int(os.getenv("TABLE_INDEX_MAX_ROWS", "200"))
+TABLE_INDEX_MAX_CELLS = int(os.getenv("TABLE_INDEX_MAX_CELLS", "5000"))
+TABLE_INDEX_WINDOW_ROWS = int(os.getenv("TABLE_INDEX_WINDOW_ROWS", "25"))
+TABLE_INDEX_SAMPLE_VALUES = int(os.getenv("TABLE_INDEX_SAMPLE_VALUES", "5"))
+
+STRATEGY_ROWS = "rows"
+STRATEGY_WINDOWS = "windows"
+
+# Filas que se tokenizan para estimar cuántas caben en una ventana
+_WINDOW_SAMPLE_ROWS = 50
+
+
+@dataclass
+class TablePoint:
+    kind: str      # row | window | column | table
+    ordinal: str   # único dentro de la tabla (forma parte del ID del punto)
+    text: str
+    meta: Dict[str, Any] = field(default_factory=dict)
+
+
+def table_index_config() -> dict:
+    """
+    Umbrales del indexado; forman parte de la huella de página de las tablas.
+    """
+    return {
+        "max_rows": TABLE_INDEX_MAX_ROWS,
+        "max_cells": TABLE_INDEX_MAX_CELLS,
+        "window_rows": TABLE_INDEX_WINDOW_ROWS,
+        "sample_values": TABLE_INDEX_SAMPLE_VALUES,
+    }
+
+
+def choose_strategy(n_rows: int, n_cols: int) -> str:
+    if n_rows <= TABLE_INDEX_MAX_ROWS and n_rows * max(1, n_cols) <= TABLE_INDEX_MAX_CELLS:
+        return STRATEGY_ROWS
+    return STRATEGY_WINDOWS
+
+
+def row_text(headers: Sequence[Any], row: Sequence[Any]) -> str:
+    return " | ".join(f"{col_name}: {value}" for col_name, value in zip(headers, row))
+
+
+def _line(values: Sequence[Any]) -> str:
+    return " | ".join(str(v) for v in values)
+
+
+def _window_rows(rows: List[list], headers: List[str], counter: Any, max_tokens: Optional[int]) -> int:
+    """
+    Filas por ventana: TABLE_INDEX_WINDOW_ROWS, reducido para que la ventana
+    (cabecera + filas) quepa en `max_tokens` según una muestra de filas.
+    """
+    limit = max(1, TABLE_INDEX_WINDOW_ROWS)
+    if counter is None or not max_tokens:
+        return limit
+    sample = [_line(r) for r in rows[:_WINDOW_SAMPLE_ROWS]]
+    counts = counter.counts([_line(headers)] + sample)
+    header_tokens, row_counts = counts[0], counts[1:]
+    per_row = max(1, math.ceil(sum(row_counts) / max(1, len(row_counts))))
+    return max(1, min(limit, (max_tokens - header_tokens) // per_row))
+
+
+def summarize_column(name: str, series: pd.Series) -> str:
+    values = series.astype(str).str.strip()
+    values = values[(values != "") & (values.str.lower() != "nan")]
+    if values.empty:
+        return f"Columna '{name}': sin valores."
+
+    nums = pd.to_numeric(values, errors="coerce")
+    if nums.notna().mean() >= 0.8:
+        nums = nums.dropna()
+        return (
+            f"Columna '{name}' (numérica, {len(nums)} valores): "
+            f"mín {nums.min():g}, máx {nums.max():g}, media {nums.mean():g}."
+        )
+
+    top = values.value_counts().head(TABLE_INDEX_SAMPLE_VALUES)
+    examples = ", ".join(f"{v} ({c})" if c > 1 else str(v) for v, c in top.items())
+    return (
+        f"Columna '{name}' (texto, {len(values)} valores, {values.nunique()} distintos): "
+        f"{examples}."
+    )
+
+
+def describe_table(df: pd.DataFrame, page_num: int) -> str:
+    headers = [str(h) for h in df.columns]
+    text = (
+        f"Tabla de {df.shape[0]} filas y {df.shape[1]} columnas (página {page_num}). "
+        f"Columnas: {', '.join(headers)}."
+    )
+    if not df.empty:
+        text += f" Ejemplo: {row_text(headers, df.iloc[0].tolist())}."
+    return text
+
+
+def plan_table_points(
+    df: pd.DataFrame,
+    page_num: int,
+    counter: Any = None,
+    max_tokens: Optional[int] = None,
+) -> Tuple[List[TablePoint], Dict[str, Any]]:
+    """
+    Devuelve (puntos a indexar, resumen de la estrategia para el meta del Asset).
+    """
+    headers = list(df.columns)
+    rows = df.values.tolist()
+    n_rows, n_cols = df.shape
+    strategy = choose_strategy(n_rows, n_cols)
+
+    if strategy == STRATEGY_ROWS:
+        points = [
+            TablePoint("row", str(row_idx), row_text(headers, r), {"row_idx": row_idx, "row": r})
+            for row_idx, r in enumerate(rows)
+        ]
+        return points, {"strategy": strategy, "points": len(points)}
+
+    str_headers = [str(h) for h in headers]
+    window = _window_rows(rows, str_headers, counter, max_tokens)
+    points = [TablePoint("table", "t", describe_table(df, page_num), {"rows": n_rows, "cols": n_cols})]
+    for j, name in enumerate(str_headers):
+        points.append(TablePoint("column", f"c{j}", summarize_column(name, df.iloc[:, j]), {"column": name}))
+    header_line = _line(str_headers)
+    for start in range(0, n_rows, window):
+        end = min(n_rows, start + window)
+        body = "\n".join(_line(r) for r in rows[start:end])
+        points.append(TablePoint(
+            "window",
+            f"w{start}",
+            f"Filas {start + 1}-{end} de {n_rows}\n{header_line}\n{body}",
+            {"row_start": start, "row_end": end},
+        ))
+
+    return points, {"strategy": strategy, "points": len(points), "window_rows": window}
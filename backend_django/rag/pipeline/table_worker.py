@@ -0,0 +1,65 @@
+# backend_django/rag/pipeline/table_worker.py
+"""
+Proceso hijo para extraer tablas de forma aislada (ver
+table_extractor.IsolatedTableRunner).
+
+Protocolo por stdin/stdout: tramas "8 bytes de longitud + pickle".
+  petición:  {"pdf": bytes, "pages": [page_idx], "engine": str, "fallback": str}
+  respuesta: {"ok": True, "tables": [{"page", "df"}]} | {"ok": False, "error": str}
+
+Sin Django: solo importa el pipeline de tablas, para arrancar rápido.
+"""
+from __future__ import annotations
+
+import os
+import pickle
+import struct
+import sys
+from typing import Any, BinaryIO, Optional
+
+HEADER = struct.Struct("!Q")
+
+
+def read_frame(stream: BinaryIO) -> Optional[Any]:
+    header = stream.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    (size,) = HEADER.unpack(header)
+    return pickle.loads(stream.read(size))
+
+
+def write_frame(stream: BinaryIO, obj: Any) -> None:
+    data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    stream.write(HEADER.pack(len(data)))
+    stream.write(data)
+    stream.flush()
+
+
+def main() -> int:
+    # El canal de respuestas es una copia privada del fd 1; el fd 1 pasa a ser
+    # stderr para que ningún print (Python o C: PyMuPDF, Ghostscript) lo ensucie
+    stdout = os.fdopen(os.dup(1), "wb")
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+    stdin = sys.stdin.buffer
+
+    from rag.pipeline.pdf_context import PdfContext
+    from rag.pipeline.table_extractor import get_table_engine
+
+    while True:
+        request = read_frame(stdin)
+        if request is None:
+            return 0
+        try:
+            ctx = PdfContext(request["pdf"])
+            engine = get_table_engine(request["engine"], fallback=request["fallback"])
+            write_frame(stdout, {"ok": True, "tables": engine.extract(ctx, request["pages"])})
+        except MemoryError:
+            write_frame(stdout, {"ok": False, "error": "memory"})
+            return 1  # el estado del proceso ya no es fiable
+        except Exception as e:
+            write_frame(stdout, {"ok": False, "error": f"{type(e).__name__}: {e}"})
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,23 @@
-import fitz  # PyMuPDF
+from typing import Sequence, Union
 
+from rag.pipeline.pdf_context import PdfContext
 
-def extract_text_from_pdf(pdf_bytes: bytes):
+
+def extract_text_from_pdf(pdf: Union[bytes, PdfContext], pages: Sequence[int] | None = None):
     """
     Devuelve: lista de dicts por página:
     [
        {"page": 0, "text": "texto..."},
        ...
     ]
+    Si se pasa `pages`, solo se procesan esas páginas (índices 0-based absolutos).
+    `pdf` puede ser el PDF en bytes o un PdfContext ya abierto (sin re-parsear).
     """
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    ctx = PdfContext.of(pdf)
+    page_range = pages if pages is not None else range(len(ctx))
 
-    pages = []
-    for i, page in enumerate(doc):
-        text = page.get_text("text")
-        pages.append({"page": i, "text": text})
+    out = []
+    for i in page_range:
+        out.append({"page": i, "text": ctx.text(i)})
 
-    return pages
+    return out
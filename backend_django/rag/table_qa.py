@@ -0,0 +1,399 @@
+# backend_django/rag/table_qa.py
+"""
+Consultas analíticas locales sobre tablas completas (pandas).
+
+Para preguntas de filtro, agregado o búsqueda ("¿cuál es el total de Importe
+por Cuenta?", "¿cuántas filas con Nivel Avanzado?", "importe medio mayor de
+100") se calcula el resultado sobre la tabla entera y al LLM solo le llega
+ese resultado pequeño, en vez del preview en texto de la tabla.
+
+El plan es heurístico:
+  - operación: count | sum | mean | max | min, o búsqueda de filas;
+  - columna objetivo: la columna numérica que se nombra (o la de más
+    valores distintos);
+  - agrupación: "por <columna>" / "by <columna>";
+  - filtros: valores de celda que aparecen en la pregunta y comparaciones
+    numéricas ("mayor que 100", "< 5").
+Si no se reconoce nada calculable, devuelve None y se sigue como antes.
+
+En /rag/ask/ (`answer_stored_question`) el plan se hace sobre las primeras
+TABLE_QA_PLAN_ROWS filas y el cálculo lee la tabla guardada hasta
+TABLE_QA_MAX_ROWS filas (si es mayor, el resultado se marca como parcial):
+los agregados solo con las columnas que usan; los filtros y búsquedas, con
+todas, y devuelven como mucho TABLE_QA_RESULT_ROWS filas.
+
+Las búsquedas sin agregado solo se planifican si la pregunta habla de filas
+("filas con Nivel Avanzado", "registros de Caja") o trae una comparación
+numérica ("importes mayores de 100"). Una pregunta que solo cita un valor de
+celda ("¿qué importe tiene Caja?") no se calcula aquí: valores cortos como
+"sí" o "no" coincidirían con casi cualquier pregunta. Esas siguen con el
+contexto recuperado, como antes.
+"""
+from __future__ import annotations
+
+import os
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+TABLE_QA_ENABLED = os.getenv("TABLE_QA_ENABLED", "true").lower() == "true"
+TABLE_QA_MAX_ROWS = int(os.getenv("TABLE_QA_MAX_ROWS", "200000"))
+TABLE_QA_PLAN_ROWS = int(os.getenv("TABLE_QA_PLAN_ROWS", "5000"))
+TABLE_QA_RESULT_ROWS = int(os.getenv("TABLE_QA_RESULT_ROWS", "20"))
+
+# Columnas con más valores distintos no se usan para filtros por valor
+_MAX_FILTER_VALUES = 5000
+
+_OPS: List[Tuple[str, re.Pattern]] = [
+    ("count", re.compile(r"\b(cuant[oa]s|numero de|cantidad de|count|how many)\b")),
+    ("mean", re.compile(r"\b(media|medio|promedio|average|mean)\b")),
+    ("sum", re.compile(r"\b(suma|sumar|total|totales|sum)\b")),
+    ("max", re.compile(r"\b(maxim[oa]s?|mayor|mas alt[oa]|max|highest|largest|top)\b")),
+    ("min", re.compile(r"\b(minim[oa]s?|menor|mas baj[oa]|min|lowest|smallest)\b")),
+]
+# Solo palabras que hablan de filas: "qué", "cuál", "muestra"... aparecen en cualquier pregunta
+_LOOKUP_RE = re.compile(r"\b(filas?|registros?|rows?|records?)\b")
+
+_NUMBER = r"(-?\d+(?:[.,]\d+)*)"
+_COMPARISONS: List[Tuple[str, re.Pattern]] = [
+    (">=", re.compile(r"(?:>=|al menos|como minimo|at least)\s*" + _NUMBER)),
+    ("<=", re.compile(r"(?:<=|como maximo|a lo sumo|at most)\s*" + _NUMBER)),
+    (">", re.compile(
+        r"(?:>|mayor(?:es)? (?:que|de|a)|mas de|superior(?:es)? a|por encima de|greater than|more than|over|above)\s*"
+        + _NUMBER
+    )),
+    ("<", re.compile(
+        r"(?:<|menor(?:es)? (?:que|de|a)|menos de|inferior(?:es)? a|por debajo de|less than|under|below)\s*"
+        + _NUMBER
+    )),
+    ("==", re.compile(r"(?:==|=|igual a|equal to)\s*" + _NUMBER)),
+]
+_GROUP_RE = re.compile(r"\b(?:por cada|para cada|por|segun|by|per|for each)\s+([a-z0-9_]+(?:\s+[a-z0-9_]+){0,2})")
+
+
+def _norm(text: Any) -> str:
+    text = unicodedata.normalize("NFKD", str(text).lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^\w.,<>=-]+", " ", text).split())
+
+
+def _contains(haystack: str, needle: str) -> Optional[int]:
+    """
+    Posición de `needle` como palabra(s) completa(s) dentro de `haystack`.
+    """
+    m = re.search(r"(?<!\w)" + re.escape(needle) + r"(?!\w)", haystack)
+    return m.start() if m else None
+
+
+def _parse_number(raw: str) -> Optional[float]:
+    raw = raw.strip()
+    if re.fullmatch(r"-?\d{1,3}(\.\d{3})+(,\d+)?", raw) or re.fullmatch(r"-?\d+,\d+", raw):
+        raw = raw.replace(".", "").replace(",", ".")  # 1.234,5
+    else:
+        raw = raw.replace(",", "")                     # 1,234.5
+    try:
+        return float(raw)
+    except ValueError:
+        return None
+
+
+def numeric_column(series: pd.Series) -> Optional[pd.Series]:
+    """
+    La columna como números (acepta "1.234,5", "1,234.5", "12 €", "5%"),
+    o None si menos del 80% de los valores no vacíos lo son.
+    """
+    values = series.astype(str).str.strip()
+    present = values[(values != "") & (values.str.lower() != "nan") & (values.str.lower() != "none")]
+    if present.empty:
+        return None
+    cleaned = values.str.replace(r"[€$£%\s]", "", regex=True)
+    nums = pd.to_numeric(cleaned, errors="coerce")
+    if nums[present.index].notna().mean() < 0.8:
+        nums = cleaned.map(lambda v: _parse_number(v) if v else None).astype(float)
+    if nums[present.index].notna().mean() < 0.8:
+        return None
+    return nums
+
+
+@dataclass
+class TablePlan:
+    op: Optional[str]                 # count | sum | mean | max | min | None (búsqueda)
+    target: Optional[str] = None      # columna numérica sobre la que se agrega
+    group_by: Optional[str] = None
+    filters: List[Tuple[str, str, Any]] = field(default_factory=list)  # (columna, op, valor)
+
+    @property
+    def is_aggregate(self) -> bool:
+        # count | sum | mean | max | min (con o sin agrupación); no las búsquedas de filas
+        return self.op is not None
+
+    def columns(self) -> List[str]:
+        """
+        Columnas que necesita el cálculo (para leer solo esas del Parquet).
+        """
+        cols = [self.target, self.group_by] + [col for col, _, _ in self.filters]
+        return list(dict.fromkeys(c for c in cols if c))
+
+    def describe(self) -> str:
+        parts = [self.op or "búsqueda"]
+        if self.target and self.op not in (None, "count"):
+            parts.append(f"de '{self.target}'")
+        if self.group_by:
+            parts.append(f"por '{self.group_by}'")
+        if self.filters:
+            conds = []
+            for col, op, value in self.filters:
+                shown = ", ".join(map(str, value)) if isinstance(value, list) else value
+                conds.append(f"{col} {'=' if op == 'in' else op} {shown}")
+            parts.append("donde " + " y ".join(conds))
+        return " ".join(parts)
+
+
+@dataclass
+class TableAnswer:
+    plan: TablePlan
+    text: str
+    rows_total: int                   # filas sobre las que se ha calculado
+    rows_matched: int
+    table_rows: Optional[int] = None  # filas de la tabla completa (si se conocen)
+    columns: List[str] = field(default_factory=list)  # cabecera de la tabla (esquema para el LLM)
+
+    @property
+    def complete(self) -> bool:
+        if self.table_rows is not None:
+            return self.rows_total >= self.table_rows
+        return self.rows_total < TABLE_QA_MAX_ROWS
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "plan": self.plan.describe(),
+            "rows_total": self.rows_total,
+            "rows_matched": self.rows_matched,
+            "table_rows": self.table_rows,
+            "complete": self.complete,
+        }
+
+
+def _mentioned_columns(q: str, columns: List[str]) -> List[Tuple[int, str]]:
+    """
+    [(posición, columna)] de las columnas nombradas en la pregunta, por orden.
+    """
+    found = []
+    for col in columns:
+        name = _norm(col)
+        if not name:
+            continue
+        pos = _contains(q, name)
+        if pos is None and name.endswith("s"):
+            pos = _contains(q, name[:-1])
+        if pos is None and not name.endswith("s"):
+            pos = _contains(q, name + "s")
+        if pos is not None:
+            found.append((pos, col))
+    return sorted(found)
+
+
+def plan_question(question: str, df: pd.DataFrame) -> Optional[TablePlan]:
+    q = _norm(question)
+    if not q or df.empty:
+        return None
+
+    columns = [str(c) for c in df.columns]
+    df = df.copy()
+    df.columns = columns
+    numeric = {c: s for c in columns if (s := numeric_column(df[c])) is not None}
+    mentioned = _mentioned_columns(q, columns)
+
+    # Comparaciones numéricas (se quitan del texto antes de buscar la operación:
+    # "mayor que 100" no es un máximo)
+    comparisons: List[Tuple[int, str, float]] = []
+    rest = q
+    for op, pattern in _COMPARISONS:
+        for m in pattern.finditer(rest):
+            value = _parse_number(m.group(1))
+            if value is not None:
+                comparisons.append((m.start(), op, value))
+        rest = pattern.sub(lambda m: " " * len(m.group(0)), rest)  # mismas posiciones
+
+    op = next((name for name, pattern in _OPS if pattern.search(rest)), None)
+
+    group_by = None
+    for m in _GROUP_RE.finditer(q):
+        hits = _mentioned_columns(m.group(1), columns)
+        if hits:
+            group_by = hits[0][1]
+            break
+
+    numeric_mentioned = [c for _, c in mentioned if c in numeric and c != group_by]
+    target = numeric_mentioned[0] if numeric_mentioned else None
+    if target is None and op in ("sum", "mean", "max", "min"):
+        # Sin columna nombrada: la numérica con más valores distintos (importes antes que años)
+        candidates = [c for c in columns if c in numeric and c != group_by]
+        target = max(candidates, key=lambda c: numeric[c].nunique(), default=None)
+
+    filters: List[Tuple[str, str, Any]] = []
+    for pos, cmp_op, value in comparisons:
+        # La columna nombrada justo antes de la comparación; si no, la objetivo
+        before = [c for p, c in mentioned if p < pos and c in numeric]
+        col = before[-1] if before else target
+        if col:
+            filters.append((col, cmp_op, value))
+
+    # Valores de celda citados en la pregunta ("Caja", "Avanzado", "2023")
+    for col in columns:
+        if col == group_by or (col == target and op is not None):
+            continue
+        uniques = df[col].dropna().astype(str).unique()
+        if len(uniques) > _MAX_FILTER_VALUES:
+            continue
+        values = []
+        for v in uniques:
+            nv = _norm(v)
+            if len(nv) < 2 or nv == _norm(col):
+                continue
+            if re.fullmatch(r"[\d.,-]+", nv) and len(nv) < 4:
+                continue  # números cortos: demasiados falsos positivos
+            if _contains(q, nv) is not None:
+                values.append(v)
+        if values:
+            filters.append((col, "in", sorted(values)))
+
+    if op is None and not filters:
+        return None
+    if op in ("sum", "mean", "max", "min") and target is None:
+        return None
+    if op is None and not _LOOKUP_RE.search(rest) and not any(o != "in" for _, o, _ in filters):
+        return None
+
+    return TablePlan(op=op, target=target, group_by=group_by, filters=filters)
+
+
+def _fmt(value: Any) -> str:
+    if isinstance(value, float):
+        if value.is_integer():
+            return str(int(value))
+        return f"{value:.4f}".rstrip("0").rstrip(".")
+    return "" if value is None else str(value)
+
+
+def _markdown(df: pd.DataFrame, max_rows: int) -> str:
+    header = [str(c) for c in df.columns]
+    lines = [" | ".join(header), " | ".join(["---"] * len(header))]
+    for r in df.head(max_rows).values.tolist():
+        lines.append(" | ".join(_fmt(v) for v in r))
+    if len(df) > max_rows:
+        lines.append(f"...({len(df) - max_rows} filas más)")
+    return "\n".join(lines)
+
+
+def execute_plan(plan: TablePlan, df: pd.DataFrame, max_rows: int = TABLE_QA_RESULT_ROWS) -> TableAnswer:
+    df = df.copy()
+    df.columns = [str(c) for c in df.columns]
+    numeric: Dict[str, pd.Series] = {}
+
+    def num(col: str) -> pd.Series:
+        if col not in numeric:
+            numeric[col] = numeric_column(df[col])
+        return numeric[col]
+
+    mask = pd.Series(True, index=df.index)
+    for col, op, value in plan.filters:
+        if op == "in":
+            mask &= df[col].astype(str).isin(value)
+            continue
+        values = num(col)
+        mask &= {
+            ">": values > value, ">=": values >= value,
+            "<": values < value, "<=": values <= value, "==": values == value,
+        }[op]
+    sub = df[mask]
+
+    if plan.op is None:
+        result = f"{len(sub)} filas coinciden.\n" + _markdown(sub, max_rows)
+    elif plan.op == "count":
+        if plan.group_by:
+            counts = sub[plan.group_by].value_counts().rename("filas").reset_index()
+            result = _markdown(counts, max_rows)
+        else:
+            result = f"{len(sub)} filas"
+    else:
+        values = num(plan.target)[mask]
+        if plan.group_by:
+            agg = values.groupby(sub[plan.group_by]).agg(plan.op)
+            agg = agg.sort_values(ascending=(plan.op == "min")).rename(f"{plan.op}({plan.target})").reset_index()
+            result = _markdown(agg, max_rows)
+        elif plan.op in ("max", "min"):
+            if values.dropna().empty:
+                result = "sin valores numéricos"
+            else:
+                idx = values.idxmax() if plan.op == "max" else values.idxmin()
+                result = f"{_fmt(float(values[idx]))}\nFila:\n" + _markdown(sub.loc[[idx]], 1)
+        else:
+            result = _fmt(float(values.agg(plan.op)))
+
+    text = f"Consulta: {plan.describe()}\nFilas: {len(sub)} de {len(df)}\nResultado:\n{result}"
+    table_rows = df.attrs.get("total_rows")
+    return TableAnswer(
+        plan=plan, text=text, rows_total=int(len(df)), rows_matched=int(len(sub)),
+        table_rows=int(table_rows) if table_rows is not None else None,
+        columns=[str(c) for c in df.columns],
+    )
+
+
+def looks_analytical(question: str) -> bool:
+    """
+    Filtro barato (sin leer la tabla): ¿pide un agregado, una comparación o filas?
+    """
+    q = _norm(question)
+    return (
+        any(p.search(q) for _, p in _OPS)
+        or any(p.search(q) for _, p in _COMPARISONS)
+        or _LOOKUP_RE.search(q) is not None
+    )
+
+
+def answer_table_question(question: str, df: pd.DataFrame) -> Optional[TableAnswer]:
+    """
+    Plan + ejecución; None si la pregunta no es una consulta que sepamos calcular.
+    """
+    plan = plan_question(question, df)
+    if plan is None:
+        return None
+    return execute_plan(plan, df)
+
+
+def answer_stored_question(
+    question: str,
+    path: str,
+    reader: Callable[..., pd.DataFrame],
+    max_rows: int = TABLE_QA_MAX_ROWS,
+) -> Optional[TableAnswer]:
+    """
+    Filtro, agregado o búsqueda sobre la tabla guardada en `path`, leyendo lo
+    mínimo: `reader(path, columns=..., limit=...)` (rag.table_store.read_table).
+
+    El plan sale de las primeras TABLE_QA_PLAN_ROWS filas; si la tabla tiene
+    más, se vuelve a leer hasta `max_rows` filas: solo las columnas del plan
+    para los agregados y todas para las búsquedas (se devuelven filas enteras).
+    """
+    sample = reader(path, limit=min(TABLE_QA_PLAN_ROWS, max_rows))
+    plan = plan_question(question, sample)
+    if plan is None:
+        return None
+
+    schema = [str(c) for c in sample.columns]
+    total = sample.attrs.get("total_rows")
+    if total is not None and total <= len(sample):
+        return execute_plan(plan, sample)
+    if plan.is_aggregate:
+        # Un conteo sin columnas también necesita una para tener las filas
+        df = reader(path, columns=plan.columns() or schema[:1], limit=max_rows)
+    else:
+        df = reader(path, limit=max_rows)
+    df.columns = [str(c) for c in df.columns]
+    answer = execute_plan(plan, df)
+    answer.columns = schema
+    return answer
@@ -0,0 +1,327 @@
+# backend_django/rag/table_store.py
+"""
+Almacén columnar de tablas: cada tabla extraída se guarda también en Parquet
+junto a su CSV ("{doc_id}/tables/table_P_table_I.parquet").
+
+- El CSV se mantiene para descargas y compatibilidad.
+- El Parquet se escribe en row groups de TABLE_PARQUET_ROW_GROUP filas; al
+  leer se piden a MinIO solo el footer y los row groups/columnas necesarios
+  (peticiones Range), sin bajar el fichero entero.
+- Esquema, nº de filas y estadísticas por columna van al meta del Asset.
+- La firma de contenido (dedupe) y el preview markdown también se calculan
+  al ingerir y se guardan en el Asset: el chat no vuelve a bajar el CSV.
+"""
+from __future__ import annotations
+
+import csv
+import hashlib
+import io
+import logging
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from minio.error import S3Error
+
+from integrations.minio_client import download_bytes, download_range, object_size
+
+logger = logging.getLogger(__name__)
+
+TABLE_PARQUET_ROW_GROUP = int(os.getenv("TABLE_PARQUET_ROW_GROUP", "1000"))
+TABLE_PARQUET_COMPRESSION = os.getenv("TABLE_PARQUET_COMPRESSION", "zstd")
+PARQUET_CONTENT_TYPE = "application/vnd.apache.parquet"
+TABLE_PREVIEW_ROWS = int(os.getenv("TABLE_PREVIEW_ROWS", "20"))
+TABLE_PREVIEW_CHARS = int(os.getenv("TABLE_PREVIEW_CHARS", "4000"))
+
+
+def parquet_path_for(path: str) -> str:
+    """
+    Ruta Parquet equivalente a un CSV de tabla (o la misma si ya es Parquet).
+    """
+    if path.lower().endswith(".csv"):
+        return path[:-4] + ".parquet"
+    return path
+
+
+def column_names(headers: Sequence[Any]) -> List[str]:
+    """
+    Nombres de columna válidos para Parquet: texto, no vacíos y únicos.
+    """
+    out: List[str] = []
+    seen: Dict[str, int] = {}
+    for i, h in enumerate(headers):
+        name = str(h).strip() or f"col_{i + 1}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}_{seen[name]}"
+        seen.setdefault(name, 1)
+        out.append(name)
+    return out
+
+
+def _column_stats(series: pd.Series) -> Dict[str, Any]:
+    values = series.dropna()
+    values = values[values.str.strip() != ""]
+    stats: Dict[str, Any] = {
+        "nulls": int(len(series) - len(values)),
+        "distinct": int(values.nunique()),
+        "numeric": False,
+    }
+    if values.empty:
+        return stats
+
+    nums = pd.to_numeric(values, errors="coerce")
+    if nums.notna().mean() >= 0.8:
+        nums = nums.dropna()
+        stats.update(numeric=True, min=float(nums.min()), max=float(nums.max()), mean=float(nums.mean()))
+    else:
+        stats.update(min=str(values.min()), max=str(values.max()))
+    return stats
+
+
+def table_to_parquet(df: pd.DataFrame) -> Tuple[bytes, Dict[str, Any]]:
+    """
+    Serializa la tabla a Parquet (columnas de texto, como en el CSV) y devuelve
+    (bytes, meta) con esquema y estadísticas para el Asset.
+    """
+    names = column_names(df.columns)
+    frame = df.copy()
+    frame.columns = names
+    frame = frame.astype("string")
+
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    buf = io.BytesIO()
+    pq.write_table(
+        table,
+        buf,
+        row_group_size=max(1, TABLE_PARQUET_ROW_GROUP),
+        compression=TABLE_PARQUET_COMPRESSION,
+    )
+    data = buf.getvalue()
+
+    meta = {
+        "num_rows": int(frame.shape[0]),
+        "schema": [
+            {"name": name, "header": str(header), "type": str(table.schema.field(name).type)}
+            for name, header in zip(names, df.columns)
+        ],
+        "column_stats": {name: _column_stats(frame[name]) for name in names},
+        "parquet_bytes": len(data),
+    }
+    return data, meta
+
+
+def sniff_dialect(sample: str):
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=[",", ";", "\t", "|"])
+    except Exception:
+        return csv.excel  # coma por defecto
+
+
+def table_signature(csv_bytes: bytes) -> str:
+    """
+    Firma estable:
+    - normaliza whitespace
+    - detecta delimitador
+    - hace la firma independiente del orden de filas (body sorted)
+    """
+    text = csv_bytes.decode("utf-8-sig", errors="replace")
+    sample = text[:4096]
+    dialect = sniff_dialect(sample)
+
+    reader = csv.reader(io.StringIO(text), dialect=dialect)
+    rows = []
+    for row in reader:
+        row = [" ".join(c.strip().split()).lower() for c in row]
+        if any(row):
+            rows.append(tuple(row))
+
+    if not rows:
+        return hashlib.sha256(csv_bytes).hexdigest()
+
+    header = rows[0]
+    body = sorted(rows[1:])  # <-- clave: ignora orden
+    canon = "\n".join(
+        [",".join(header)] + [",".join(r) for r in body]
+    ).encode("utf-8")
+
+    return hashlib.sha256(canon).hexdigest()
+
+
+def table_preview(csv_bytes: bytes, max_rows: int = TABLE_PREVIEW_ROWS, max_chars: int = TABLE_PREVIEW_CHARS) -> str:
+    text = csv_bytes.decode("utf-8-sig", errors="replace")
+    dialect = sniff_dialect(text[:4096])
+
+    reader = csv.reader(io.StringIO(text), dialect=dialect)
+    rows = []
+    for row in reader:
+        row = [c.strip() for c in row]
+        if any(row):
+            rows.append(row)
+        if len(rows) >= max_rows:
+            break
+
+    return render_preview(rows, max_chars)
+
+
+def render_preview(rows: List[List[str]], max_chars: int) -> str:
+    if not rows:
+        return "(tabla vacía o no parseable)"
+
+    # Render simple tipo markdown
+    header = rows[0]
+    body = rows[1:]
+    lines = []
+    lines.append(" | ".join(header))
+    lines.append(" | ".join(["---"] * len(header)))
+    for r in body:
+        lines.append(" | ".join(r))
+
+    out = "\n".join(lines)
+    if len(out) > max_chars:
+        out = out[:max_chars] + "\n...(recortado)"
+    return out
+
+
+class MinioRangeFile(io.RawIOBase):
+    """
+    Fichero de solo lectura sobre un objeto de MinIO: cada `read` es una
+    petición Range. Suficiente para que pyarrow lea footer y row groups sueltos.
+    """
+
+    def __init__(self, object_name: str, bucket: Optional[str] = None):
+        self.object_name = object_name
+        self.bucket = bucket
+        self.size = object_size(object_name, bucket=bucket)
+        self.pos = 0
+        self.requests = 0
+        self.bytes_read = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self.pos = offset
+        elif whence == io.SEEK_CUR:
+            self.pos += offset
+        elif whence == io.SEEK_END:
+            self.pos = self.size + offset
+        else:
+            raise ValueError(f"whence no soportado: {whence}")
+        self.pos = max(0, min(self.pos, self.size))
+        return self.pos
+
+    def read(self, n: int = -1) -> bytes:
+        if n is None or n < 0:
+            n = self.size - self.pos
+        n = min(n, self.size - self.pos)
+        if n <= 0:
+            return b""
+        data = download_range(self.object_name, self.pos, n, bucket=self.bucket)
+        self.pos += len(data)
+        self.requests += 1
+        self.bytes_read += len(data)
+        return data
+
+    def readinto(self, b) -> int:
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+
+def _slice(df: pd.DataFrame, offset: int, limit: Optional[int]) -> pd.DataFrame:
+    end = None if limit is None else offset + limit
+    return df.iloc[offset:end].reset_index(drop=True)
+
+
+def _read_parquet(
+    path: str,
+    columns: Optional[List[str]],
+    offset: int,
+    limit: Optional[int],
+    bucket: Optional[str],
+) -> pd.DataFrame:
+    source = MinioRangeFile(path, bucket=bucket)
+    pf = pq.ParquetFile(pa.PythonFile(source, mode="r"))
+    md = pf.metadata
+
+    # Solo los row groups que se solapan con [offset, offset + limit)
+    groups: List[int] = []
+    first_row = 0
+    start = 0
+    for i in range(md.num_row_groups):
+        n = md.row_group(i).num_rows
+        if start + n > offset and (limit is None or start < offset + limit):
+            if not groups:
+                first_row = start
+            groups.append(i)
+        start += n
+
+    if groups:
+        table = pf.read_row_groups(groups, columns=columns)
+    else:
+        schema = pf.schema_arrow
+        table = schema.empty_table().select(columns) if columns else schema.empty_table()
+
+    df = _slice(table.to_pandas(), offset - first_row if groups else 0, limit)
+    df.attrs.update(total_rows=md.num_rows, source="parquet", requests=source.requests, bytes_read=source.bytes_read)
+    return df
+
+
+def _read_csv(
+    path: str,
+    columns: Optional[List[str]],
+    offset: int,
+    limit: Optional[int],
+    bucket: Optional[str],
+) -> pd.DataFrame:
+    data = download_bytes(path, bucket=bucket)
+    # Sin cabecera para nombrar las columnas igual que en el Parquet (pandas renombra duplicadas)
+    if not data.strip():
+        df = pd.DataFrame()
+        df.attrs.update(total_rows=0, source="csv", requests=1, bytes_read=len(data))
+        return df
+    df = pd.read_csv(io.BytesIO(data), dtype=str, keep_default_na=False, header=None)
+    df.columns = column_names(df.iloc[0].tolist())
+    df = df.iloc[1:]
+    total = int(df.shape[0])
+    if columns:
+        df = df[[c for c in columns if c in df.columns]]
+    df = _slice(df, offset, limit)
+    df.attrs.update(total_rows=total, source="csv", requests=1, bytes_read=len(data))
+    return df
+
+
+def read_table(
+    path: str,
+    columns: Optional[List[str]] = None,
+    offset: int = 0,
+    limit: Optional[int] = None,
+    bucket: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Lee una tabla guardada (ruta .csv o .parquet) proyectando `columns` y
+    cortando las filas [offset, offset + limit).
+
+    Usa el Parquet si existe y solo descarga los row groups necesarios; las
+    tablas ingeridas antes del Parquet se leen del CSV. `df.attrs` lleva
+    total_rows (filas de la tabla completa), source, requests y bytes_read.
+    """
+    offset = max(0, int(offset or 0))
+    parquet_path = parquet_path_for(path)
+    try:
+        return _read_parquet(parquet_path, columns, offset, limit, bucket)
+    except S3Error as e:
+        if e.code != "NoSuchKey" or parquet_path == path:
+            raise
+        logger.info("[TABLE_STORE] %s sin Parquet, se lee el CSV.", path)
+    return _read_csv(path, columns, offset, limit, bucket)
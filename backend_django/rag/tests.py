@@ -1,3 +1,522 @@
-from django.test import TestCase
+import importlib.util
+from pathlib import Path
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from rag.pipeline.fingerprint import compute_page_fingerprints, plan_reprocessing, removed_pages
+
+FILES_DIR = Path(settings.BASE_DIR).parent / "tests" / "files"
+ONNX_MISSING = [m for m in ("onnxruntime", "torch", "sentence_transformers") if importlib.util.find_spec(m) is None]
+
+
+def _fps(**pages):
+    # _fps(p0="abc") -> {"0": {"text": "abc-text", "table": "abc-table", "image": "abc-image"}}
+    return {k[1:]: {m: f"{v}-{m}" for m in ("text", "table", "image")} for k, v in pages.items()}
+
+
+class ReprocessingPlanTests(SimpleTestCase):
+    def test_without_previous_everything_is_reprocessed(self):
+        plan = plan_reprocessing(_fps(p0="a", p1="b"), None)
+        self.assertEqual(plan, {0: {"text", "table", "image"}, 1: {"text", "table", "image"}})
+
+    def test_unchanged_pages_are_skipped(self):
+        fps = _fps(p0="a", p1="b")
+        self.assertEqual(plan_reprocessing(fps, fps), {})
+
+    def test_only_changed_modalities_are_reprocessed(self):
+        previous = _fps(p0="a", p1="b")
+        new = _fps(p0="a", p1="b")
+        new["1"]["text"] = "otro"
+        self.assertEqual(plan_reprocessing(new, previous), {1: {"text"}})
+
+    def test_new_pages_are_reprocessed(self):
+        plan = plan_reprocessing(_fps(p0="a", p1="b"), _fps(p0="a"))
+        self.assertEqual(plan, {1: {"text", "table", "image"}})
+
+    def test_removed_pages(self):
+        self.assertEqual(removed_pages(_fps(p0="a"), _fps(p0="a", p1="b", p2="c")), [1, 2])
+        self.assertEqual(removed_pages(_fps(p0="a"), None), [])
+
+
+class PageFingerprintTests(SimpleTestCase):
+    def setUp(self):
+        self.pdf = (FILES_DIR / "test_text_and_tables.pdf").read_bytes()
+
+    def test_fingerprints_are_stable(self):
+        configs = {"text": {"v": 1}, "table": {"v": 1}, "image": {"v": 1}}
+        first = compute_page_fingerprints(self.pdf, configs)
+        self.assertEqual(first, compute_page_fingerprints(self.pdf, configs))
+        self.assertEqual(set(first["0"]), {"text", "table", "image"})
+
+    def test_config_change_only_touches_its_modality(self):
+        before = compute_page_fingerprints(self.pdf, {"text": {"chunk": 256}})
+        after = compute_page_fingerprints(self.pdf, {"text": {"chunk": 512}})
+        plan = plan_reprocessing(after, before)
+        self.assertEqual(sorted(plan), [int(k) for k in sorted(after, key=int)])
+        self.assertTrue(all(modalities == {"text"} for modalities in plan.values()))
+
+
+class ChunkerTests(SimpleTestCase):
+    # Sin tokenizer, TokenCounter cuenta palabras: resultados exactos y sin modelo
+    @staticmethod
+    def _chunker(**kwargs):
+        from rag.pipeline.chunking import Chunker, TokenCounter
+
+        kwargs.setdefault("counter", TokenCounter(None))
+        return Chunker(**kwargs)
+
+    @staticmethod
+    def _text(n, start=1):
+        # Frases de 4 palabras: "Frase uno dos N."
+        return " ".join(f"Frase uno dos {i}." for i in range(start, start + n))
+
+    def test_split_sentences_marks_paragraph_ends(self):
+        from rag.pipeline.chunking import split_sentences
+
+        self.assertEqual(
+            split_sentences("Hola mundo. Adiós\nmundo.\n\n¿Otra? Sí."),
+            [("Hola mundo.", False), ("Adiós mundo.", True), ("¿Otra?", False), ("Sí.", True)],
+        )
+
+    def test_chunks_respect_max_tokens(self):
+        chunks = self._chunker(max_tokens=10, overlap_tokens=0, cross_pages=False).feed(0, self._text(10))
+        self.assertTrue(all(c.n_tokens <= 10 for c in chunks))
+        self.assertEqual(" ".join(c.text for c in chunks), self._text(10))
+
+    def test_consecutive_chunks_overlap(self):
+        chunks = self._chunker(max_tokens=12, overlap_tokens=4, cross_pages=False).feed(0, self._text(7))
+        # Cada chunk repite la última frase (4 tokens) del anterior
+        self.assertEqual([c.text for c in chunks], [self._text(3), self._text(3, start=3), self._text(3, start=5)])
+
+    def test_long_sentence_is_split(self):
+        chunks = self._chunker(max_tokens=5, overlap_tokens=0, cross_pages=False).feed(0, " ".join(["palabra"] * 12) + ".")
+        self.assertEqual([c.n_tokens for c in chunks], [5, 5, 2])
+
+    def test_pages_are_closed_without_cross_pages(self):
+        chunker = self._chunker(max_tokens=50, overlap_tokens=0, cross_pages=False)
+        first = chunker.feed(0, self._text(2))
+        second = chunker.feed(1, self._text(2, start=3))
+        self.assertEqual([(c.page, c.pages) for c in first + second], [(0, (0,)), (1, (1,))])
+        self.assertEqual(chunker.flush(), [])
+
+    def test_chunk_crosses_pages_with_cross_pages(self):
+        chunker = self._chunker(max_tokens=50, overlap_tokens=0, cross_pages=True)
+        self.assertEqual(chunker.feed(0, self._text(2)), [])
+        self.assertEqual(chunker.feed(1, self._text(2, start=3)), [])
+        (chunk,) = chunker.flush()
+        self.assertEqual((chunk.page, chunk.pages, chunk.n_tokens), (0, (0, 1), 16))
+
+
+class TableStoreTests(SimpleTestCase):
+    """
+    read_table sobre un MinIO en memoria (solo se sustituyen las llamadas de red).
+    """
+
+    def setUp(self):
+        import pandas as pd
+        from minio.error import S3Error
+
+        from rag import table_store
+
+        self.df = pd.DataFrame(
+            [[f"c{i}", str(i), "x" if i % 2 else "y"] for i in range(25)],
+            columns=["Cuenta", "Importe", "Tipo"],
+        )
+        self.objects = {"doc/tables/t.csv": self.df.to_csv(index=False).encode("utf-8")}
+
+        def stored(name, bucket=None):
+            if name not in self.objects:
+                raise S3Error(
+                    response=None, code="NoSuchKey", message="", resource=name, request_id="", host_id="",
+                )
+            return self.objects[name]
+
+        patches = [
+            mock.patch.object(table_store, "TABLE_PARQUET_ROW_GROUP", 10),
+            mock.patch.object(table_store, "download_bytes", side_effect=stored),
+            mock.patch.object(table_store, "object_size", side_effect=lambda name, bucket=None: len(stored(name))),
+            mock.patch.object(
+                table_store, "download_range",
+                side_effect=lambda name, offset, length, bucket=None: stored(name)[offset:offset + length],
+            ),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.store = table_store
+
+    def _with_parquet(self):
+        data, meta = self.store.table_to_parquet(self.df)
+        self.objects["doc/tables/t.parquet"] = data
+        return meta
+
+    def test_parquet_meta(self):
+        meta = self._with_parquet()
+        self.assertEqual(meta["num_rows"], 25)
+        self.assertEqual([c["name"] for c in meta["schema"]], ["Cuenta", "Importe", "Tipo"])
+        self.assertTrue(meta["column_stats"]["Importe"]["numeric"])
+        self.assertEqual(meta["column_stats"]["Importe"]["max"], 24.0)
+
+    def test_parquet_offset_limit_and_columns(self):
+        self._with_parquet()
+        df = self.store.read_table("doc/tables/t.csv", columns=["Importe"], offset=8, limit=5)
+        self.assertEqual(list(df.columns), ["Importe"])
+        self.assertEqual(df["Importe"].tolist(), ["8", "9", "10", "11", "12"])
+        self.assertEqual((df.attrs["source"], df.attrs["total_rows"]), ("parquet", 25))
+
+    def test_parquet_reads_only_needed_bytes(self):
+        self._with_parquet()
+        whole = self.store.read_table("doc/tables/t.csv")
+        part = self.store.read_table("doc/tables/t.csv", columns=["Tipo"], offset=20, limit=2)
+        self.assertEqual(len(whole), 25)
+        self.assertLess(part.attrs["bytes_read"], whole.attrs["bytes_read"])
+
+    def test_offset_past_the_end(self):
+        self._with_parquet()
+        df = self.store.read_table("doc/tables/t.csv", columns=["Cuenta"], offset=40, limit=5)
+        self.assertEqual((len(df), list(df.columns)), (0, ["Cuenta"]))
+
+    def test_csv_fallback_without_parquet(self):
+        df = self.store.read_table("doc/tables/t.csv", columns=["Cuenta", "Tipo"], offset=23)
+        self.assertEqual(df.values.tolist(), [["c23", "x"], ["c24", "y"]])
+        self.assertEqual((df.attrs["source"], df.attrs["total_rows"]), ("csv", 25))
+
+    def test_column_names_are_unique_and_not_empty(self):
+        self.assertEqual(self.store.column_names(["A", "", "A", " B "]), ["A", "col_2", "A_2", "B"])
+
+
+class TableQATests(SimpleTestCase):
+    def setUp(self):
+        import pandas as pd
+
+        self.df = pd.DataFrame({
+            "Cuenta": ["Caja", "Banco", "Caja", "Proveedores", "Banco", "Caja"],
+            "Nivel": ["Avanzado", "Básico", "Básico", "Avanzado", "Avanzado", "Básico"],
+            "Importe": ["1.000,50", "200", "300", "45", "1.500", "12,5"],
+        })
+
+    def _plan(self, question):
+        from rag.table_qa import plan_question
+
+        return plan_question(question, self.df)
+
+    def _reader(self, total_rows=None):
+        # Imita rag.table_store.read_table sobre self.df
+        calls = []
+
+        def reader(path, columns=None, offset=0, limit=None):
+            calls.append({"columns": columns, "limit": limit})
+            df = (self.df[columns] if columns else self.df).iloc[offset:None if limit is None else offset + limit].copy()
+            df.attrs["total_rows"] = total_rows or len(self.df)
+            return df
+
+        return reader, calls
+
+    def test_numeric_column_accepts_locale_formats(self):
+        from rag.table_qa import numeric_column
+
+        self.assertEqual(numeric_column(self.df["Importe"]).tolist(), [1000.5, 200.0, 300.0, 45.0, 1500.0, 12.5])
+        self.assertIsNone(numeric_column(self.df["Cuenta"]))
+
+    def test_plan_sum_by_group(self):
+        plan = self._plan("¿Cuál es el total de Importe por Cuenta?")
+        self.assertEqual((plan.op, plan.target, plan.group_by, plan.filters), ("sum", "Importe", "Cuenta", []))
+
+    def test_plan_count_with_value_filter(self):
+        plan = self._plan("¿Cuántas filas con Nivel Avanzado?")
+        self.assertEqual((plan.op, plan.filters), ("count", [("Nivel", "in", ["Avanzado"])]))
+
+    def test_comparison_is_a_filter_not_a_max(self):
+        plan = self._plan("importe medio mayor de 100")
+        self.assertEqual((plan.op, plan.target, plan.filters), ("mean", "Importe", [("Importe", ">", 100.0)]))
+
+    def test_lookup_needs_rows_or_comparison(self):
+        self.assertIsNone(self._plan("¿Qué importe tiene Caja?"))
+        plan = self._plan("filas de Caja")
+        self.assertEqual((plan.op, plan.filters), (None, [("Cuenta", "in", ["Caja"])]))
+        self.assertFalse(plan.is_aggregate)
+        self.assertEqual(self._plan("importes por encima de 400").filters, [("Importe", ">", 400.0)])
+
+    def test_unrelated_question_has_no_plan(self):
+        self.assertIsNone(self._plan("Resume el documento"))
+
+    def test_execute_aggregate(self):
+        from rag.table_qa import answer_table_question
+
+        answer = answer_table_question("suma de Importe donde Cuenta Caja", self.df)
+        self.assertEqual((answer.rows_matched, answer.rows_total), (3, 6))
+        self.assertTrue(answer.text.endswith("Resultado:\n1313"))
+
+    def test_execute_max_returns_the_row(self):
+        from rag.table_qa import answer_table_question
+
+        answer = answer_table_question("¿Cuál es el Importe máximo?", self.df)
+        self.assertIn("1500\nFila:", answer.text)
+        self.assertIn("Banco | Avanzado | 1.500", answer.text)
+
+    def test_lookup_result_is_row_capped(self):
+        from rag.table_qa import TablePlan, execute_plan
+
+        answer = execute_plan(TablePlan(op=None, filters=[("Importe", ">", 10.0)]), self.df, max_rows=2)
+        self.assertEqual(answer.rows_matched, 6)
+        self.assertIn("6 filas coinciden.", answer.text)
+        self.assertIn("...(4 filas más)", answer.text)
+
+    def test_stored_aggregate_reads_only_plan_columns(self):
+        from rag.table_qa import answer_stored_question
+
+        reader, calls = self._reader(total_rows=100)
+        answer = answer_stored_question("total de Importe por Cuenta", "t.csv", reader)
+        self.assertEqual(calls[-1]["columns"], ["Importe", "Cuenta"])
+        self.assertFalse(answer.complete)  # 6 de 100 filas
+        self.assertEqual(answer.columns, ["Cuenta", "Nivel", "Importe"])
+
+    def test_stored_lookup_reads_every_column(self):
+        from rag.table_qa import answer_stored_question
+
+        reader, calls = self._reader(total_rows=100)
+        answer = answer_stored_question("registros de Banco", "t.csv", reader)
+        self.assertIsNone(calls[-1]["columns"])
+        self.assertEqual(answer.rows_matched, 2)
+
+    def test_stored_small_table_is_read_once(self):
+        from rag.table_qa import answer_stored_question
+
+        reader, calls = self._reader()
+        answer = answer_stored_question("¿cuántas filas de Caja?", "t.csv", reader)
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(answer.complete)
+        self.assertEqual(answer.rows_matched, 3)
+
+    def test_looks_analytical(self):
+        from rag.table_qa import looks_analytical
+
+        self.assertTrue(looks_analytical("media de ventas"))
+        self.assertTrue(looks_analytical("filas de Caja"))
+        self.assertTrue(looks_analytical("importes menores de 5"))
+        self.assertFalse(looks_analytical("Resume el documento"))
+
+
+class EmbeddingCacheTests(SimpleTestCase):
+    def setUp(self):
+        import itertools
+        import tempfile
+
+        from rag.embeddings import cache
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        # Reloj monótono falso: el orden LRU no depende de la resolución de time.time()
+        clock = itertools.count(1)
+        patcher = mock.patch.object(cache, "time", mock.Mock(time=lambda: float(next(clock))))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache_module = cache
+        # Vectores de 4 float32 = 16 bytes: caben 6 entradas en 100 bytes
+        self.cache = cache.DiskEmbeddingCache(path=f"{tmp.name}/emb.sqlite3", max_bytes=100)
+
+    def test_roundtrip_and_counters(self):
+        self.cache.set_many({"a": [0.5, 1.0, 1.5, 2.0]})
+        self.assertEqual(self.cache.get_many(["a", "b"]), [[0.5, 1.0, 1.5, 2.0], None])
+        self.assertEqual((self.cache.hits, self.cache.misses, self.cache.writes), (1, 1, 1))
+
+    def test_evicts_least_recently_used(self):
+        for key in "abcdef":
+            self.cache.set_many({key: [1.0, 2.0, 3.0, 4.0]})
+        self.cache.get_many(["a"])  # "a" pasa a ser la más reciente
+        self.cache.set_many({"g": [1.0, 2.0, 3.0, 4.0]})
+
+        present = {k for k, v in zip("abcdefg", self.cache.get_many(list("abcdefg"))) if v is not None}
+        self.assertIn("a", present)
+        self.assertIn("g", present)
+        self.assertNotIn("b", present)
+        self.assertGreater(self.cache.evictions, 0)
+        self.assertLessEqual(self.cache.stats()["bytes"], 100 * self.cache_module._EVICT_TARGET)
+
+    def test_content_key_depends_on_model(self):
+        key = self.cache_module.content_key
+        self.assertEqual(key("m1", "hola"), key("m1", "hola".encode("utf-8")))
+        self.assertNotEqual(key("m1", "hola"), key("m2", "hola"))
+
+    def test_cached_embed_only_embeds_misses_once(self):
+        calls = []
+
+        def embed(items):
+            calls.append(list(items))
+            return [[float(len(t))] * 4 if t else None for t in items]
+
+        with mock.patch.object(self.cache_module, "get_embedding_cache", return_value=self.cache):
+            first = self.cache_module.cached_embed("m", ["ab", "abc", "ab", ""], ["ab", "abc", "ab", ""], embed)
+            second = self.cache_module.cached_embed("m", ["abc", ""], ["abc", ""], embed)
+
+        self.assertEqual(first, [[2.0] * 4, [3.0] * 4, [2.0] * 4, None])
+        self.assertEqual(second, [[3.0] * 4, None])
+        # Duplicado del lote calculado una vez; el None no se guarda y se vuelve a pedir
+        self.assertEqual(calls, [["ab", "abc", ""], [""]])
+
+
+class EmbeddingServerProtocolTests(SimpleTestCase):
+    def test_vectors_roundtrip_with_missing(self):
+        from rag.embeddings.client import decode_vectors, encode_vectors
+
+        vectors = [[0.5, -1.0, 2.0], None, [1.0, 0.0, 0.25]]
+        message = encode_vectors(vectors)
+        self.assertEqual((message["dim"], message["missing"]), (3, [1]))
+        self.assertEqual(decode_vectors(message, 3), vectors)
+        self.assertEqual(decode_vectors(encode_vectors([None, None]), 2), [None, None])
+
+    def test_decode_vectors_checks_the_count(self):
+        from rag.embeddings.client import EmbeddingServerError, decode_vectors, encode_vectors
+
+        with self.assertRaises(EmbeddingServerError):
+            decode_vectors(encode_vectors([[1.0, 2.0]]), 2)
+
+    def test_items_roundtrip(self):
+        from rag.embeddings.client import decode_items, encode_items
+
+        images = [b"\x89PNG\r\n\x1a\n\x00", b""]
+        self.assertEqual(decode_items("image", encode_items("image", images)), images)
+        self.assertEqual(decode_items("text", encode_items("text", ["hola", "año"])), ["hola", "año"])
+
+    def test_decode_items_rejects_non_strings(self):
+        from rag.embeddings.client import EmbeddingServerError, decode_items
+
+        for items in ({"a": 1}, [1, 2], "texto"):
+            with self.assertRaises(EmbeddingServerError):
+                decode_items("text", items)
+
+    def test_messages_are_json_not_pickle(self):
+        import pickle
+        from multiprocessing import Pipe
+
+        from rag.embeddings.client import EmbeddingServerError, recv_message, send_message
+
+        a, b = Pipe()
+        send_message(a, {"kind": "text", "items": ["hola"]})
+        self.assertEqual(recv_message(b), {"kind": "text", "items": ["hola"]})
+
+        a.send_bytes(pickle.dumps({"kind": "text"}))
+        with self.assertRaises(ValueError):
+            recv_message(b)
+        a.send_bytes(b"[1, 2]")
+        with self.assertRaises(EmbeddingServerError):
+            recv_message(b)
+
+    def test_authkey_is_required(self):
+        from rag.embeddings.client import EmbeddingClient, EmbeddingServerError, check_authkey
+
+        for key in (b"", b"corta"):
+            with self.assertRaises(EmbeddingServerError):
+                check_authkey(key)
+        self.assertEqual(check_authkey(b"k" * 16), b"k" * 16)
+        # Sin clave válida el cliente no llega a conectar
+        with self.assertRaises(EmbeddingServerError):
+            EmbeddingClient("127.0.0.1:9", authkey=b"").embed("text", ["hola"])
+
+    def test_server_handler_roundtrip(self):
+        import threading
+        from multiprocessing import Pipe
+
+        from rag.embeddings.client import decode_vectors, encode_items, recv_message, send_message
+        from rag.embeddings.server import EmbeddingServer, MicroBatcher
+
+        # Sin modelos: el servidor solo con un batcher de texto falso
+        server = EmbeddingServer.__new__(EmbeddingServer)
+        server.batchers = {"text": MicroBatcher("text", lambda items: [[float(len(t)), 1.0] for t in items])}
+        client_end, server_end = Pipe()
+        handler = threading.Thread(target=server._handle, args=(server_end,), daemon=True)
+        handler.start()
+
+        send_message(client_end, {"kind": "text", "items": encode_items("text", ["ab", "abcd"])})
+        response = recv_message(client_end)
+        self.assertTrue(response["ok"])
+        self.assertEqual(decode_vectors(response, 2), [[2.0, 1.0], [4.0, 1.0]])
+
+        send_message(client_end, {"kind": "video", "items": []})
+        self.assertEqual(recv_message(client_end), {"ok": False, "error": "tipo desconocido: video"})
+
+        # JSON inválido: el servidor corta la conexión
+        with self.assertLogs("rag.embeddings.server", "WARNING"):
+            client_end.send_bytes(b"\x80\x04no-json")
+            handler.join(timeout=5)
+        self.assertFalse(handler.is_alive())
+
+
+@skipIf(ONNX_MISSING, f"sin {', '.join(ONNX_MISSING)}")
+class OnnxParityTests(SimpleTestCase):
+    """
+    embed_texts / embed_images con EMBED_BACKEND=onnx (int8) frente a PyTorch.
+    Sin caché ni servidor: los dos backends calculan los vectores en este proceso.
+    Se salta si los modelos no están exportados (python manage.py export_onnx).
+    """
+
+    def _embed(self, kind, items, backend):
+        from rag.embeddings import image_embeddings, onnx_backend, text_embeddings
+
+        if kind == "text":
+            module, loader, embed = text_embeddings, text_embeddings._load_text_model, text_embeddings.embed_texts
+            model_name = text_embeddings.TEXT_EMBEDDING_MODEL
+        else:
+            module, loader, embed = image_embeddings, image_embeddings._load_clip_model, image_embeddings.embed_images
+            model_name = image_embeddings.CLIP_MODEL_NAME
+        loader.cache_clear()
+        self.addCleanup(loader.cache_clear)
+        with mock.patch.object(onnx_backend, "EMBED_BACKEND", backend), \
+                mock.patch.object(module, "cached_embed", lambda model_id, items, contents, fn: fn(items)), \
+                mock.patch.object(module, "remote_or_local", lambda kind, items, fn: fn(items)):
+            try:
+                vectors = embed(items)
+            except OSError as e:  # pesos de PyTorch no descargados (sin red)
+                self.skipTest(f"modelo no disponible: {e}")
+            self.assertEqual(onnx_backend.use_onnx(kind, model_name), backend == "onnx")
+        return vectors
+
+    def _assert_parity(self, kind, items):
+        import numpy as np
+
+        from rag.embeddings.onnx_backend import PARITY_MIN_COSINE
+
+        ref = np.asarray(self._embed(kind, items, "torch"), dtype="float32")
+        got = np.asarray(self._embed(kind, items, "onnx"), dtype="float32")
+        self.assertEqual(ref.shape, got.shape)
+        cos = (ref * got).sum(axis=1) / (np.linalg.norm(ref, axis=1) * np.linalg.norm(got, axis=1)).clip(1e-12)
+        self.assertGreaterEqual(float(cos.min()), PARITY_MIN_COSINE[kind], f"coseno por entrada: {cos.round(4).tolist()}")
+
+    def test_text_parity(self):
+        from rag.embeddings import onnx_backend
+        from rag.embeddings.text_embeddings import TEXT_EMBEDDING_MODEL
+
+        if not onnx_backend.text_exported(TEXT_EMBEDDING_MODEL):
+            self.skipTest(f"{TEXT_EMBEDDING_MODEL} sin exportar (python manage.py export_onnx --models text)")
+        from rag.pipeline.chunking import chunk_text
+        from rag.pipeline.text_extractor import extract_text_from_pdf
+
+        texts = [
+            chunk
+            for name in ("test_text_and_tables.pdf", "multimodal_test.pdf")
+            for page in extract_text_from_pdf((FILES_DIR / name).read_bytes())
+            for chunk in chunk_text(page["text"])
+        ]
+        texts += ["¿Cuál es el total de ingresos por región?", "Revenue by quarter", "a"]
+        self._assert_parity("text", texts)
+
+    def test_image_parity(self):
+        from rag.embeddings import onnx_backend
+        from rag.embeddings.image_embeddings import CLIP_MODEL_NAME
+
+        if not onnx_backend.clip_exported(CLIP_MODEL_NAME):
+            self.skipTest(f"{CLIP_MODEL_NAME} sin exportar (python manage.py export_onnx --models image)")
+        from io import BytesIO
+
+        from PIL import Image
+
+        from rag.pipeline.image_extractor import extract_images_from_pdf
+
+        images = [img["bytes"] for img in extract_images_from_pdf("parity", (FILES_DIR / "multimodal_test.pdf").read_bytes())]
+        for size, color in (((224, 224), (200, 30, 30)), ((640, 120), (20, 120, 220))):
+            buf = BytesIO()
+            Image.new("RGB", size, color).save(buf, format="PNG")
+            images.append(buf.getvalue())
+        self._assert_parity("image", images)
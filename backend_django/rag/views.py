@@ -3,11 +3,17 @@ from __future__ import annotations
 
 from typing import Any, Dict, List, Optional, Tuple
 
-from integrations.qdrant_client import search_text_and_tables, search_images
+from functools import partial
+
+from integrations.embedding_registry import active_target
+from integrations.qdrant_client import TEXT_COLLECTION, search_text_and_tables, search_images
 from integrations.minio_client import download_bytes
 from rag.embeddings.text_embeddings import embed_text
+from rag.embeddings.query_cache import query_vector_cache
 from rag.embeddings.image_embeddings import embed_image
 from rag.llm.chat import call_llm
+from rag.table_store import read_table, render_preview, table_signature
+from rag.table_qa import TABLE_QA_ENABLED, answer_stored_question, looks_analytical
 
 import uuid
 from django.db import transaction, IntegrityError
@@ -25,10 +31,6 @@ from documents.models import Document
 import math
 import os
 
-import csv
-import io
-import hashlib
-
 from .observability import normalize_usage
 from rag.models import RagRequestLog
 import time
@@ -103,7 +105,13 @@ def list_assets_for_docs(doc_ids: list[str], kind: str, limit: int = 30) -> list
 
             page = getattr(a, "page", None)
             title = f"{d.original_filename or d.id} · {kind}" + (f" · pág {page}" if page else "")
-            out.append({"path": storage_key, "title": title})
+            item = {"path": storage_key, "title": title}
+            if kind == "table":
+                # Calculados al ingerir: dedupe y preview sin bajar el CSV
+                meta = getattr(a, "meta", None) or {}
+                item["signature"] = getattr(a, "signature", None) or meta.get("signature")
+                item["preview"] = meta.get("preview")
+            out.append(item)
 
             if len(out) >= limit:
                 return out
@@ -112,17 +120,23 @@ def list_assets_for_docs(doc_ids: list[str], kind: str, limit: int = 30) -> list
 
 
 
-def search_balanced_text_tables(q_vec, doc_ids, top_k_int):
+def search_balanced_text_tables(q_vec, doc_ids, top_k_int, collection_name=TEXT_COLLECTION, search_params=None):
     # cuota por doc (sube el mínimo para asegurar recall)
     per_doc = max(3, math.ceil(top_k_int / max(1, len(doc_ids))))
     all_hits = []
     for did in doc_ids:
         all_hits.extend(
-            search_text_and_tables(query_vector=q_vec, top_k=per_doc, doc_ids=[did]) or []
+            search_text_and_tables(
+                query_vector=q_vec, top_k=per_doc, doc_ids=[did], collection_name=collection_name,
+                search_params=search_params,
+            ) or []
         )
     # opcional: añade un global extra para mejorar ranking cross-doc
     all_hits.extend(
-        search_text_and_tables(query_vector=q_vec, top_k=top_k_int, doc_ids=doc_ids) or []
+        search_text_and_tables(
+            query_vector=q_vec, top_k=top_k_int, doc_ids=doc_ids, collection_name=collection_name,
+            search_params=search_params,
+        ) or []
     )
 
     # dedup por point.id si existe, si no por (modality|content)
@@ -138,53 +152,19 @@ def search_balanced_text_tables(q_vec, doc_ids, top_k_int):
     hits.sort(key=lambda x: float(getattr(x, "score", 0.0) or 0.0), reverse=True)
     return hits
 
-def _sniff_dialect(sample: str):
-    try:
-        return csv.Sniffer().sniff(sample, delimiters=[",", ";", "\t", "|"])
-    except Exception:
-        return csv.excel  # coma por defecto
-
-def _table_signature(csv_bytes: bytes) -> str:
-    """
-    Firma estable:
-    - normaliza whitespace
-    - detecta delimitador
-    - hace la firma independiente del orden de filas (body sorted)
-    """
-    text = csv_bytes.decode("utf-8-sig", errors="replace")
-    sample = text[:4096]
-    dialect = _sniff_dialect(sample)
-
-    reader = csv.reader(io.StringIO(text), dialect=dialect)
-    rows = []
-    for row in reader:
-        row = [" ".join(c.strip().split()).lower() for c in row]
-        if any(row):
-            rows.append(tuple(row))
-
-    if not rows:
-        return hashlib.sha256(csv_bytes).hexdigest()
-
-    header = rows[0]
-    body = sorted(rows[1:])  # <-- clave: ignora orden
-    canon = "\n".join(
-        [",".join(header)] + [",".join(r) for r in body]
-    ).encode("utf-8")
-
-    return hashlib.sha256(canon).hexdigest()
-
 def dedup_table_assets_by_content(table_assets: list[dict], downloader=download_bytes) -> tuple[list[dict], list[dict]]:
     """
-    Input: [{"path":..., "title":...}, ...]
+    Input: [{"path":..., "title":..., "signature"?: ...}, ...]
     Output:
       - unique_assets: lista (representantes)
       - dup_groups: [{ "representative": {...}, "duplicates": [ {...}, ... ] }, ...]
+
+    Usa la firma guardada al ingerir; solo descarga el CSV de tablas antiguas sin firma.
     """
     groups: dict[str, list[dict]] = {}
     for t in table_assets:
         try:
-            b = downloader(t["path"])
-            sig = _table_signature(b)
+            sig = t.get("signature") or table_signature(downloader(t["path"]))
         except Exception:
             # si falla descarga, lo tratamos como único por path
             sig = f"err:{t['path']}"
@@ -199,35 +179,30 @@ def dedup_table_assets_by_content(table_assets: list[dict], downloader=download_
 
     return unique, dup_groups
 
-def _table_preview(csv_bytes: bytes, max_rows: int = TABLE_PREVIEW_ROWS, max_chars: int = TABLE_PREVIEW_CHARS) -> str:
-    text = csv_bytes.decode("utf-8-sig", errors="replace")
-    dialect = _sniff_dialect(text[:4096])
-
-    reader = csv.reader(io.StringIO(text), dialect=dialect)
-    rows = []
-    for row in reader:
-        row = [c.strip() for c in row]
-        if any(row):
-            rows.append(row)
-        if len(rows) >= max_rows:
-            break
+def _frame_preview(df, max_chars: int = TABLE_PREVIEW_CHARS) -> str:
+    """
+    Igual que `table_preview`, pero desde la lectura parcial de `read_table`.
+    """
+    rows = [[str(c) for c in df.columns]]
+    rows += [["" if v is None else str(v).strip() for v in r] for r in df.values.tolist()]
+    return render_preview(rows, max_chars)
 
-    if not rows:
-        return "(tabla vacía o no parseable)"
-
-    # Render simple tipo markdown
-    header = rows[0]
-    body = rows[1:]
-    lines = []
-    lines.append(" | ".join(header))
-    lines.append(" | ".join(["---"] * len(header)))
-    for r in body:
-        lines.append(" | ".join(r))
-
-    out = "\n".join(lines)
-    if len(out) > max_chars:
-        out = out[:max_chars] + "\n...(recortado)"
-    return out
+def _table_block(path: str, max_chars: int = TABLE_PREVIEW_CHARS, reader=read_table) -> str:
+    """
+    Tabla completa ("cabecera | ..." y una línea por fila) referenciada por
+    `table_ref`. Quien la usa la recorta a `max_chars`, así que solo se leen
+    las primeras filas: cada línea ocupa al menos 2 caracteres.
+    """
+    df = reader(path, limit=max(1, max_chars // 2))
+    lines = [" | ".join(map(str, df.columns))] if len(df.columns) else []
+    size = len(lines[0]) if lines else 0
+    for r in df.values.tolist():
+        line = " | ".join("" if v is None else str(v) for v in r)
+        lines.append(line)
+        size += len(line) + 1
+        if size > max_chars:
+            break
+    return "\n".join(lines)
 
 def run_your_current_rag(
     question: str,
@@ -266,6 +241,13 @@ def run_your_current_rag(
         timings["minio_ms"] += _ms(time.perf_counter() - t_dl)
         return b
 
+    def read_table_timed(path: str, **kwargs):
+        t_dl = time.perf_counter()
+        try:
+            return read_table(path, **kwargs)
+        finally:
+            timings["minio_ms"] += _ms(time.perf_counter() - t_dl)
+
     image_titles: List[str] = []
     q = (question or "").strip()
     if not q:
@@ -279,16 +261,28 @@ def run_your_current_rag(
         top_k_search = top_k_int
 
     t0 = time.perf_counter()
-    q_vec_text = embed_text(q)
+    # Colección activa y su modelo (registro de modelos): la pregunta se vectoriza
+    # con el mismo modelo que los puntos de la colección consultada
+    text_target = active_target("text")
+    q_vec_text, query_cache_metrics = query_vector_cache.embed(
+        text_target.model_id, q, partial(embed_text, model_name=text_target.model_id),
+    )
     timings["embed_ms"] += _ms(time.perf_counter() - t0)
+    timings.update(query_cache_metrics)
     
     t0 = time.perf_counter()
     if doc_ids and len(doc_ids) > 1:
-        hits = search_balanced_text_tables(q_vec_text, doc_ids, top_k_int)
+        hits = search_balanced_text_tables(
+            q_vec_text, doc_ids, top_k_int,
+            collection_name=text_target.collection, search_params=text_target.search_params(),
+        )
         top_k_search = min(50, top_k_int * 2)  # si quieres recortar después
         hits = hits[:top_k_search]
     else:
-        hits = search_text_and_tables(query_vector=q_vec_text, top_k=top_k_search, doc_ids=doc_ids)
+        hits = search_text_and_tables(
+            query_vector=q_vec_text, top_k=top_k_search, doc_ids=doc_ids, collection_name=text_target.collection,
+            search_params=text_target.search_params(),
+        )
     timings["qdrant_ms"] += _ms(time.perf_counter() - t0)
 
     def dominant_doc_id_from_hits(hits) -> Optional[str]:
@@ -315,7 +309,10 @@ def run_your_current_rag(
         top_doc_id = top_meta.get("doc_id")
         if top_doc_id:
             doc_ids = [top_doc_id]
-            hits = search_text_and_tables(query_vector=q_vec_text, top_k=top_k_int, doc_ids=doc_ids)
+            hits = search_text_and_tables(
+                query_vector=q_vec_text, top_k=top_k_int, doc_ids=doc_ids, collection_name=text_target.collection,
+                search_params=text_target.search_params(),
+            )
 
     # 3) Dedup hits por (modality|content) para no repetir
     seen = set()
@@ -337,6 +334,8 @@ def run_your_current_rag(
     # 4) Construir contexto (texto + tabla)
     first_table_path: Optional[str] = None
     first_table_block: Optional[str] = None
+    first_table_ref: Optional[Dict[str, Any]] = None
+    table_hit = False
 
     context_points: List[Dict[str, Any]] = []
     context_parts: List[str] = []
@@ -348,12 +347,18 @@ def run_your_current_rag(
         content = payload.get("content") or ""
 
         if modality == "table":
+            table_hit = True
             csv_path = meta.get("csv_path") or meta.get("table_path")
             if csv_path and not first_table_path:
                 first_table_path = csv_path
 
+            ref = meta.get("table_ref")
+            if ref and not first_table_ref and not first_table_block:
+                first_table_ref = ref
+
+            # Compatibilidad: puntos antiguos con la tabla entera en el payload
             table_obj = meta.get("table")
-            if table_obj and not first_table_block:
+            if table_obj and not first_table_block and not first_table_ref:
                 headers = table_obj.get("headers", []) or []
                 rows = table_obj.get("rows", []) or []
                 lines = [" | ".join(map(str, headers))] if headers else []
@@ -368,6 +373,31 @@ def run_your_current_rag(
         if content:
             context_parts.append(content)
 
+    # Filtros, agregados y búsquedas de filas: se calculan en local sobre la tabla
+    # y al LLM solo le llega el resultado (en lugar de la tabla). Solo si la
+    # intención pide tabla o la búsqueda ha devuelto una
+    table_answer = None
+    table_qa_path = (first_table_ref or {}).get("csv_path") or first_table_path
+    if TABLE_QA_ENABLED and table_qa_path and (allow_table or table_hit) and looks_analytical(q):
+        t0 = time.perf_counter()
+        try:
+            table_answer = answer_stored_question(q, table_qa_path, reader=read_table_timed)
+        except Exception:
+            table_answer = None
+        timings["table_qa_ms"] = _ms(time.perf_counter() - t0)
+
+    # La tabla completa solo se descarga (por referencia) si se va a usar: con
+    # resultado calculado no hace falta
+    if table_answer is not None:
+        first_table_block = None
+    elif allow_table and first_table_ref and not first_table_block:
+        ref_path = first_table_ref.get("csv_path")
+        if ref_path:
+            try:
+                first_table_block = _table_block(ref_path, reader=read_table_timed) or None
+            except Exception:
+                first_table_block = None
+
     # Imagen SOLO si allow_image
     first_image_path: Optional[str] = None
     image_bytes: Optional[bytes] = None
@@ -400,10 +430,14 @@ def run_your_current_rag(
         else:
             # normal: 1 imagen por búsqueda semántica
             t0 = time.perf_counter()
-            q_vec_img = embed_image(q)
+            image_target = active_target("image")
+            q_vec_img = embed_image(q, model_name=image_target.model_id)
             timings["embed_ms"] += _ms(time.perf_counter() - t0)
             t0 = time.perf_counter()
-            image_hits = search_images(query_vector=q_vec_img, top_k=1, doc_ids=doc_ids) or []
+            image_hits = search_images(
+                query_vector=q_vec_img, top_k=1, doc_ids=doc_ids, collection_name=image_target.collection,
+                search_params=image_target.search_params(),
+            ) or []
             timings["qdrant_ms"] += _ms(time.perf_counter() - t0)
             if image_hits:
                 img_payload = getattr(image_hits[0], "payload", None) or {}
@@ -429,11 +463,14 @@ def run_your_current_rag(
         tab_lines = ["TABLAS (preview):"]
         for idx, t in enumerate(tabs_unique, start=1):
             try:
-                t_dl = time.perf_counter()
-                b = download_bytes(t["path"])
-                timings["minio_ms"] += _ms(time.perf_counter() - t_dl)
-
-                prev = _table_preview(b, max_rows=TABLE_PREVIEW_ROWS, max_chars=TABLE_PREVIEW_CHARS)
+                prev = t.get("preview")
+                if prev:
+                    if len(prev) > TABLE_PREVIEW_CHARS:
+                        prev = prev[:TABLE_PREVIEW_CHARS] + "\n...(recortado)"
+                else:
+                    # Tablas antiguas: solo las filas del preview (la cabecera cuenta como una)
+                    df = read_table_timed(t["path"], limit=max(0, TABLE_PREVIEW_ROWS - 1))
+                    prev = _frame_preview(df, max_chars=TABLE_PREVIEW_CHARS)
             except Exception:
                 prev = "(no se pudo leer el CSV)"
             tab_lines.append(f"\nTABLA {idx}: {t['title']}\n{prev}")
@@ -456,7 +493,19 @@ def run_your_current_rag(
     # Contexto para LLM
     context_text = "\n".join([p for p in context_parts if p])
 
-    # >>> CLAVE: solo añadimos TABLA completa si allow_table
+    if table_answer is not None:
+        if table_answer.complete:
+            scope = f"SOBRE LA TABLA COMPLETA ({table_answer.rows_total} filas)"
+        else:
+            scope = (
+                f"PARCIAL, SOBRE LAS PRIMERAS {table_answer.rows_total} FILAS"
+                + (f" DE {table_answer.table_rows}" if table_answer.table_rows else "")
+            )
+        context_text += f"\n\nRESULTADO CALCULADO {scope}:\n" + table_answer.text
+        if table_answer.columns:
+            context_text += "\nCOLUMNAS DE LA TABLA: " + " | ".join(table_answer.columns)
+
+    # >>> CLAVE: solo añadimos TABLA completa si allow_table (y no hay resultado calculado)
     if allow_table and first_table_block:
         block = first_table_block
         if len(block) > TABLE_PREVIEW_CHARS:
@@ -768,6 +817,8 @@ class AskView(APIView):
             ok=True,
             status_code=200,
             embed_ms=timings.get("embed_ms", 0),
+            embed_cache_hit=bool(timings.get("query_cache_hit", 0)),
+            embed_saved_ms=timings.get("query_cache_saved_ms", 0),
             qdrant_ms=timings.get("qdrant_ms", 0),
             minio_ms=timings.get("minio_ms", 0),
             llm_ms=timings.get("llm_ms", 0),